@@ -24,6 +24,8 @@ pyinstaller ^
     --hidden-import eventlet ^
     --hidden-import eventlet.wsgi ^
     --hidden-import werkzeug ^
+    --hidden-import waitress ^
+    --hidden-import aiohttp ^
     --hidden-import config ^
     --hidden-import pyperclip ^
     main.py
@@ -7,12 +7,63 @@ document.addEventListener("DOMContentLoaded", () => {
     let currentData = [];
     let currentVersion = 0;
 
+    // Paginated listing: rows arrive PAGE_SIZE at a time as the user scrolls
+    const PAGE_SIZE = 200;
+    const PAGE_MAX = 2000;
+    let listing = { sort: "name", order: "asc", nextCursor: null, loading: false, token: 0, fetching: 0, stale: false };
+
+    // Paths ticked for a batch download (cleared when the folder changes)
+    const selectedPaths = new Set();
+
+    // url -> { etag, data } of recent listings, revalidated with If-None-Match
+    const browseCache = new Map();
+    const BROWSE_CACHE_SIZE = 50;
+
+    // path -> { key, data } of image thumbnails; the key lets the server
+    // skip re-sending previews that did not change
+    const thumbStore = new Map();
+    const THUMB_STORE_SIZE = 2000;
+    const THUMB_SIZE = 96;
+    const THUMB_BATCH = 100;
+    const THUMB_RETRIES = 10;
+    const THUMB_RETRY_MS = 1000;
+
+    // Returns { data, notModified } for a browse URL, or { res } on an error status
+    async function fetchListing(url) {
+        const cached = browseCache.get(url);
+        const res = await fetch(url, cached ? { headers: { "If-None-Match": cached.etag } } : {});
+
+        if (res.status === 304 && cached) {
+            browseCache.delete(url); // re-insert as most recent
+            browseCache.set(url, cached);
+            return { data: cached.data, notModified: true };
+        }
+        if (!res.ok) return { res };
+
+        const data = await res.json();
+        const etag = res.headers.get("ETag");
+        if (etag) {
+            browseCache.delete(url);
+            browseCache.set(url, { etag, data });
+            if (browseCache.size > BROWSE_CACHE_SIZE) {
+                browseCache.delete(browseCache.keys().next().value);
+            }
+        }
+        return { data, notModified: false };
+    }
+
     const $ = (id) => document.getElementById(id);
 
     // ------------------------
     // DOM ELEMENTS
     // ------------------------
     const fileList = $("file-list");
+    const scrollArea = document.querySelector(".scroll-area");
+    const sortSelect = $("sort-select");
+    const sortOrderBtn = $("sort-order");
+    const selectionActions = $("selection-actions");
+    const batchFormat = $("batch-format");
+    const downloadSelectedBtn = $("download-selected");
 
     const fileUploadInput = $("file-upload");
     const fileUploadFilename = $("file-upload-filename");
@@ -42,6 +93,17 @@ document.addEventListener("DOMContentLoaded", () => {
 
     const settingsModal = $("settings-modal");
 
+    const reportModal = $("report-modal");
+    const reportList = $("report-list");
+    const reportSummary = $("report-summary");
+
+    const previewModal = $("preview-modal");
+    const previewTitle = $("preview-title");
+    const previewText = $("preview-text");
+    const previewStatus = $("preview-status");
+    const previewOpen = $("preview-open");
+    const previewFollowBtn = $("preview-follow");
+
     const pathText = $("current-path-text");
     const backButton = $("back-button");
     const searchContainer = $("search-container");
@@ -215,7 +277,8 @@ document.addEventListener("DOMContentLoaded", () => {
     };
 
     const closeAllModals = () => {
-        [uploadModal, createFolderModal, deleteConfirmModal, settingsModal].forEach(m => m && m.classList.remove("active"));
+        stopFollow();
+        [uploadModal, createFolderModal, deleteConfirmModal, settingsModal, previewModal, reportModal].forEach(m => m && m.classList.remove("active"));
         if (modalOverlay) modalOverlay.classList.remove("active");
         if (deletePasswordInput) deletePasswordInput.value = "";
     };
@@ -223,53 +286,187 @@ document.addEventListener("DOMContentLoaded", () => {
     // ------------------------
     // RENDER FILES
     // ------------------------
-    const renderFiles = (items) => {
+    const iconHtml = (item) => {
+        const thumb = item.file_type === "image" && thumbStore.get(item.path);
+        return thumb ? `<img class="item-thumb" src="${thumb.data}" alt="">` : (icons[item.file_type] || icons.file);
+    };
+
+    const itemHtml = (item) => {
+        const showDelete = isAdmin;
+        return `
+            <div class="file-item" data-path="${item.path}" data-is-dir="${item.is_dir}" data-name="${item.name}"${item.sha256 ? ` title="SHA-256: ${item.sha256}"` : ""}>
+                <input type="checkbox" class="select-box" data-path="${item.path}"${selectedPaths.has(item.path) ? " checked" : ""}>
+                <div class="item-icon ${item.file_type}">${iconHtml(item)} </div>
+                <div class="item-details">
+                    <span class="item-name">${item.name}</span>
+                    <span class="item-size">${item.size ?? item.total_size ?? ""}${item.sha256 ? ` · SHA-256 ${item.sha256.slice(0, 12)}…` : ""}</span>
+                </div>
+                <div class="item-actions">
+                    <button class="icon-button download" data-path="${item.path}">${icons.download}</button>
+                    ${showDelete ? `<button class="icon-button delete" data-path="${item.path}" data-name="${item.name}">${icons.delete}</button>` : ""}
+                </div>
+            </div>
+        `;
+    };
+
+    // append=true adds a page below the rows already shown
+    const renderFiles = (items, append = false) => {
         if (!fileList) return;
 
+        if (append) {
+            if (items && items.length) {
+                fileList.querySelector(".empty-folder")?.remove();
+                fileList.insertAdjacentHTML("beforeend", items.map(itemHtml).join(""));
+            }
+            return;
+        }
+
         if (!items || items.length === 0) {
             fileList.innerHTML = `<p class="empty-folder">No items found</p>`;
             return;
         }
 
-        fileList.innerHTML = items.map(item => {
-            const showDelete = isAdmin;
-            return `
-                <div class="file-item" data-path="${item.path}" data-is-dir="${item.is_dir}" data-name="${item.name}">
-                    <div class="item-icon ${item.file_type}">${icons[item.file_type] || icons.file} </div>
-                    <div class="item-details">
-                        <span class="item-name">${item.name}</span>
-                        <span class="item-size">${item.size}</span>
-                    </div>
-                    <div class="item-actions">
-                        <button class="icon-button download" data-path="${item.path}">${icons.download}</button>
-                        ${showDelete ? `<button class="icon-button delete" data-path="${item.path}" data-name="${item.name}">${icons.delete}</button>` : ""}
-                    </div>
-                </div>
-            `;
-        }).join("");
+        fileList.innerHTML = items.map(itemHtml).join("");
+    };
+
+    // Folder item counts are fetched after the rows are on screen
+    async function fillChildCounts(items) {
+        const pending = items.filter(i => i.is_dir && i.size == null);
+        if (!pending.length) return;
+        const token = listing.token;
+        try {
+            const res = await fetch("/api/child_counts", {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ paths: pending.map(i => i.path) })
+            });
+            if (!res.ok || token !== listing.token) return;
+            const { counts, totals = {} } = await res.json();
+
+            pending.forEach(item => {
+                const n = counts[item.path];
+                if (n == null) return;
+                if (totals[item.path]) item.total_size = totals[item.path];
+                item.size = item.total_size ? `${n} items · ${item.total_size}` : `${n} items`;
+                const row = fileList?.querySelector(`.file-item[data-path="${CSS.escape(item.path)}"] .item-size`);
+                if (row) row.textContent = item.size;
+            });
+        } catch (e) {
+            console.error(e);
+        }
+    }
+
+    // Image previews for rows on screen, THUMB_BATCH per request. Images
+    // the server is still rendering are asked for again a little later.
+    async function fillThumbnails(items, attempt = 0) {
+        const images = items.filter(i => i.file_type === "image" && !/\.svg$/i.test(i.name));
+        const token = listing.token;
+        const retry = [];
+
+        for (let start = 0; start < images.length; start += THUMB_BATCH) {
+            const batch = images.slice(start, start + THUMB_BATCH);
+            const known = {};
+            batch.forEach(i => {
+                const thumb = thumbStore.get(i.path);
+                if (thumb) known[i.path] = thumb.key;
+            });
+
+            try {
+                const res = await fetch("/api/thumbnails", {
+                    method: "POST",
+                    headers: { "Content-Type": "application/json" },
+                    body: JSON.stringify({ paths: batch.map(i => i.path), size: THUMB_SIZE, known })
+                });
+                if (!res.ok || token !== listing.token) return;
+                const { thumbs, pending = [] } = await res.json();
+                const later = new Set(pending);
+                batch.forEach(i => { if (later.has(i.path)) retry.push(i); });
+
+                Object.entries(thumbs).forEach(([path, thumb]) => {
+                    if (!thumb.data) return;
+                    thumbStore.delete(path);
+                    thumbStore.set(path, thumb);
+                    if (thumbStore.size > THUMB_STORE_SIZE) thumbStore.delete(thumbStore.keys().next().value);
+
+                    const icon = fileList?.querySelector(`.file-item[data-path="${CSS.escape(path)}"] .item-icon`);
+                    if (icon) icon.innerHTML = `<img class="item-thumb" src="${thumb.data}" alt="">`;
+                });
+            } catch (e) {
+                console.error(e);
+                return;
+            }
+        }
+
+        if (retry.length && attempt < THUMB_RETRIES) {
+            setTimeout(() => {
+                if (token === listing.token) fillThumbnails(retry, attempt + 1);
+            }, THUMB_RETRY_MS);
+        }
+    }
+
+    const searchQuery = () => (searchInput ? searchInput.value.toLowerCase() : "");
+
+    // Whole-share search results (Enter in the search box), shown instead of the folder
+    let searchResults = null;
+
+    const renderCurrent = () => {
+        if (searchResults) {
+            renderFiles(searchResults);
+            return;
+        }
+        const q = searchQuery();
+        renderFiles(q ? currentData.filter(i => i.name.toLowerCase().includes(q)) : currentData);
     };
 
     // ------------------------
     // FETCH FILES
     // ------------------------
-    async function fetchFiles(path) {
+    const browseUrl = (path, limit, cursor) => {
+        const params = new URLSearchParams({ sort: listing.sort, order: listing.order, limit });
+        if (cursor) params.set("cursor", cursor);
+        return `/api/browse/${path}?${params}`;
+    };
+
+    // refresh=true reloads the current folder in place (same rows, same scroll position)
+    async function fetchFiles(path, refresh = false) {
         if (path == null) path = ""; // defensive
-        showSpinner();
+        const token = ++listing.token;
+        const limit = refresh
+            ? Math.min(Math.max(currentData.length, PAGE_SIZE), PAGE_MAX)
+            : PAGE_SIZE;
+        const scrollTop = scrollArea ? scrollArea.scrollTop : 0;
+
+        // Opening a folder (e.g. from search results) leaves the search
+        if (!refresh && searchResults) {
+            searchResults = null;
+            if (searchInput) searchInput.value = "";
+        }
+
+        if (!refresh) showSpinner();
+        listing.fetching++;
         try {
-            const res = await fetch(`/api/browse/${path}`);
-            if (res.status === 401) {
+            const { res, data, notModified } = await fetchListing(browseUrl(path, limit));
+            if (res && res.status === 401) {
                 window.location.href = "/login";
                 return;
             }
-            if (!res.ok) {
+            if (res) {
                 console.error("Browse error", res.status);
                 return;
             }
 
-            const data = await res.json();
+            if (token !== listing.token) return; // a newer listing was requested
+            if ((data.path || "") !== currentState.path) {
+                selectedPaths.clear();
+                updateSelection();
+            }
+            // Nothing changed in this folder: keep the rows (and counts) on screen
+            if (refresh && notModified) return;
 
             currentState.path = data.path || "";
-            currentData = data.items || [];
+            // Cached pages are shared; copy rows so filled-in counts stay local
+            currentData = (data.items || []).map(item => ({ ...item }));
+            listing.nextCursor = data.next_cursor || null;
 
             if (pathText) {
                 pathText.textContent = data.path ? `/${data.path}` : "/";
@@ -285,19 +482,230 @@ document.addEventListener("DOMContentLoaded", () => {
                 currentState.parentPath = "";
             }
 
-            renderFiles(currentData);
+            renderCurrent();
+            if (scrollArea) scrollArea.scrollTop = refresh ? scrollTop : 0;
+            fillChildCounts(currentData);
+            fillThumbnails(currentData);
 
         } catch (e) {
             console.error(e);
         } finally {
-            hideSpinner();
+            if (!refresh) hideSpinner();
+            listing.fetching--;
+        }
+        // A change event came in while this listing was on its way
+        if (listing.stale && !listing.fetching) {
+            listing.stale = false;
+            fetchFiles(currentState.path, true);
+            return;
         }
+        fillViewport();
+    }
+
+    async function fetchNextPage() {
+        if (!listing.nextCursor || listing.loading) return;
+        const token = listing.token;
+        listing.loading = true;
+        try {
+            const { res, data } = await fetchListing(
+                browseUrl(currentState.path, PAGE_SIZE, listing.nextCursor)
+            );
+            if (res) {
+                console.error("Browse error", res.status);
+                return;
+            }
+            if (token !== listing.token) return;
+
+            const items = (data.items || []).map(item => ({ ...item }));
+            currentData = currentData.concat(items);
+            listing.nextCursor = data.next_cursor || null;
+
+            if (searchQuery()) renderCurrent();
+            else renderFiles(items, true);
+            fillChildCounts(items);
+            fillThumbnails(items);
+        } catch (e) {
+            console.error(e);
+            return;
+        } finally {
+            listing.loading = false;
+        }
+        fillViewport();
+    }
+
+    // Loads more rows while the end of the list is (nearly) visible
+    function fillViewport() {
+        if (!scrollArea || !listing.nextCursor) return;
+        const remaining = scrollArea.scrollHeight - scrollArea.scrollTop - scrollArea.clientHeight;
+        if (remaining < scrollArea.clientHeight) fetchNextPage();
+    }
+
+    if (scrollArea) {
+        scrollArea.addEventListener("scroll", fillViewport, { passive: true });
+    }
+
+    // ------------------------
+    // MULTI-SELECT DOWNLOAD
+    // ------------------------
+    function updateSelection() {
+        if (selectionActions) selectionActions.style.display = selectedPaths.size ? "flex" : "none";
+        if (downloadSelectedBtn) downloadSelectedBtn.textContent = `Download (${selectedPaths.size})`;
+    }
+
+    // A real form post, so the browser streams the archive to disk itself
+    function downloadSelected() {
+        if (!selectedPaths.size) return;
+        const form = document.createElement("form");
+        form.method = "POST";
+        form.action = "/api/download_batch";
+        form.style.display = "none";
+
+        const add = (name, value) => {
+            const input = document.createElement("input");
+            input.type = "hidden";
+            input.name = name;
+            input.value = value;
+            form.appendChild(input);
+        };
+        selectedPaths.forEach(p => add("paths", p));
+        add("format", batchFormat ? batchFormat.value : "zip");
+        add("name", currentState.path ? currentState.path.split("/").pop() : "download");
+
+        document.body.appendChild(form);
+        form.submit();
+        form.remove();
+    }
+
+    if (fileList) {
+        fileList.addEventListener("change", (e) => {
+            if (!e.target.classList.contains("select-box")) return;
+            if (e.target.checked) selectedPaths.add(e.target.dataset.path);
+            else selectedPaths.delete(e.target.dataset.path);
+            updateSelection();
+        });
+    }
+
+    if (downloadSelectedBtn) {
+        downloadSelectedBtn.addEventListener("click", downloadSelected);
+    }
+
+    if (sortSelect) {
+        sortSelect.addEventListener("change", () => {
+            listing.sort = sortSelect.value;
+            fetchFiles(currentState.path);
+        });
+    }
+
+    if (sortOrderBtn) {
+        sortOrderBtn.addEventListener("click", () => {
+            listing.order = listing.order === "asc" ? "desc" : "asc";
+            sortOrderBtn.dataset.order = listing.order;
+            sortOrderBtn.textContent = listing.order === "asc" ? "↑ Asc" : "↓ Desc";
+            fetchFiles(currentState.path);
+        });
     }
 
     // ------------------------
     // UPLOAD ENGINE (ADMIN ONLY)
     // ------------------------
-    const generateId = () => Math.random().toString(36).slice(2);
+    // Chunk digests, whole-file SHA-256 and upload ids (hashing.js)
+    const { Sha256, chunkDigest, generateId, freeUploadId } = window.hashing;
+
+    // Asks the server which chunks it already holds; returns the missing ones.
+    const fetchMissingChunks = async () => {
+        const res = await fetch(`/api/upload_status?fileId=${encodeURIComponent(uploadSession.fileId)}`);
+        const data = await res.json();
+        // Finished sessions linger for status lookups; they have nothing to resume
+        const received = new Set(data.status === "uploading" ? data.received : []);
+        const missing = [];
+        for (let i = 0; i < uploadSession.totalChunks; i++) {
+            if (!received.has(i)) missing.push(i);
+        }
+        uploadSession.chunksCompleted = uploadSession.totalChunks - missing.length;
+        // Everything is stored but never finalized: resending one chunk finishes it
+        if (missing.length === 0 && uploadSession.totalChunks > 0) {
+            missing.push(uploadSession.totalChunks - 1);
+            uploadSession.chunksCompleted--;
+        }
+        return missing;
+    };
+
+    // Follows a server-side merge through /api/upload_status until it ends.
+    const waitForMerge = async (fileId) => {
+        while (true) {
+            await new Promise(r => setTimeout(r, 500));
+            let data;
+            try {
+                const res = await fetch(`/api/upload_status?fileId=${encodeURIComponent(fileId)}`);
+                data = await res.json();
+            } catch (err) {
+                console.error(err);
+                continue;
+            }
+            if (!data.exists || data.status === "complete" || data.status === "failed") {
+                return data;
+            }
+            if (statusText && data.totalSize > 0) {
+                const pct = Math.min(100, Math.round((data.mergedBytes / data.totalSize) * 100));
+                statusText.textContent = `Merging... ${pct}%`;
+            }
+        }
+    };
+
+    // Asks the hub whether it already holds this exact file. If it does, the
+    // server places a copy itself and nothing is uploaded. The file is only
+    // hashed when the server reports a same-size candidate.
+    const tryDeduplicate = async () => {
+        const file = uploadSession.file;
+        const body = {
+            size: file.size,
+            filename: uploadSession.customName,
+            path: uploadSession.path
+        };
+        const ask = async () => {
+            const res = await fetch("/api/upload_dedup", {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify(body)
+            });
+            return res.json();
+        };
+
+        try {
+            if (!(await ask()).candidates) return false;
+
+            const hasher = new Sha256();
+            const step = 8 * 1024 * 1024;
+            for (let offset = 0; offset < file.size; offset += step) {
+                if (uploadSession.file !== file) return false; // cancelled
+                hasher.update(new Uint8Array(await file.slice(offset, offset + step).arrayBuffer()));
+                if (statusText) {
+                    const pct = Math.min(100, Math.round(((offset + step) / file.size) * 100));
+                    statusText.textContent = `Checking for duplicates... ${pct}%`;
+                }
+            }
+            body.sha256 = hasher.hex();
+
+            return !!(await ask()).deduplicated;
+        } catch (err) {
+            console.error(err);
+            return false;
+        }
+    };
+
+    const updateUploadProgress = () => {
+        // Guard: never let percent > 100
+        let percent = 0;
+        if (uploadSession.totalChunks > 0) {
+            percent = Math.round(
+                (uploadSession.chunksCompleted / uploadSession.totalChunks) * 100
+            );
+            if (percent > 100) percent = 100;
+        }
+
+        if (progressBar) progressBar.style.width = percent + "%";
+        if (progressText) progressText.textContent = percent + "%";
+    };
 
     let uploadSession = {
         file: null,
@@ -311,7 +719,7 @@ document.addEventListener("DOMContentLoaded", () => {
         path: "",
         activeConnections: 0,
         maxConcurrency: 4,
-        nextChunkToIndex: 0
+        pendingChunks: []
     };
 
     const resetUploadSession = () => {
@@ -327,7 +735,7 @@ document.addEventListener("DOMContentLoaded", () => {
             path: "",
             activeConnections: 0,
             maxConcurrency: 4,
-            nextChunkToIndex: 0
+            pendingChunks: []
         };
     };
 
@@ -378,27 +786,65 @@ document.addEventListener("DOMContentLoaded", () => {
         const end = Math.min(start + uploadSession.chunkSize, uploadSession.file.size);
         const chunk = uploadSession.file.slice(start, end);
 
-        const fd = new FormData();
-        fd.append("file", chunk);
-        fd.append("chunkIndex", index);
-        fd.append("totalChunks", uploadSession.totalChunks);
-        fd.append("fileId", uploadSession.fileId);
-        fd.append("filename", uploadSession.customName);
-        fd.append("path", uploadSession.path);
-        fd.append("totalSize", uploadSession.file.size);
-
         try {
-            const res = await fetch("/api/upload_chunk", {
+            const buf = await chunk.arrayBuffer();
+
+            // Metadata goes in the query string, the chunk is the raw body
+            const params = new URLSearchParams({
+                chunkIndex: index,
+                totalChunks: uploadSession.totalChunks,
+                fileId: uploadSession.fileId,
+                filename: uploadSession.customName,
+                path: uploadSession.path,
+                totalSize: uploadSession.file.size,
+                chunkSize: uploadSession.chunkSize,
+                chunkHash: await chunkDigest(buf)
+            });
+
+            const res = await fetch(`/api/upload_chunk_raw?${params}`, {
                 method: "POST",
-                body: fd
+                headers: { "Content-Type": "application/octet-stream" },
+                body: buf
             });
 
             const data = await res.json();
 
+            // Already finished (a late retry, or a resume after the last
+            // chunk's answer was lost): report how it ended
+            if (data.finished) {
+                const fileId = params.get("fileId");
+                if (fileId !== uploadSession.fileId || uploadSession.isMerging) return;
+                uploadSession.isMerging = true;
+                const result = await waitForMerge(fileId);
+                if (fileId !== uploadSession.fileId) return;
+                showToast(result.status === "failed" ? (result.error || "Upload failed") : "Upload complete");
+                fetchFiles(currentState.path, true);
+                resetUploadUI();
+                if (uploadModal) closeModal(uploadModal);
+                return;
+            }
+
+            // Corrupted in transit: queue it again right away
+            if (data.retry) {
+                uploadSession.pendingChunks.push(index);
+                setTimeout(processQueue, 0);
+                return;
+            }
+
             if (!data.success) {
                 throw new Error(data.error || "Upload failed");
             }
 
+            // Direct uploads are renamed into place by the last chunk
+            if (data.complete) {
+                uploadSession.isMerging = true;
+                showToast("Upload complete");
+                fetchFiles(currentState.path, true);
+                resetUploadUI();
+                if (uploadModal) closeModal(uploadModal);
+                return;
+            }
+
             // Last chunk triggers merge
             if (data.merging) {
                 uploadSession.isMerging = true;
@@ -411,37 +857,27 @@ document.addEventListener("DOMContentLoaded", () => {
                 }
                 if (pauseUploadBtn) pauseUploadBtn.disabled = true;
 
-                // Give server a moment to merge, watchdog will bump version
-                setTimeout(() => {
-                    showToast("Upload complete");
-                    fetchFiles(currentState.path);
-                    resetUploadUI();
-                    if (uploadModal) closeModal(uploadModal);
-                }, 1500);
+                const result = await waitForMerge(uploadSession.fileId);
+                showToast(result.status === "complete" ? "Upload complete" : (result.error || "Merge failed"));
+                fetchFiles(currentState.path, true);
+                resetUploadUI();
+                if (uploadModal) closeModal(uploadModal);
 
                 return;
             }
 
             // Regular chunk completed
             uploadSession.chunksCompleted++;
-
-            // Guard: never let percent > 100
-            let percent = 0;
-            if (uploadSession.totalChunks > 0) {
-                percent = Math.round(
-                    (uploadSession.chunksCompleted / uploadSession.totalChunks) * 100
-                );
-                if (percent > 100) percent = 100;
-            }
-
-            if (progressBar) progressBar.style.width = percent + "%";
-            if (progressText) progressText.textContent = percent + "%";
+            updateUploadProgress();
 
             processQueue();
 
         } catch (err) {
             console.error(err);
 
+            // Keep the chunk queued so Resume sends it again
+            if (!uploadSession.isMerging) uploadSession.pendingChunks.push(index);
+
             if (!uploadSession.isPaused && !uploadSession.isMerging) {
                 uploadSession.isPaused = true;
                 if (statusText) {
@@ -464,11 +900,9 @@ document.addEventListener("DOMContentLoaded", () => {
 
         while (
             uploadSession.activeConnections < uploadSession.maxConcurrency &&
-            uploadSession.nextChunkToIndex < uploadSession.totalChunks
+            uploadSession.pendingChunks.length > 0
         ) {
-            const idx = uploadSession.nextChunkToIndex;
-            uploadSession.nextChunkToIndex++;
-            performChunkUpload(idx);
+            performChunkUpload(uploadSession.pendingChunks.shift());
         }
     };
 
@@ -492,7 +926,7 @@ document.addEventListener("DOMContentLoaded", () => {
     }
 
     if (isAdmin && startUploadBtn) {
-        startUploadBtn.addEventListener("click", (e) => {
+        startUploadBtn.addEventListener("click", async (e) => {
             e.preventDefault();
 
             if (!fileUploadInput || !fileUploadInput.files.length) {
@@ -524,9 +958,10 @@ document.addEventListener("DOMContentLoaded", () => {
             );
             uploadSession.isPaused = false;
             uploadSession.isMerging = false;
-            uploadSession.fileId = generateId();
             uploadSession.path = currentState.path;
-            uploadSession.nextChunkToIndex = 0;
+            uploadSession.fileId = generateId(
+                file, uploadSession.customName, uploadSession.path, uploadSession.chunkSize
+            );
 
             if (step1) step1.style.display = "none";
             if (step2) step2.style.display = "block";
@@ -544,15 +979,51 @@ document.addEventListener("DOMContentLoaded", () => {
                 statusText.style.color = "#8B949E";
             }
 
+            // Only send what the server does not already have
+            try {
+                uploadSession.fileId = await freeUploadId(uploadSession.fileId);
+                uploadSession.pendingChunks = await fetchMissingChunks();
+            } catch (err) {
+                console.error(err);
+                uploadSession.pendingChunks = [...Array(uploadSession.totalChunks).keys()];
+            }
+            updateUploadProgress();
+
+            // Fresh upload: skip it entirely if the hub already has the file
+            if (uploadSession.chunksCompleted === 0 && await tryDeduplicate()) {
+                showToast("Already on the hub, copied without uploading");
+                fetchFiles(currentState.path, true);
+                resetUploadUI();
+                if (uploadModal) closeModal(uploadModal);
+                return;
+            }
+            if (statusText) statusText.textContent = "Uploading...";
+
             processQueue();
         });
     }
 
     if (isAdmin && pauseUploadBtn) {
-        pauseUploadBtn.addEventListener("click", () => {
+        pauseUploadBtn.addEventListener("click", async () => {
             uploadSession.isPaused = !uploadSession.isPaused;
             pauseUploadBtn.textContent = uploadSession.isPaused ? "Resume" : "Pause";
-            if (!uploadSession.isPaused) processQueue();
+            if (uploadSession.isPaused) return;
+
+            if (statusText) {
+                statusText.textContent = "Uploading...";
+                statusText.style.color = "#8B949E";
+            }
+
+            // Re-sync after a network drop or server restart
+            if (uploadSession.activeConnections === 0) {
+                try {
+                    uploadSession.pendingChunks = await fetchMissingChunks();
+                    updateUploadProgress();
+                } catch (err) {
+                    console.error(err);
+                }
+            }
+            processQueue();
         });
     }
 
@@ -594,7 +1065,7 @@ document.addEventListener("DOMContentLoaded", () => {
                     showToast("Deleted");
                     closeModal(deleteConfirmModal);
                     deletePasswordInput.value = "";
-                    fetchFiles(currentState.path);
+                    fetchFiles(currentState.path, true);
                 } else {
                     showToast(data.error || "Delete failed");
                 }
@@ -635,7 +1106,7 @@ document.addEventListener("DOMContentLoaded", () => {
                     showToast("Folder created");
                     closeModal(createFolderModal);
                     newFolderNameInput.value = "";
-                    fetchFiles(currentState.path);
+                    fetchFiles(currentState.path, true);
                 } else {
                     showToast("Failed to create folder");
                 }
@@ -651,16 +1122,36 @@ document.addEventListener("DOMContentLoaded", () => {
     // ------------------------
     // SEARCH
     // ------------------------
+    async function searchEverywhere(query) {
+        const params = new URLSearchParams({ limit: 500 });
+        params.set("q", query);
+        try {
+            const res = await fetch(`/api/search?${params}`);
+            if (!res.ok) throw new Error(`Search failed (${res.status})`);
+            const data = await res.json();
+            if (searchInput?.value.trim() !== query) return;
+
+            searchResults = data.items.map(item => ({ ...item, size: `in /${item.folder}` }));
+            renderCurrent();
+            fillThumbnails(searchResults);
+            const count = data.more ? `${data.items.length}+` : `${data.total}`;
+            showToast(`${count} matches in ${data.took_ms} ms${data.ready ? "" : " (index still updating)"}`);
+        } catch (e) {
+            console.error(e);
+            showToast("Search failed");
+        }
+    }
+
     if (searchInput) {
-        searchInput.addEventListener("keyup", () => {
-            const q = searchInput.value.toLowerCase();
-            if (!q) {
-                renderFiles(currentData);
+        // Typing filters the open folder; Enter searches the whole share
+        searchInput.addEventListener("keyup", (e) => {
+            const query = searchInput.value.trim();
+            if (e.key === "Enter" && query) {
+                searchEverywhere(query);
                 return;
             }
-            renderFiles(
-                currentData.filter(i => i.name.toLowerCase().includes(q))
-            );
+            if (searchResults) searchResults = null;
+            renderCurrent();
         });
     }
 
@@ -677,6 +1168,7 @@ document.addEventListener("DOMContentLoaded", () => {
             if (!searchContainer) return;
             searchContainer.style.display = "none";
             if (searchInput) searchInput.value = "";
+            searchResults = null;
             renderFiles(currentData);
         });
     }
@@ -686,6 +1178,7 @@ document.addEventListener("DOMContentLoaded", () => {
     // ------------------------
     if (fileList) {
         fileList.addEventListener("click", (e) => {
+            if (e.target.classList.contains("select-box")) return; // handled by "change"
             const t = e.target.closest("button, .file-item");
             if (!t) return;
 
@@ -710,6 +1203,8 @@ document.addEventListener("DOMContentLoaded", () => {
             if (t.classList.contains("file-item")) {
                 if (t.dataset.isDir === "true") {
                     fetchFiles(path);
+                } else if (isPreviewable(t.dataset.name) && previewModal) {
+                    openPreview(path, t.dataset.name);
                 } else {
                     window.open(`/api/view/${path}`, "_blank");
                 }
@@ -745,6 +1240,158 @@ document.addEventListener("DOMContentLoaded", () => {
         });
     }
 
+    // ------------------------
+    // STORAGE REPORT (largest folders)
+    // ------------------------
+    async function openStorageReport() {
+        if (!reportModal) return;
+        closeAllModals();
+        if (reportList) reportList.innerHTML = "";
+        if (reportSummary) reportSummary.textContent = "Loading…";
+        openModal(reportModal);
+
+        try {
+            const params = new URLSearchParams({ path: currentState.path, limit: 25 });
+            const res = await fetch(`/api/storage_report?${params}`);
+            if (!res.ok) throw new Error(`Report failed (${res.status})`);
+            const data = await res.json();
+
+            const where = data.path ? `/${data.path}` : "the whole share";
+            reportSummary.textContent = `${data.size} in ${data.files} files in ${where}${data.complete ? "" : " (still counting)"}`;
+            reportList.innerHTML = data.folders.length
+                ? data.folders.map(f => `
+                    <button type="button" class="report-row" data-path="${f.path}">
+                        <span class="report-name" title="/${f.path}">/${f.path}</span>
+                        <span class="report-size">${f.size}</span>
+                        <span class="report-bar"><span style="width: ${Math.max(1, f.share * 100)}%"></span></span>
+                    </button>`).join("")
+                : `<p class="empty-folder">No subfolders with files</p>`;
+        } catch (e) {
+            console.error(e);
+            if (reportSummary) reportSummary.textContent = "Could not load the report";
+        }
+    }
+
+    $("open-report")?.addEventListener("click", openStorageReport);
+    reportList?.addEventListener("click", (e) => {
+        const row = e.target.closest(".report-row");
+        if (!row) return;
+        closeAllModals();
+        fetchFiles(row.dataset.path);
+    });
+
+    // ------------------------
+    // TEXT PREVIEW (first/last KB of big files, live tail)
+    // ------------------------
+    const PREVIEW_EXTENSIONS = /\.(txt|md|log|csv|tsv|json|jsonl|xml|yaml|yml|ini|cfg|conf|py|js|ts|html|css|java|c|cpp|h|cs|php|rs|go|kt|sh|sql)$/i;
+    const isPreviewable = (name) => PREVIEW_EXTENSIONS.test(name || "");
+
+    // { path, start, end, size, source } of the slice on screen
+    let preview = null;
+
+    const formatBytes = (n) => {
+        const units = ["B", "KB", "MB", "GB", "TB"];
+        let i = 0;
+        while (n >= 1024 && i < units.length - 1) { n /= 1024; i++; }
+        return `${n.toFixed(i ? 1 : 0)} ${units[i]}`;
+    };
+
+    const showPreviewStatus = () => {
+        if (!preview || !previewStatus) return;
+        const following = preview.source ? " · following" : "";
+        previewStatus.textContent = `Bytes ${formatBytes(preview.start)}–${formatBytes(preview.end)} of ${formatBytes(preview.size)}${following}`;
+    };
+
+    function stopFollow() {
+        if (preview && preview.source) {
+            preview.source.close();
+            preview.source = null;
+        }
+        previewFollowBtn?.classList.remove("active");
+    }
+
+    async function loadPreview(mode, offset) {
+        if (!preview) return;
+        const { path } = preview;
+        const params = new URLSearchParams({ mode });
+        if (offset != null) params.set("offset", offset);
+        try {
+            const res = await fetch(`/api/preview/${path}?${params}`);
+            if (!res.ok) throw new Error(`Preview failed (${res.status})`);
+            const data = await res.json();
+            if (!preview || preview.path !== path) return;
+
+            if (mode === "from") {
+                previewText.textContent += data.text;
+                preview.end = data.end;
+            } else {
+                previewText.textContent = data.text;
+                preview.start = data.start;
+                preview.end = data.end;
+                previewText.scrollTop = mode === "tail" ? previewText.scrollHeight : 0;
+            }
+            preview.size = data.size;
+            showPreviewStatus();
+        } catch (e) {
+            console.error(e);
+            showToast("Could not load preview");
+        }
+    }
+
+    function openPreview(path, name) {
+        stopFollow();
+        preview = { path, start: 0, end: 0, size: 0, source: null };
+        if (previewTitle) previewTitle.textContent = name;
+        if (previewOpen) previewOpen.href = `/api/view/${path}`;
+        previewText.textContent = "";
+        if (previewStatus) previewStatus.textContent = "";
+        openModal(previewModal);
+        loadPreview("head");
+    }
+
+    function startFollow() {
+        if (!preview) return;
+        stopFollow();
+        const source = new EventSource(`/api/preview/${preview.path}?mode=follow&offset=${preview.end}`);
+        source.addEventListener("append", (e) => {
+            const data = JSON.parse(e.data);
+            const atBottom = previewText.scrollTop + previewText.clientHeight >= previewText.scrollHeight - 20;
+            previewText.textContent += data.text;
+            preview.end = data.end;
+            preview.size = data.size;
+            if (atBottom) previewText.scrollTop = previewText.scrollHeight;
+            showPreviewStatus();
+        });
+        source.addEventListener("reset", () => {
+            previewText.textContent = "";
+            preview.start = preview.end = 0;
+        });
+        source.addEventListener("gone", stopFollow);
+        source.addEventListener("busy", () => {
+            stopFollow();
+            showPreviewStatus();
+            showToast("Server busy, try following again later");
+        });
+        preview.source = source;
+        previewFollowBtn?.classList.add("active");
+        showPreviewStatus();
+    }
+
+    $("preview-head")?.addEventListener("click", () => { stopFollow(); loadPreview("head"); });
+    $("preview-tail")?.addEventListener("click", () => { stopFollow(); loadPreview("tail"); });
+    $("preview-more")?.addEventListener("click", () => preview && loadPreview("from", preview.end));
+    previewFollowBtn?.addEventListener("click", async () => {
+        if (!preview) return;
+        if (preview.source) {
+            stopFollow();
+            showPreviewStatus();
+            return;
+        }
+        // Follow from the end of the file
+        if (preview.end < preview.size) await loadPreview("tail");
+        startFollow();
+    });
+
     closeButtons.forEach(b => {
         b.addEventListener("click", closeAllModals);
     });
@@ -754,11 +1401,127 @@ document.addEventListener("DOMContentLoaded", () => {
     }
 
     // ------------------------
-    // LONG-POLLING
+    // LIVE UPDATES
     // ------------------------
+    // Changes are pushed over Server-Sent Events and patched into the rows
+    // on screen. Without EventSource (or once the stream is refused) the
+    // page falls back to polling /api/check_updates.
+
+    const joinPath = (dir, name) => (dir ? `${dir}/${name}` : name);
+    const parentOf = (path) => (path.includes("/") ? path.slice(0, path.lastIndexOf("/")) : "");
+    const findRow = (path) => fileList?.querySelector(`.file-item[data-path="${CSS.escape(path)}"]`);
+
+    // Only these orders can be computed from a row; others reload instead
+    const sortKey = (item) => listing.sort === "type"
+        ? [item.is_dir ? 0 : 1, item.file_type, item.name]
+        : [item.name];
+
+    const compareKeys = (a, b) => {
+        for (let i = 0; i < a.length; i++) {
+            if (a[i] < b[i]) return -1;
+            if (a[i] > b[i]) return 1;
+        }
+        return 0;
+    };
+
+    function applyChanges(changes) {
+        if (listing.sort !== "name" && listing.sort !== "type") {
+            fetchFiles(currentState.path, true);
+            return;
+        }
+
+        const direction = listing.order === "desc" ? -1 : 1;
+        const filtered = !!searchQuery();
+        const added = [];
+
+        changes.forEach(change => {
+            const at = currentData.findIndex(i => i.name === change.name);
+            if (at >= 0) {
+                if (!filtered) findRow(currentData[at].path)?.remove();
+                currentData.splice(at, 1);
+            }
+            if (change.op === "removed" || !change.item) return;
+
+            const item = { ...change.item };
+            let pos = currentData.findIndex(i => direction * compareKeys(sortKey(item), sortKey(i)) < 0);
+            if (pos < 0) {
+                // Sorts after the loaded rows: it will come with a later page
+                if (listing.nextCursor) return;
+                pos = currentData.length;
+            }
+            currentData.splice(pos, 0, item);
+            added.push(item);
+
+            if (!filtered && fileList) {
+                const next = currentData[pos + 1];
+                const nextRow = next && findRow(next.path);
+                fileList.querySelector(".empty-folder")?.remove();
+                if (nextRow) nextRow.insertAdjacentHTML("beforebegin", itemHtml(item));
+                else fileList.insertAdjacentHTML("beforeend", itemHtml(item));
+            }
+        });
+
+        if (filtered || !currentData.length) renderCurrent();
+        fillChildCounts(added);
+        fillThumbnails(added);
+    }
+
+    function onChangeEvent(event) {
+        currentVersion = Math.max(currentVersion, event.version);
+        const here = currentState.path;
+
+        // The open folder (or one of its ancestors) was deleted or moved away
+        const gone = event.changes.some(c => {
+            const full = joinPath(event.path, c.name);
+            return c.op === "removed" && (here === full || here.startsWith(full + "/"));
+        });
+        if (gone) {
+            fetchFiles(event.path);
+            return;
+        }
+
+        if (event.path === here) {
+            if (listing.fetching) listing.stale = true;
+            else if (event.reload) fetchFiles(here, true);
+            else applyChanges(event.changes);
+            return;
+        }
+
+        // Something changed inside a subfolder on screen: recount it
+        if (event.path && parentOf(event.path) === here) {
+            const name = event.path.slice(event.path.lastIndexOf("/") + 1);
+            const folder = currentData.find(i => i.is_dir && i.name === name);
+            if (folder) {
+                folder.size = null;
+                fillChildCounts([folder]);
+            }
+        }
+    }
+
+    function connectEvents() {
+        const source = new EventSource("/api/events");
+
+        source.addEventListener("change", (e) => onChangeEvent(JSON.parse(e.data)));
+        source.addEventListener("resync", () => fetchFiles(currentState.path, true));
+        // No stream slot free on the server: poll instead
+        source.addEventListener("busy", () => {
+            source.close();
+            pollUpdates();
+        });
+
+        source.onerror = () => {
+            // The browser retries dropped streams itself; CLOSED means the
+            // server refused it (e.g. session expired), so poll instead
+            if (source.readyState === EventSource.CLOSED) {
+                pollUpdates();
+            }
+        };
+    }
+
     async function pollUpdates() {
         try {
-            const res = await fetch(`/api/check_updates?version=${currentVersion}`);
+            const params = new URLSearchParams({ version: currentVersion, path: currentState.path });
+            const res = await fetch(`/api/check_updates?${params}`);
             if (res.status === 401) {
                 // session expired
                 window.location.href = "/login";
@@ -768,9 +1531,11 @@ document.addEventListener("DOMContentLoaded", () => {
                 console.error("check_updates error", res.status);
             } else {
                 const data = await res.json();
+                // Only changes to the open folder are reported, so the
+                // version can advance even when there is nothing to reload
+                currentVersion = data.version;
                 if (data.update) {
-                    currentVersion = data.version;
-                    fetchFiles(currentState.path);
+                    fetchFiles(currentState.path, true);
                 }
             }
         } catch (e) {
@@ -780,7 +1545,11 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
-    pollUpdates();
+    if (window.EventSource) {
+        connectEvents();
+    } else {
+        pollUpdates();
+    }
 
     // initial load
     fetchFiles("");
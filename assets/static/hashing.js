@@ -0,0 +1,133 @@
+// assets/static/hashing.js
+// Digests and ids shared by the upload pages (app.js, uploader.js). Loaded
+// before them; everything is exposed as window.hashing.
+
+(() => {
+
+    // SHA-256 needs a secure context (HTTPS / localhost); plain-HTTP LAN
+    // access falls back to CRC-32. The server accepts either.
+    const CRC_TABLE = (() => {
+        const table = new Uint32Array(256);
+        for (let n = 0; n < 256; n++) {
+            let c = n;
+            for (let k = 0; k < 8; k++) c = (c & 1) ? (0xEDB88320 ^ (c >>> 1)) : (c >>> 1);
+            table[n] = c >>> 0;
+        }
+        return table;
+    })();
+
+    const crc32 = (bytes) => {
+        let crc = 0xFFFFFFFF;
+        for (let i = 0; i < bytes.length; i++) crc = CRC_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+        return (crc ^ 0xFFFFFFFF) >>> 0;
+    };
+
+    const chunkDigest = async (buf) => {
+        if (window.crypto && window.crypto.subtle) {
+            const digest = await window.crypto.subtle.digest("SHA-256", buf);
+            return "sha256:" + Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, "0")).join("");
+        }
+        return "crc32:" + crc32(new Uint8Array(buf)).toString(16).padStart(8, "0");
+    };
+
+    // Incremental SHA-256 (crypto.subtle cannot hash a file in pieces)
+    const SHA256_K = new Uint32Array([
+        0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+        0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+        0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+        0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+        0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+        0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+        0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+        0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+    ]);
+
+    class Sha256 {
+        constructor() {
+            this.h = new Uint32Array([
+                0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a,
+                0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19
+            ]);
+            this.w = new Uint32Array(64);
+            this.buf = new Uint8Array(64);
+            this.bufLen = 0;
+            this.total = 0;
+        }
+
+        update(bytes) {
+            let i = 0;
+            this.total += bytes.length;
+            if (this.bufLen) {
+                i = Math.min(64 - this.bufLen, bytes.length);
+                this.buf.set(bytes.subarray(0, i), this.bufLen);
+                this.bufLen += i;
+                if (this.bufLen < 64) return;
+                this.block(this.buf, 0);
+                this.bufLen = 0;
+            }
+            for (; i + 64 <= bytes.length; i += 64) this.block(bytes, i);
+            this.buf.set(bytes.subarray(i), 0);
+            this.bufLen = bytes.length - i;
+        }
+
+        block(p, o) {
+            const w = this.w;
+            for (let t = 0; t < 16; t++, o += 4) {
+                w[t] = (p[o] << 24) | (p[o + 1] << 16) | (p[o + 2] << 8) | p[o + 3];
+            }
+            for (let t = 16; t < 64; t++) {
+                const x = w[t - 15], y = w[t - 2];
+                const s0 = ((x >>> 7) | (x << 25)) ^ ((x >>> 18) | (x << 14)) ^ (x >>> 3);
+                const s1 = ((y >>> 17) | (y << 15)) ^ ((y >>> 19) | (y << 13)) ^ (y >>> 10);
+                w[t] = (w[t - 16] + s0 + w[t - 7] + s1) | 0;
+            }
+            let a = this.h[0], b = this.h[1], c = this.h[2], d = this.h[3];
+            let e = this.h[4], f = this.h[5], g = this.h[6], h = this.h[7];
+            for (let t = 0; t < 64; t++) {
+                const S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+                const t1 = (h + S1 + ((e & f) ^ (~e & g)) + SHA256_K[t] + w[t]) | 0;
+                const S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+                const t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+                h = g; g = f; f = e; e = (d + t1) | 0;
+                d = c; c = b; b = a; a = (t1 + t2) | 0;
+            }
+            this.h[0] += a; this.h[1] += b; this.h[2] += c; this.h[3] += d;
+            this.h[4] += e; this.h[5] += f; this.h[6] += g; this.h[7] += h;
+        }
+
+        hex() {
+            const hi = Math.floor(this.total / 0x20000000);
+            const lo = (this.total * 8) % 0x100000000;
+            const pad = new Uint8Array((this.bufLen < 56 ? 56 : 120) - this.bufLen + 8);
+            pad[0] = 0x80;
+            const n = pad.length;
+            pad[n - 8] = hi >>> 24; pad[n - 7] = hi >>> 16; pad[n - 6] = hi >>> 8; pad[n - 5] = hi;
+            pad[n - 4] = lo >>> 24; pad[n - 3] = lo >>> 16; pad[n - 2] = lo >>> 8; pad[n - 1] = lo;
+            this.update(pad);
+            return Array.from(this.h, x => x.toString(16).padStart(8, "0")).join("");
+        }
+    }
+
+    // Stable id per (file, target, chunk size), so a re-selected file
+    // resumes the server-side upload instead of starting a new one.
+    const generateId = (file, name, path, chunkSize) => {
+        const key = [file.name, file.size, file.lastModified, name, path, chunkSize].join("|");
+        let h = 5381;
+        for (let i = 0; i < key.length; i++) h = ((h * 33) ^ key.charCodeAt(i)) >>> 0;
+        return `${h.toString(36)}${file.size.toString(36)}`;
+    };
+
+    // A finished upload keeps refusing chunks for a while, so a new upload
+    // of the same file takes the first id after it that is not finished.
+    const freeUploadId = async (baseId) => {
+        for (let n = 0; ; n++) {
+            const id = n ? `${baseId}-${n}` : baseId;
+            const res = await fetch(`/api/upload_status?fileId=${encodeURIComponent(id)}`);
+            const data = await res.json();
+            if (!data.exists || data.status === "uploading") return id;
+        }
+    };
+
+    window.hashing = { Sha256, chunkDigest, generateId, freeUploadId };
+
+})();
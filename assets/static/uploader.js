@@ -24,13 +24,62 @@ document.addEventListener("DOMContentLoaded", () => {
         isPaused: false,
         isMerging: false,
         fileId: null,
-        nextChunkToIndex: 0,
+        pendingChunks: [],
         activeConnections: 0,
         maxConcurrency: 4,
         path: ""
     };
 
-    const generateId = () => Math.random().toString(36).substring(2, 10);
+    // Chunk digests, whole-file SHA-256 and upload ids (hashing.js)
+    const { chunkDigest, generateId, freeUploadId } = window.hashing;
+
+    // Asks the server which chunks it already holds; returns the missing ones.
+    async function fetchMissingChunks() {
+        const res = await fetch(`/api/upload_status?fileId=${encodeURIComponent(uploadSession.fileId)}`);
+        const data = await res.json();
+        // Finished sessions linger for status lookups; they have nothing to resume
+        const received = new Set(data.status === "uploading" ? data.received : []);
+        const missing = [];
+        for (let i = 0; i < uploadSession.totalChunks; i++) {
+            if (!received.has(i)) missing.push(i);
+        }
+        uploadSession.chunksCompleted = uploadSession.totalChunks - missing.length;
+        // Everything is stored but never finalized: resending one chunk finishes it
+        if (missing.length === 0 && uploadSession.totalChunks > 0) {
+            missing.push(uploadSession.totalChunks - 1);
+            uploadSession.chunksCompleted--;
+        }
+        return missing;
+    }
+
+    // Follows a server-side merge through /api/upload_status until it ends.
+    async function waitForMerge(fileId) {
+        while (true) {
+            await new Promise(r => setTimeout(r, 500));
+            let data;
+            try {
+                const res = await fetch(`/api/upload_status?fileId=${encodeURIComponent(fileId)}`);
+                data = await res.json();
+            } catch (err) {
+                console.error(err);
+                continue;
+            }
+            if (!data.exists || data.status === "complete" || data.status === "failed") {
+                return data;
+            }
+            if (data.totalSize > 0) {
+                const pct = Math.min(100, Math.round((data.mergedBytes / data.totalSize) * 100));
+                statusText.textContent = `Merging... ${pct}%`;
+            }
+        }
+    }
+
+    function updateProgress() {
+        const pct = Math.floor((uploadSession.chunksCompleted / uploadSession.totalChunks) * 100);
+
+        progressBar.style.width = pct + "%";
+        percentText.textContent = pct + "%";
+    }
 
     function resetUI() {
         progressContainer.style.display = "none";
@@ -55,7 +104,7 @@ document.addEventListener("DOMContentLoaded", () => {
             isPaused: false,
             isMerging: false,
             fileId: null,
-            nextChunkToIndex: 0,
+            pendingChunks: [],
             activeConnections: 0,
             maxConcurrency: 4,
             path: ""
@@ -83,7 +132,7 @@ document.addEventListener("DOMContentLoaded", () => {
     // START UPLOAD
     // ----------------------------
 
-    startBtn.addEventListener("click", () => {
+    startBtn.addEventListener("click", async () => {
         if (!fileInput.files.length) {
             alert("Select a file first");
             return;
@@ -99,14 +148,27 @@ document.addEventListener("DOMContentLoaded", () => {
         uploadSession.file = file;
         uploadSession.customName = renameInput.value.trim() || file.name;
         uploadSession.totalChunks = Math.ceil(file.size / uploadSession.chunkSize);
-        uploadSession.fileId = generateId();
         uploadSession.path = window.currentState.path;
-        uploadSession.nextChunkToIndex = 0;
+        uploadSession.fileId = generateId(
+            file, uploadSession.customName, uploadSession.path, uploadSession.chunkSize
+        );
 
         progressContainer.style.display = "block";
         pauseBtn.style.display = "inline-block";
         startBtn.style.display = "none";
 
+        // Only send what the server does not already have
+        try {
+            uploadSession.fileId = await freeUploadId(uploadSession.fileId);
+            uploadSession.pendingChunks = await fetchMissingChunks();
+        } catch (err) {
+            console.error(err);
+            uploadSession.pendingChunks = [...Array(uploadSession.totalChunks).keys()];
+        }
+        updateProgress();
+
+        statusText.textContent = "Uploading...";
+
         processQueue();
     });
 
@@ -121,23 +183,71 @@ document.addEventListener("DOMContentLoaded", () => {
         const end = Math.min(start + uploadSession.chunkSize, uploadSession.file.size);
         const chunk = uploadSession.file.slice(start, end);
 
-        const fd = new FormData();
-        fd.append("file", chunk);
-        fd.append("chunkIndex", i);
-        fd.append("totalChunks", uploadSession.totalChunks);
-        fd.append("fileId", uploadSession.fileId);
-        fd.append("filename", uploadSession.customName);
-        fd.append("path", uploadSession.path);
-        fd.append("totalSize", uploadSession.file.size);
+        let releaseSlot = true;
 
         try {
-            const res = await fetch("/api/upload_chunk", { method: "POST", body: fd });
+            const buf = await chunk.arrayBuffer();
+
+            // Metadata goes in the query string, the chunk is the raw body
+            const params = new URLSearchParams({
+                chunkIndex: i,
+                totalChunks: uploadSession.totalChunks,
+                fileId: uploadSession.fileId,
+                filename: uploadSession.customName,
+                path: uploadSession.path,
+                totalSize: uploadSession.file.size,
+                chunkSize: uploadSession.chunkSize,
+                chunkHash: await chunkDigest(buf)
+            });
+
+            const res = await fetch(`/api/upload_chunk_raw?${params}`, {
+                method: "POST",
+                headers: { "Content-Type": "application/octet-stream" },
+                body: buf
+            });
             const data = await res.json();
 
-            uploadSession.activeConnections--;
+            // Already finished (a late retry, or a resume after the last
+            // chunk's answer was lost): report how it ended
+            if (data.finished) {
+                const fileId = params.get("fileId");
+                if (fileId !== uploadSession.fileId || uploadSession.isMerging) return;
+                uploadSession.isMerging = true;
+                const result = await waitForMerge(fileId);
+                statusText.textContent = result.status === "failed"
+                    ? (result.error || "Upload failed")
+                    : "Upload complete";
+
+                setTimeout(() => {
+                    resetUI();
+                }, 1500);
+
+                return;
+            }
+
+            // Corrupted in transit: queue it again right away
+            if (data.retry) {
+                uploadSession.pendingChunks.push(i);
+                setTimeout(processQueue, 0);
+                return;
+            }
 
             if (!data.success) throw new Error(data.error);
 
+            if (data.complete) {
+                uploadSession.isMerging = true;
+
+                progressBar.style.width = "100%";
+                percentText.textContent = "100%";
+                statusText.textContent = "Upload complete";
+
+                setTimeout(() => {
+                    resetUI();
+                }, 1500);
+
+                return;
+            }
+
             if (data.merging) {
                 uploadSession.isMerging = true;
 
@@ -147,7 +257,11 @@ document.addEventListener("DOMContentLoaded", () => {
 
                 pauseBtn.disabled = true;
 
-                // Auto reset after merge
+                const result = await waitForMerge(uploadSession.fileId);
+                statusText.textContent = result.status === "complete"
+                    ? "Upload complete"
+                    : (result.error || "Merge failed");
+
                 setTimeout(() => {
                     resetUI();
                 }, 1500);
@@ -156,16 +270,18 @@ document.addEventListener("DOMContentLoaded", () => {
             }
 
             uploadSession.chunksCompleted++;
-            const pct = Math.floor((uploadSession.chunksCompleted / uploadSession.totalChunks) * 100);
-
-            progressBar.style.width = pct + "%";
-            percentText.textContent = pct + "%";
+            updateProgress();
 
+            // Free the slot before refilling the queue
+            uploadSession.activeConnections--;
+            releaseSlot = false;
             processQueue();
 
         } catch (err) {
             console.error(err);
-            uploadSession.activeConnections--;
+
+            // Keep the chunk queued so Resume sends it again
+            if (!uploadSession.isMerging) uploadSession.pendingChunks.push(i);
 
             if (!uploadSession.isPaused) {
                 uploadSession.isPaused = true;
@@ -173,6 +289,8 @@ document.addEventListener("DOMContentLoaded", () => {
 
                 statusText.textContent = "Network Error. Paused";
             }
+        } finally {
+            if (releaseSlot) uploadSession.activeConnections--;
         }
     }
 
@@ -181,10 +299,9 @@ document.addEventListener("DOMContentLoaded", () => {
 
         while (
             uploadSession.activeConnections < uploadSession.maxConcurrency &&
-            uploadSession.nextChunkToIndex < uploadSession.totalChunks
+            uploadSession.pendingChunks.length > 0
         ) {
-            uploadChunk(uploadSession.nextChunkToIndex);
-            uploadSession.nextChunkToIndex++;
+            uploadChunk(uploadSession.pendingChunks.shift());
         }
     }
 
@@ -192,12 +309,23 @@ document.addEventListener("DOMContentLoaded", () => {
     // PAUSE/RESUME
     // ----------------------------
 
-    pauseBtn.addEventListener("click", () => {
+    pauseBtn.addEventListener("click", async () => {
         if (!uploadSession.file) return;
 
         if (uploadSession.isPaused) {
             uploadSession.isPaused = false;
             pauseBtn.textContent = "Pause";
+            statusText.textContent = "Uploading...";
+
+            // Re-sync after a network drop or server restart
+            if (uploadSession.activeConnections === 0) {
+                try {
+                    uploadSession.pendingChunks = await fetchMissingChunks();
+                    updateProgress();
+                } catch (err) {
+                    console.error(err);
+                }
+            }
             processQueue();
         } else {
             uploadSession.isPaused = true;
@@ -10,6 +10,34 @@ PORT = 2004
 DEFAULT_PASSWORD = "local"
 NGROK_EXE_NAME = "ngrok.exe"
 
+# --- HTTP Server ---
+# "waitress" (production: fixed worker pool, keep-alive handled off-thread),
+# "aiohttp" (asyncio: uploads, downloads and media as tasks, the rest in a
+# fixed pool) or "werkzeug" (development server, one thread per connection)
+SERVER_BACKEND = "waitress"
+SERVER_THREADS = 32
+# Pending connections the OS queues before refusing new ones
+SERVER_BACKLOG = 1024
+# SO_RCVBUF / SO_SNDBUF of client sockets (KB)
+SERVER_SOCKET_BUFFER_KB = 1024
+# Open connections before new ones wait in the backlog
+SERVER_CONNECTION_LIMIT = 1000
+# Idle keep-alive connections are closed after this long (seconds)
+SERVER_IDLE_TIMEOUT = 120
+# Event streams (live changes, log follow) open at once. Each holds a
+# worker thread for as long as its page stays open, so the pool gets this
+# many threads on top of SERVER_THREADS; pages beyond it poll instead
+SERVER_EVENT_STREAMS = 64
+# Request bodies up to this size are buffered in memory by waitress instead
+# of spooled to a temp file, so upload chunks are written to disk once.
+# Covers the largest client chunk (50 MB) plus form overhead; each upload
+# in flight may hold this much memory
+SERVER_INBUF_MB = 64
+# Server processes accepting on the port (waitress or aiohttp). Above 1, one
+# coordinator process runs the watchdog and indexes and keeps the
+# workers' change state in step (see core/cluster.py)
+SERVER_PROCESSES = 1
+
 # --- Path Config ---
 # Get the folder where the .exe is.
 ROOT_DIR = get_exe_folder() 
@@ -17,6 +45,66 @@ ROOT_DIR = get_exe_folder()
 # Path for our temp_uploads (for chunking)
 TEMP_UPLOAD_DIR = os.path.join(ROOT_DIR, "temp_uploads")
 
+# Manifests of in-flight uploads (kept across restarts so uploads can resume)
+UPLOAD_STATE_DIR = os.path.join(TEMP_UPLOAD_DIR, "sessions")
+
+# SHA-256 index of files in the shared folder
+HASH_INDEX_PATH = os.path.join(ROOT_DIR, "hash_index.json")
+
+# Key that signs session cookies, generated on first run and kept so that
+# logins survive restarts (and are shared by the worker processes)
+SECRET_KEY_PATH = os.path.join(ROOT_DIR, "secret_key")
+
+# Filename index of the shared folder behind /api/search, and results
+# per query (default, most allowed)
+SEARCH_INDEX_PATH = os.path.join(ROOT_DIR, "search_index.json")
+SEARCH_LIMIT = 100
+SEARCH_LIMIT_MAX = 1000
+
+# Folders listed by /api/storage_report (default, most allowed)
+REPORT_LIMIT = 20
+REPORT_LIMIT_MAX = 500
+
+# Generated folder archives (zip downloads) kept for reuse, and the
+# default disk budget for them (0 disables the cache)
+ARCHIVE_CACHE_DIR = os.path.join(ROOT_DIR, "archive_cache")
+ARCHIVE_CACHE_MB = 4096
+
+# Image thumbnails: cache folder and its disk budget in MB (0 disables
+# thumbnails), the edge lengths offered, and the most per batch request
+THUMB_CACHE_DIR = os.path.join(ROOT_DIR, "thumb_cache")
+THUMB_CACHE_MB = 512
+THUMB_SIZES = (96, 256, 512)
+THUMB_BATCH_MAX = 200
+# How long a thumbnail request waits for renders (seconds); the rest are
+# reported as pending and the page asks for them again
+THUMB_WAIT = 2.0
+
+# /api/preview: slice size in KB (default, most allowed), lines per
+# request (default, most allowed), and how often follow mode polls (s)
+PREVIEW_KB = 64
+PREVIEW_MAX_KB = 1024
+PREVIEW_LINES = 200
+PREVIEW_MAX_LINES = 5000
+PREVIEW_FOLLOW_INTERVAL = 1.0
+
+# Most paths one batch (multi-select) download may name
+BATCH_DOWNLOAD_MAX = 5000
+
+# Number of directory listings kept in memory by /api/browse
+LISTING_CACHE_SIZE = 256
+
+# Rows per /api/browse page (default, and the most a client may ask for)
+BROWSE_PAGE_SIZE = 200
+BROWSE_PAGE_MAX = 2000
+
+# Server -> launcher stats lines on stdout start with this prefix
+STATS_LOG_PREFIX = "@@stats "
+STATS_INTERVAL = 2
+
+# Unfinished uploads untouched for this long are discarded (seconds)
+UPLOAD_SESSION_TTL = 7 * 24 * 60 * 60
+
 # Path for our bundled assets (HTML/CSS/JS)
 # This will be overridden by utils.resource_path() in the final .exe
 ASSETS_DIR = os.path.join(ROOT_DIR, "assets")
\ No newline at end of file
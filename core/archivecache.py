@@ -0,0 +1,398 @@
+# core/archivecache.py
+# Disk cache of generated folder archives.
+# An archive is keyed by a fingerprint of the folder tree (relative paths,
+# sizes, mtimes), so a cached zip is only ever served for identical
+# content. The fingerprint is taken from the members as the build walks
+# them, so a first download starts at once instead of after a full stat
+# walk. It is memoized per folder until a change below it is reported,
+# which also deletes the archives built from the old content.
+# Each folder is built once at a time: concurrent requests for it all read
+# the file while the single builder is still writing it. Finished
+# archives are evicted least-recently-used beyond a byte budget.
+# A build that outgrows the budget stops writing the file and hands the
+# rest of the archive to its readers in memory instead; one that loses all
+# its readers is cancelled.
+
+import os
+import json
+import collections
+import time
+import hashlib
+import secrets
+import threading
+import traceback
+
+from .zipstream import iter_tree
+
+TAIL_BLOCK_SIZE = 1024 * 1024
+
+# Bytes a reader of an over-budget build may fall behind before the
+# builder waits for it
+PENDING_BYTES = 8 * 1024 * 1024
+
+
+class _Build:
+    """ An archive being written; readers follow it through written/done. """
+
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path
+        self.written = 0
+        self.done = False
+        self.error = None
+        # Set when the folder changed mid-build: serve it, but do not keep it
+        self.stale = False
+        # Fingerprint and file bytes of the tree, known once the walk ends
+        self.key = None
+        self.total = 0
+        # Archive bytes in the file once the build outgrew the budget; the
+        # rest goes to each reader's pending blocks
+        self.cut = None
+        self.followers = set()
+        self.cancelled = False
+        self.cond = threading.Condition()
+
+
+class _Follower:
+    """
+    One reader of a build. An iterator class rather than a generator so
+    that close() unregisters it even if it was never iterated.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.pending = collections.deque()
+        self.pending_bytes = 0
+        self._blocks = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._blocks is None:
+            self._blocks = self._read()
+        return next(self._blocks)
+
+    def close(self):
+        build = self.build
+        with build.cond:
+            build.followers.discard(self)
+            build.cond.notify_all()
+        if self._blocks is not None:
+            self._blocks.close()
+
+    def _read(self):
+        """ Yields the archive as it is written, until the build is done. """
+        build = self.build
+        with open(build.path, "rb") as f:
+            offset = 0
+            while True:
+                data = None
+                with build.cond:
+                    while True:
+                        if build.error:
+                            raise RuntimeError(build.error)
+                        end = build.written if build.cut is None else build.cut
+                        if offset < end:
+                            break
+                        if self.pending:
+                            data = self.pending.popleft()
+                            self.pending_bytes -= len(data)
+                            build.cond.notify_all()
+                            break
+                        if build.done:
+                            return
+                        build.cond.wait()
+
+                if data is not None:
+                    yield data
+                    continue
+                while offset < end:
+                    data = f.read(min(TAIL_BLOCK_SIZE, end - offset))
+                    if not data:
+                        break
+                    offset += len(data)
+                    yield data
+
+
+class ArchiveCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+        # key -> {"root", "file", "size", "last_used"} of finished archives
+        self._entries = {}
+        # normalized root -> _Build in progress
+        self._builds = {}
+        # normalized root -> key of its current content
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _norm(self, path):
+        return os.path.normcase(os.path.normpath(path))
+
+    def _archive_path(self, entry, key):
+        # Entries from before "file" was recorded are named after their key
+        return os.path.join(self.cache_dir, entry.get("file") or f"{key}.zip")
+
+    # --- persistence ---
+
+    def load(self):
+        """ Reads the index and deletes archives it does not vouch for (e.g. interrupted builds). """
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+
+        with self._lock:
+            self._entries = {
+                key: entry for key, entry in entries.items()
+                if os.path.exists(self._archive_path(entry, key))
+            }
+            known = {os.path.basename(self._archive_path(e, k)) for k, e in self._entries.items()}
+
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".zip") and name not in known:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        self._evict()
+
+    def _save(self):
+        with self._lock:
+            data = json.dumps(self._entries)
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+    # --- fingerprints ---
+
+    def _fingerprinted(self, build, members):
+        """
+        Passes (path, arcname, is_dir) members on to the archive while
+        hashing them into the tree's fingerprint; sets build.key and
+        build.total once the walk is complete.
+        """
+        h = hashlib.sha256(build.root.encode("utf-8"))
+        total = 0
+        for path, arcname, is_dir in members:
+            if is_dir:
+                h.update(f"{arcname}\0".encode("utf-8"))
+            else:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                total += st.st_size
+                h.update(f"{arcname}\0{st.st_size}\0{st.st_mtime_ns}\0".encode("utf-8"))
+            yield path, arcname, is_dir
+
+        build.total = total
+        build.key = h.hexdigest()[:32]
+
+    def invalidate(self, path):
+        """
+        Something changed at path: forgets fingerprints of every folder
+        containing it (or below it) and deletes their archives.
+        """
+        key = self._norm(path)
+
+        def affected(root):
+            return (
+                key == root
+                or key.startswith(root.rstrip(os.sep) + os.sep)
+                or root.startswith(key.rstrip(os.sep) + os.sep)
+            )
+
+        with self._lock:
+            for root in [r for r in self._fingerprints if affected(r)]:
+                del self._fingerprints[root]
+            for build in self._builds.values():
+                if affected(build.root):
+                    build.stale = True
+            doomed = []
+            for k, e in list(self._entries.items()):
+                if affected(e["root"]):
+                    del self._entries[k]
+                    doomed.append(self._archive_path(e, k))
+
+        if doomed:
+            for path in doomed:
+                self._remove_file(path)
+            self._save()
+
+    # --- serving ---
+
+    def serve(self, root, make_stream, skip=None, size=0):
+        """
+        Returns ("file", path) for a finished archive of root, or
+        ("stream", iterator) following a build of it (starting one if
+        needed); make_stream(members) makes an archive of iter_tree()
+        members. Returns (None, None) if root should not be cached: cache
+        disabled, size (the folder's byte total, if known) exceeds the
+        budget, or the build under way already outgrew it.
+        """
+        if not self.enabled or size > self.max_bytes:
+            return None, None
+
+        norm = self._norm(root)
+        with self._lock:
+            key = self._fingerprints.get(norm)
+            entry = self._entries.get(key) if key else None
+            if entry is not None:
+                entry["last_used"] = time.time()
+                path = self._archive_path(entry, key)
+            else:
+                build = self._builds.get(norm)
+                if build is None:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    build = _Build(norm, os.path.join(self.cache_dir, f"{secrets.token_hex(16)}.zip"))
+                    # Created before readers can look for it
+                    open(build.path, "wb").close()
+                    self._builds[norm] = build
+                    follower = self._join(build)
+                    members = self._fingerprinted(build, iter_tree(root, skip))
+                    threading.Thread(target=self._build, args=(build, make_stream, members), daemon=True).start()
+                else:
+                    follower = self._join(build)
+                    if follower is None:
+                        return None, None
+
+        if entry is not None:
+            self._save()
+            return "file", path
+        return "stream", follower
+
+    def _join(self, build):
+        """ A reader of build, or None once it is past joining (out of budget, cancelled). """
+        with build.cond:
+            if build.cut is not None or build.cancelled:
+                return None
+            follower = _Follower(build)
+            build.followers.add(follower)
+            return follower
+
+    def _build(self, build, make_stream, members):
+        stream = make_stream(members)
+        try:
+            with open(build.path, "wb", buffering=0) as f:
+                for data in stream:
+                    if not data:
+                        continue
+                    with build.cond:
+                        if not build.followers:
+                            build.cancelled = True
+                            break
+                        if build.cut is None and build.written + len(data) > self.max_bytes:
+                            # Over budget: the file keeps what readers may
+                            # still be reading, the rest is handed to them
+                            build.cut = build.written
+                        if build.cut is not None:
+                            self._hand_out(build, data)
+                            continue
+                    f.write(data)
+                    with build.cond:
+                        build.written += len(data)
+                        build.cond.notify_all()
+        except Exception as e:
+            traceback.print_exc()
+            build.error = str(e) or "Archive build failed"
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+        replaced = []
+        with self._lock:
+            self._builds.pop(build.root, None)
+            keep = (
+                build.error is None
+                and not build.stale
+                and not build.cancelled
+                and build.cut is None
+                and build.key is not None
+                and build.total <= self.max_bytes
+            )
+            if keep:
+                # Archives of an earlier state of the folder (e.g. from
+                # before a restart) can never be served again
+                for key, entry in list(self._entries.items()):
+                    if entry["root"] == build.root:
+                        replaced.append(self._archive_path(self._entries.pop(key), key))
+                self._entries[build.key] = {
+                    "root": build.root,
+                    "file": os.path.basename(build.path),
+                    "size": build.written,
+                    "last_used": time.time(),
+                }
+                self._fingerprints[build.root] = build.key
+
+        with build.cond:
+            build.done = True
+            build.cond.notify_all()
+
+        for path in replaced:
+            self._remove_file(path)
+        if keep:
+            self._save()
+            self._evict()
+        else:
+            self._remove_file(build.path)
+
+    def _hand_out(self, build, data):
+        """ Queues a block past the cut for every reader; waits for the slowest. Caller holds build.cond. """
+        for follower in build.followers:
+            follower.pending.append(data)
+            follower.pending_bytes += len(data)
+        build.written += len(data)
+        build.cond.notify_all()
+        while build.followers and any(f.pending_bytes > PENDING_BYTES for f in build.followers):
+            build.cond.wait()
+        if not build.followers:
+            build.cancelled = True
+
+    # --- eviction ---
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            # Still open by a reader on Windows; load() sweeps it later
+            return False
+
+    def _evict(self):
+        """ Drops least recently used archives until the total fits max_bytes. """
+        with self._lock:
+            total = sum(e["size"] for e in self._entries.values())
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, entry in sorted(self._entries.items(), key=lambda kv: kv[1]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= entry["size"]
+            victims = [self._archive_path(self._entries.pop(key), key) for key in victims]
+
+        for path in victims:
+            self._remove_file(path)
+        self._save()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
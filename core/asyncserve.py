@@ -0,0 +1,237 @@
+# core/asyncserve.py
+# The "aiohttp" backend: one asyncio event loop owns every connection.
+# Routes registered as native (uploads, downloads, media) are coroutines on
+# that loop, so a transfer waiting on the network costs a task instead of
+# a thread; only their disk I/O and bookkeeping run in a bounded thread
+# pool. Every other request runs the Flask app in that pool through a small
+# WSGI bridge, and behaves as it does under waitress. Response bodies are
+# pulled from the app one item at a time in the pool and written on the
+# loop, so a slow download never holds a thread while the client reads.
+
+import io
+import sys
+import json
+import asyncio
+import concurrent.futures
+from urllib.parse import unquote_to_bytes
+
+from itsdangerous import BadSignature
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+# Bodies of bridged requests are read into memory before the app runs;
+# the large ones (upload chunks) go to native routes
+BRIDGE_MAX_BODY = 64 * 1024 * 1024
+
+# Data moved per thread-pool hop by the native routes. Every transfer
+# holds up to this much in memory while its client is slow, so it stays
+# well below the threaded paths' block sizes
+BLOCK_SIZE = 128 * 1024
+
+# Connection-level headers of a WSGI response; aiohttp sets its own
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"}
+
+
+async def run_blocking(func, *args):
+    """ Runs func(*args) in the server's thread pool. """
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def read_blocks(read, size):
+    """
+    Yields the data of read(n) (a stream's read or a multipart part's
+    read_chunk) in blocks of size bytes; only the last may be shorter.
+    """
+    block = bytearray()
+    while True:
+        data = await read(size - len(block))
+        if not data:
+            break
+        block += data
+        if len(block) >= size:
+            yield block
+            block = bytearray()
+    if block:
+        yield block
+
+
+def read_session(flask_app, request):
+    """ The Flask session of request as a dict (empty when missing, forged or expired). """
+    value = request.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if not value or serializer is None:
+        return {}
+    try:
+        return serializer.loads(value, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def json_response(body, status=200):
+    """ JSON as Flask's jsonify() writes it (compact, sorted keys). """
+    return web.json_response(body, status=status, dumps=lambda obj: json.dumps(obj, separators=(",", ":"), sort_keys=True))
+
+
+def status_response(status):
+    """ A bare error status, as Flask's abort() gives it. """
+    return web.Response(status=status)
+
+
+async def send_response(request, status, headers, iterable=None, reason=None):
+    """
+    Sends status and headers, then the items of iterable (pulled in the
+    thread pool, so it may block on disk). iterable is closed when done,
+    also when the client goes away.
+    """
+    response = web.StreamResponse(status=status, reason=reason)
+    for name, value in headers:
+        if name.lower() not in HOP_BY_HOP:
+            response.headers.add(name, value)
+    try:
+        await response.prepare(request)
+        if iterable is not None and request.method != "HEAD":
+            items = iter(iterable)
+            while True:
+                data = await run_blocking(next, items, None)
+                if data is None:
+                    break
+                if data:
+                    await response.write(data)
+        await response.write_eof()
+    except ConnectionResetError:
+        # The client went away; there is nobody left to answer
+        pass
+    finally:
+        close = getattr(iterable, "close", None)
+        if close is not None:
+            # Submitted at once and shielded: aiohttp may cancel the handler
+            # as soon as its client is done, and the body must close anyway
+            await asyncio.shield(asyncio.get_running_loop().run_in_executor(None, close))
+    return response
+
+
+# ============================================================
+# WSGI BRIDGE
+# ============================================================
+
+def wsgi_environ(request, body):
+    """ The PEP 3333 environ of an aiohttp request whose body has been read. """
+    path, _, query = request.raw_path.partition("?")
+    sockname = request.transport.get_extra_info("sockname") if request.transport else None
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": unquote_to_bytes(path).decode("latin-1"),
+        "QUERY_STRING": query,
+        "SERVER_NAME": sockname[0] if sockname else "localhost",
+        "SERVER_PORT": str(sockname[1]) if sockname else "80",
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in request.headers.items():
+        key = name.upper().replace("-", "_")
+        if key == "CONTENT_LENGTH":
+            continue
+        if key != "CONTENT_TYPE":
+            key = "HTTP_" + key
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def wsgi_bridge(flask_app):
+    """ An aiohttp handler running any request through the WSGI app. """
+
+    async def bridge(request):
+        if request.content_length is not None and request.content_length > BRIDGE_MAX_BODY:
+            return web.Response(status=413)
+        body = await request.read()
+
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+            return lambda data: None
+
+        result = await run_blocking(flask_app, wsgi_environ(request, body), start_response)
+        items = iter(result)
+        first = None
+        if not started:
+            # A generator app calls start_response on its first item
+            first = await run_blocking(next, items, b"")
+
+        status, headers = started
+        code, _, reason = status.partition(" ")
+        return await send_response(request, int(code), headers, ResultIterator(result, items, first), reason or None)
+
+    return bridge
+
+
+class ResultIterator:
+    """ A WSGI result, with an item already taken from it put back in front. """
+
+    def __init__(self, result, items, first):
+        self._result = result
+        self._items = items
+        self._first = first
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            return first
+        return next(self._items)
+
+    def close(self):
+        close = getattr(self._result, "close", None)
+        if close is not None:
+            close()
+
+
+# ============================================================
+# SERVER
+# ============================================================
+
+def run_aiohttp(flask_app, routes, sock, threads, channel_timeout):
+    """
+    Serves on sock (a listening socket) until the process is stopped.
+    routes are the native handlers as (method, path, handler); a handler
+    may return None to hand the request to the Flask app after all.
+    """
+    pool = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix="app")
+    bridge = wsgi_bridge(flask_app)
+
+    def native(handler):
+        async def handle(request):
+            response = await handler(request)
+            return response if response is not None else await bridge(request)
+        return handle
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(pool)
+        application = web.Application(client_max_size=BRIDGE_MAX_BODY)
+        for method, path, handler in routes:
+            if method == "GET":
+                application.router.add_get(path, native(handler))
+            else:
+                application.router.add_route(method, path, native(handler))
+        application.router.add_route("*", "/{tail:.*}", bridge)
+
+        runner = web.AppRunner(application, access_log=None, keepalive_timeout=channel_timeout)
+        await runner.setup()
+        await web.SockSite(runner, sock).start()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
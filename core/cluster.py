@@ -0,0 +1,194 @@
+# core/cluster.py
+# Plumbing for the multi-process server: one coordinator process and
+# several worker processes accepting connections on one shared socket.
+# Each worker is connected to the coordinator by a duplex pipe. Workers
+# send requests up the pipe; the coordinator sends broadcasts down every
+# pipe while holding one lock, so all workers see them in the same order.
+# A reply to a request travels as the broadcast it caused, tagged with the
+# request id for the worker that asked.
+
+import os
+import time
+import itertools
+import threading
+import traceback
+import multiprocessing
+
+# A worker that dies is restarted, but not more often than this (seconds)
+RESTART_DELAY = 2.0
+
+# How long a worker waits for the coordinator to answer a request (seconds)
+CALL_TIMEOUT = 30
+
+
+class Hub:
+    """
+    Coordinator end. handle(index, kind, req_id, *args) runs on a reader
+    thread of the worker that sent the message.
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        # worker index -> (connection, send lock)
+        self._links = {}
+        self._links_lock = threading.Lock()
+        # Held while broadcasting, and by callers that must order their own
+        # state change with it (e.g. assigning a version)
+        self._order = threading.RLock()
+        self._processes = {}
+        self._stopping = False
+
+    def ordered(self):
+        return self._order
+
+    # --- workers ---
+
+    def start_workers(self, count, target, args):
+        """
+        Starts count processes running target(index, connection, *args);
+        supervise() keeps them running.
+        """
+        self._target = target
+        self._args = args
+        for index in range(count):
+            self._spawn(index)
+
+    def _spawn(self, index):
+        ctx = multiprocessing.get_context("spawn")
+        mine, theirs = ctx.Pipe(duplex=True)
+        process = ctx.Process(target=self._target, args=(index, theirs) + tuple(self._args), name=f"worker-{index}")
+        process.start()
+        theirs.close()
+        self._attach(index, mine, process)
+
+    def _attach(self, index, conn, process=None):
+        with self._links_lock:
+            self._links[index] = (conn, threading.Lock())
+            if process is not None:
+                self._processes[index] = process
+        threading.Thread(target=self._read, args=(index, conn), daemon=True).start()
+
+    def supervise(self):
+        """ Blocks, restarting workers that exit. """
+        while not self._stopping:
+            time.sleep(RESTART_DELAY)
+            with self._links_lock:
+                dead = [i for i, p in self._processes.items() if not p.is_alive()]
+            for index in dead:
+                print(f"Worker {index} exited (code {self._processes[index].exitcode}), restarting")
+                self._drop(index)
+                self._spawn(index)
+
+    def stop(self):
+        self._stopping = True
+        with self._links_lock:
+            processes = list(self._processes.values())
+        for process in processes:
+            process.terminate()
+
+    def _drop(self, index):
+        with self._links_lock:
+            link = self._links.pop(index, None)
+            self._processes.pop(index, None)
+        if link is not None:
+            try:
+                link[0].close()
+            except OSError:
+                pass
+
+    def _read(self, index, conn):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                self.handle(index, *message)
+            except Exception:
+                traceback.print_exc()
+
+    # --- sending ---
+
+    def send(self, index, kind, req_id=None, *args):
+        with self._links_lock:
+            link = self._links.get(index)
+        if link is None:
+            return
+        conn, lock = link
+        try:
+            with lock:
+                conn.send((kind, req_id) + args)
+        except (OSError, ValueError):
+            # Gone; supervise() restarts it
+            pass
+
+    def broadcast(self, kind, *args, reply_to=None):
+        """
+        Sends to every worker in one global order. reply_to=(index, req_id)
+        tags the copy that goes to the worker whose request caused it.
+        """
+        origin, req_id = reply_to or (None, None)
+        with self._order:
+            with self._links_lock:
+                indexes = list(self._links)
+            for index in indexes:
+                self.send(index, kind, req_id if index == origin else None, *args)
+
+    def __len__(self):
+        with self._links_lock:
+            return len(self._links)
+
+
+class HubLink:
+    """
+    Worker end. handle(kind, *args) runs on the link's reader thread for
+    every broadcast; its return value answers a pending call().
+    """
+
+    def __init__(self, conn, handle):
+        self.conn = conn
+        self.handle = handle
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # req_id -> [threading.Event, result]
+        self._waiting = {}
+        self._waiting_lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            try:
+                kind, req_id, *args = self.conn.recv()
+            except (EOFError, OSError):
+                # The coordinator is gone: so is this server
+                os._exit(0)
+            result = None
+            try:
+                result = self.handle(kind, *args)
+            except Exception:
+                traceback.print_exc()
+            if req_id is not None:
+                with self._waiting_lock:
+                    waiter = self._waiting.pop(req_id, None)
+                if waiter is not None:
+                    waiter[1] = result
+                    waiter[0].set()
+
+    def send(self, kind, *args, req_id=None):
+        with self._send_lock:
+            self.conn.send((kind, req_id) + args)
+
+    def call(self, kind, *args, timeout=CALL_TIMEOUT):
+        """ Sends a request and returns what handle() returned for the broadcast answering it. """
+        req_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._waiting_lock:
+            self._waiting[req_id] = waiter
+        self.send(kind, *args, req_id=req_id)
+        if not waiter[0].wait(timeout):
+            with self._waiting_lock:
+                self._waiting.pop(req_id, None)
+            raise TimeoutError(f"No answer to {kind} from the coordinator")
+        return waiter[1]
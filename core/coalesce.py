@@ -0,0 +1,144 @@
+# core/coalesce.py
+# Batches raw watchdog events before they reach the caches, versions and
+# push notifications. Events are collected until the tree has been quiet
+# for a short window (or a maximum delay passes), several events on one
+# path collapse into the last meaningful one, and events caused by our own
+# writes are dropped because those writes are announced directly.
+
+import os
+import time
+import threading
+import traceback
+from collections import OrderedDict
+
+# Flush once no event arrived for this long (seconds)...
+COALESCE_WINDOW = 0.25
+# ...or at the latest this long after the first pending event
+COALESCE_MAX_DELAY = 1.0
+
+# How long a path written by the server itself stays muted (seconds)
+SELF_EVENT_TTL = 5.0
+
+
+class _Pending:
+    __slots__ = ("op", "path", "is_dir")
+
+    def __init__(self, op, path, is_dir):
+        self.op = op
+        self.path = path
+        self.is_dir = is_dir
+
+
+class EventCoalescer:
+    """
+    add() is called from the watchdog thread; flush(batch) runs on the
+    coalescer's own thread with batch = [(op, path, is_dir)], one entry per
+    path, op being "added", "updated" or "removed".
+    """
+
+    def __init__(self, flush, window=COALESCE_WINDOW, max_delay=COALESCE_MAX_DELAY):
+        self.flush = flush
+        self.window = window
+        self.max_delay = max_delay
+
+        self._pending = OrderedDict()
+        self._first = None
+        self._last = None
+        self._cond = threading.Condition()
+
+        # path key -> (expiry, recursive) for paths the server is writing
+        self._expected = {}
+
+        # Counters for stats()
+        self.received = 0
+        self.muted = 0
+        self.batches = 0
+        self._rate_mark = (time.monotonic(), 0)
+
+    def _key(self, path):
+        return os.path.normcase(os.path.normpath(path))
+
+    # --- own writes ---
+
+    def expect(self, path, recursive=False, ttl=SELF_EVENT_TTL):
+        """ The server is about to change path (and, with recursive, everything below it). """
+        with self._cond:
+            self._expected[self._key(path)] = (time.monotonic() + ttl, recursive)
+
+    def _is_expected(self, key, now):
+        """ Caller holds self._cond. """
+        for expected, (expiry, recursive) in list(self._expected.items()):
+            if expiry < now:
+                del self._expected[expected]
+            elif key == expected or (recursive and key.startswith(expected.rstrip(os.sep) + os.sep)):
+                return True
+        return False
+
+    # --- collection ---
+
+    def add(self, changes, is_dir=False):
+        """ Queues [(op, path)] from one watchdog event. """
+        now = time.monotonic()
+        with self._cond:
+            self.received += 1
+            for op, path in changes:
+                key = self._key(path)
+                if self._expected and self._is_expected(key, now):
+                    self.muted += 1
+                    continue
+
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = _Pending(op, path, is_dir)
+                else:
+                    # Created then modified is still a creation; anything
+                    # else takes the latest state
+                    if not (op == "updated" and entry.op == "added"):
+                        entry.op = op
+                    entry.is_dir = entry.is_dir or is_dir
+
+                if self._first is None:
+                    self._first = now
+                self._last = now
+            self._cond.notify()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while True:
+                    now = time.monotonic()
+                    deadline = min(self._last + self.window, self._first + self.max_delay)
+                    if now >= deadline:
+                        break
+                    self._cond.wait(deadline - now)
+
+                batch = [(e.op, e.path, e.is_dir) for e in self._pending.values()]
+                self._pending.clear()
+                self._first = self._last = None
+                self.batches += 1
+
+            try:
+                self.flush(batch)
+            except Exception:
+                traceback.print_exc()
+
+    # --- reporting ---
+
+    def stats(self):
+        """ Raw events per second since the previous call, plus running totals. """
+        now = time.monotonic()
+        with self._cond:
+            then, count = self._rate_mark
+            self._rate_mark = (now, self.received)
+            elapsed = max(now - then, 1e-6)
+            return {
+                "events_per_sec": round((self.received - count) / elapsed, 1),
+                "received": self.received,
+                "muted": self.muted,
+                "batches": self.batches,
+            }
@@ -0,0 +1,96 @@
+# core/events.py
+# Fan-out of change events to connected /api/events (Server-Sent Events)
+# clients. Every subscriber has its own bounded queue; a client that falls
+# too far behind, or reconnects after events it missed were dropped from
+# the replay buffer, is sent a single "resync" event and reloads instead.
+
+import threading
+import secrets
+import itertools
+from collections import deque
+
+# Events kept for clients reconnecting with Last-Event-ID
+REPLAY_SIZE = 512
+
+# Undelivered events per subscriber before it is told to resync
+QUEUE_LIMIT = 1024
+
+
+class Event:
+    __slots__ = ("id", "kind", "data")
+
+    def __init__(self, id, kind, data):
+        self.id = id
+        self.kind = kind
+        self.data = data
+
+
+class Subscription:
+    def __init__(self):
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def _push(self, event):
+        """ Caller holds the broker lock. """
+        with self._cond:
+            if len(self._queue) >= QUEUE_LIMIT:
+                self._queue.clear()
+                self._queue.append(Event(None, "resync", {}))
+            else:
+                self._queue.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """ Next event, or None if nothing arrived within timeout. """
+        with self._cond:
+            if not self._queue:
+                self._cond.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+
+class EventBroker:
+    def __init__(self):
+        # Event ids are "<boot>-<n>" so ids from before a restart never match
+        self.boot = secrets.token_hex(4)
+        self._seq = itertools.count(1)
+        self._replay = deque(maxlen=REPLAY_SIZE)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, kind, data, key=None):
+        """
+        Sends an event to every subscriber. key (unique per event) replaces
+        the running number in its id, so that brokers in several processes
+        fed the same events give them the same ids.
+        """
+        with self._lock:
+            event = Event(f"{self.boot}-{key or next(self._seq)}", kind, data)
+            self._replay.append(event)
+            for sub in self._subscribers:
+                sub._push(event)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registers a subscriber. With last_event_id (a reconnecting client),
+        queues the events it missed, or "resync" if they are no longer known.
+        """
+        sub = Subscription()
+        with self._lock:
+            if last_event_id:
+                ids = [event.id for event in self._replay]
+                if last_event_id in ids:
+                    for event in list(self._replay)[ids.index(last_event_id) + 1:]:
+                        sub._push(event)
+                else:
+                    sub._push(Event(None, "resync", {}))
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
@@ -0,0 +1,99 @@
+# core/foldersizes.py
+# Recursive byte and file totals of every folder in the share.
+# Fed by the hash index, which already knows the size of every file: each
+# file recorded, resized or forgotten adjusts the totals of all folders
+# above it by the difference, so totals are never recomputed by walking.
+# A per-folder stamp changes whenever its total does, which lets cached
+# listings that show totals tell when they went stale.
+
+import os
+import heapq
+import threading
+
+
+class FolderSizes:
+    def __init__(self):
+        self.root = None
+        # folder key -> [bytes, files] below it (recursive)
+        self._totals = {}
+        # folder key -> counter value of its last change
+        self._stamps = {}
+        # folder key -> the folder's path as spelled on disk (keys are normcased)
+        self._paths = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _key(self, path):
+        return os.path.normcase(os.path.normpath(path))
+
+    def reset(self, root, files):
+        """ Rebuilds all totals for root from [(file path, size)]. """
+        with self._lock:
+            self.root = self._key(root)
+            self._totals = {}
+            self._stamps = {}
+            self._paths = {}
+            self._counter += 1
+            for path, size in files:
+                self._add(path, size, 1)
+
+    def add(self, path, delta_bytes, delta_files):
+        """ A file below the root changed by delta_bytes (and delta_files: +1 new, -1 gone). """
+        with self._lock:
+            self._counter += 1
+            self._add(path, delta_bytes, delta_files)
+
+    def _add(self, path, delta_bytes, delta_files):
+        """ Caller holds self._lock. """
+        if self.root is None:
+            return
+        spelled = os.path.dirname(os.path.normpath(path))
+        folder = self._key(spelled)
+        while True:
+            if folder not in self._paths or delta_files > 0:
+                self._paths[folder] = spelled
+            total = self._totals.get(folder)
+            if total is None:
+                total = self._totals[folder] = [0, 0]
+            total[0] += delta_bytes
+            total[1] += delta_files
+            self._stamps[folder] = self._counter
+            if total[1] <= 0:
+                # Nothing left below it
+                del self._totals[folder]
+                self._paths.pop(folder, None)
+            if folder == self.root or len(folder) <= len(self.root):
+                break
+            up = os.path.dirname(folder)
+            if up == folder:
+                break
+            folder = up
+            spelled = os.path.dirname(spelled)
+
+    def total(self, path):
+        """ (bytes, files) below path; (0, 0) for empty or unknown folders. """
+        with self._lock:
+            total = self._totals.get(self._key(path))
+        return (total[0], total[1]) if total else (0, 0)
+
+    def stamp(self, path):
+        """ Changes whenever the total of path (or of any folder below it) does. """
+        with self._lock:
+            return self._stamps.get(self._key(path), 0)
+
+    def largest(self, within, limit=20, max_depth=None):
+        """
+        Folders below within (not within itself) with the most bytes, as
+        [(path, bytes, files)]. max_depth=1 considers direct subfolders only.
+        """
+        base = self._key(within)
+        prefix = base.rstrip(os.sep) + os.sep
+        with self._lock:
+            candidates = []
+            for key, (size, files) in self._totals.items():
+                if not key.startswith(prefix):
+                    continue
+                if max_depth is not None and key[len(prefix):].count(os.sep) >= max_depth:
+                    continue
+                candidates.append((self._paths.get(key, key), size, files))
+        return heapq.nlargest(limit, candidates, key=lambda c: c[1])
@@ -5,10 +5,18 @@ import pyperclip # Need this for clipboard action
 from .utils import read_env_file 
 
 try:
-    from config import DEFAULT_PASSWORD, PORT
+    from config import DEFAULT_PASSWORD, PORT, ARCHIVE_CACHE_MB, THUMB_CACHE_MB
+    from config import SERVER_BACKEND, SERVER_THREADS, SERVER_BACKLOG, SERVER_SOCKET_BUFFER_KB, SERVER_PROCESSES
 except ImportError:
     DEFAULT_PASSWORD = "admin"
     PORT = 2004
+    ARCHIVE_CACHE_MB = 4096
+    THUMB_CACHE_MB = 512
+    SERVER_BACKEND = "waitress"
+    SERVER_THREADS = 32
+    SERVER_BACKLOG = 1024
+    SERVER_SOCKET_BUFFER_KB = 1024
+    SERVER_PROCESSES = 1
 
 # --- COLOR PALETTE ---
 class Palette:
@@ -177,6 +185,12 @@ class AppGUI(ft.Column):
         self.ngrok_switch = ft.Switch(value=False, on_change=self.toggle_field, active_color=Palette.ACCENT)
         self.ngrok_token_field = ft.TextField(hint_text="Ngrok Auth Token", disabled=True, expand=True, border_color=Palette.BORDER, bgcolor=Palette.INPUT_BG, border_radius=8, filled=True, password=True, can_reveal_password=True, text_size=13, height=45, content_padding=10)
         self.port_field = ft.TextField(value=str(PORT), label="Port", width=100, text_align=ft.TextAlign.CENTER, border_color=Palette.BORDER, bgcolor=Palette.INPUT_BG, border_radius=8, filled=True, text_size=13, height=45, content_padding=10, keyboard_type=ft.KeyboardType.NUMBER)
+        self.backend_dropdown = ft.Dropdown(
+            value=SERVER_BACKEND, width=240, border_color=Palette.BORDER, bgcolor=Palette.INPUT_BG, border_radius=8, filled=True, text_size=13, content_padding=10,
+            options=[ft.dropdown.Option("waitress", "Production (waitress)"), ft.dropdown.Option("aiohttp", "Async (aiohttp)"), ft.dropdown.Option("werkzeug", "Development (werkzeug)")],
+        )
+        self.threads_field = ft.TextField(value=str(SERVER_THREADS), label="Workers", width=100, text_align=ft.TextAlign.CENTER, border_color=Palette.BORDER, bgcolor=Palette.INPUT_BG, border_radius=8, filled=True, text_size=13, height=45, content_padding=10, keyboard_type=ft.KeyboardType.NUMBER)
+        self.processes_field = ft.TextField(value=str(SERVER_PROCESSES), label="Processes", width=100, text_align=ft.TextAlign.CENTER, border_color=Palette.BORDER, bgcolor=Palette.INPUT_BG, border_radius=8, filled=True, text_size=13, height=45, content_padding=10, keyboard_type=ft.KeyboardType.NUMBER)
 
         network_card = ft.Container(
             bgcolor=Palette.CARD_BG,
@@ -187,6 +201,8 @@ class AppGUI(ft.Column):
                 ft.Divider(color=Palette.BORDER, height=20),
                 ft.Row([ft.Icon(ft.Icons.SETTINGS_ETHERNET, color=Palette.ACCENT), ft.Text("Server Port:", color=Palette.TEXT_HEAD), self.port_field]),
                 ft.Container(height=5),
+                ft.Row([ft.Icon(ft.Icons.DNS_OUTLINED, color=Palette.ACCENT), ft.Text("Server Engine:", color=Palette.TEXT_HEAD), self.backend_dropdown, self.threads_field, self.processes_field]),
+                ft.Container(height=5),
                 ft.Row([
                     ft.Icon(ft.Icons.PUBLIC, color="purple"), ft.Text("Public Link (Ngrok)", color=Palette.TEXT_HEAD),
                     ft.Container(expand=True), self.ngrok_switch, ft.Container(width=20), ft.Container(content=self.ngrok_token_field, width=300)
@@ -206,6 +222,8 @@ class AppGUI(ft.Column):
         self.log_view = ft.ListView(expand=True, spacing=2, auto_scroll=True)
         self.log_container = ft.Container(content=self.log_view, bgcolor=Palette.INPUT_BG, border_radius=8, padding=15, height=250, border=ft.border.all(1, Palette.BORDER))
         self.log_view.controls.append(ft.Text("Logs will appear here...", color=Palette.TEXT_SUB, font_family="Consolas", size=12, selectable=True))
+        self.event_rate_text = ft.Text("File events: -", color=Palette.TEXT_SUB, size=12)
+        logs_header = ft.Row([ft.Text("Logs", weight=ft.FontWeight.BOLD), self.event_rate_text], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
 
         # --- 6. LAYOUT ---
         self.stop_btn = ft.ElevatedButton("Stop Server", icon=ft.Icons.STOP_CIRCLE_OUTLINED, on_click=self.on_stop_server, disabled=True, style=ft.ButtonStyle(bgcolor={"": Palette.DANGER, "disabled": Palette.BORDER}, color={"": "white", "disabled": Palette.TEXT_SUB}, padding=20, shape=ft.RoundedRectangleBorder(radius=8)), expand=True)
@@ -215,7 +233,7 @@ class AppGUI(ft.Column):
 
         self.controls = [
             self.customize_dialog, self.logo_picker,
-            ft.Container(content=ft.Column([header, ft.Divider(color="transparent", height=10), path_section, roles_card, network_card, url_section, ft.Text("Logs", weight=ft.FontWeight.BOLD), self.log_container], spacing=20), padding=ft.padding.only(bottom=20)),
+            ft.Container(content=ft.Column([header, ft.Divider(color="transparent", height=10), path_section, roles_card, network_card, url_section, logs_header, self.log_container], spacing=20), padding=ft.padding.only(bottom=20)),
             bottom_bar
         ]
         
@@ -267,6 +285,26 @@ class AppGUI(ft.Column):
         if "MAX_UPLOAD_SIZE" in env:
             self.max_size_field.value = env["MAX_UPLOAD_SIZE"]
 
+        # --- 6. UPLOAD ENGINE ---
+        self.direct_upload = env.get("DIRECT_UPLOAD", "1").lower() not in ("0", "false", "no", "off")
+        self.dedup_uploads = env.get("DEDUP_UPLOADS", "1").lower() not in ("0", "false", "no", "off")
+
+        # --- 7. DOWNLOADS ---
+        self.archive_cache_mb = env.get("ARCHIVE_CACHE_MB", str(ARCHIVE_CACHE_MB))
+
+        # --- 8. PREVIEWS ---
+        self.thumb_cache_mb = env.get("THUMB_CACHE_MB", str(THUMB_CACHE_MB))
+
+        # --- 9. HTTP SERVER ---
+        if "SERVER_BACKEND" in env:
+            self.backend_dropdown.value = env["SERVER_BACKEND"].lower()
+        if "SERVER_THREADS" in env:
+            self.threads_field.value = env["SERVER_THREADS"]
+        if "SERVER_PROCESSES" in env:
+            self.processes_field.value = env["SERVER_PROCESSES"]
+        self.server_backlog = env.get("SERVER_BACKLOG", str(SERVER_BACKLOG))
+        self.server_socket_buffer_kb = env.get("SERVER_SOCKET_BUFFER_KB", str(SERVER_SOCKET_BUFFER_KB))
+
     # --- HELPERS ---
     def _make_pass_field(self, hint, enabled):
         return ft.TextField(hint_text=hint, disabled=not enabled, expand=True, border_color=Palette.BORDER, bgcolor=Palette.INPUT_BG, border_radius=8, filled=True, password=True, can_reveal_password=True, text_size=13, height=45, content_padding=10)
@@ -323,6 +361,15 @@ class AppGUI(ft.Column):
             "brand_title": self.custom_title.value, "brand_subtitle": self.custom_subtitle.value, "brand_logo": self.custom_image_path.value,
             "enable_ngrok": self.ngrok_switch.value, "ngrok_token": self.ngrok_token_field.value,
             "max_upload_size": self.max_size_field.value,
+            "direct_upload": self.direct_upload,
+            "dedup_uploads": self.dedup_uploads,
+            "archive_cache_mb": self.archive_cache_mb,
+            "thumb_cache_mb": self.thumb_cache_mb,
+            "server_backend": self.backend_dropdown.value,
+            "server_threads": self.threads_field.value,
+            "server_processes": self.processes_field.value,
+            "server_backlog": self.server_backlog,
+            "server_socket_buffer_kb": self.server_socket_buffer_kb,
         }
     
 
@@ -336,6 +383,9 @@ class AppGUI(ft.Column):
         self.start_btn.disabled = is_running
         self.stop_btn.disabled = not is_running
         self.port_field.disabled = is_running
+        self.backend_dropdown.disabled = is_running
+        self.threads_field.disabled = is_running
+        self.processes_field.disabled = is_running
         if is_running:
             self.status_badge.content.value = "Status: Online"; self.status_badge.content.color = Palette.SUCCESS; self.status_badge.border = ft.border.all(1, Palette.SUCCESS); self.status_badge.bgcolor = ft.Colors.with_opacity(0.1, Palette.SUCCESS)
         else:
@@ -350,6 +400,11 @@ class AppGUI(ft.Column):
         self.log_view.update()
         self.log_view.scroll_to(offset=-1, duration=300)
 
+    def set_event_stats(self, stats: dict):
+        """ Shows the server's filesystem event rate (from its stats log lines). """
+        self.event_rate_text.value = f"File events: {stats.get('events_per_sec', 0)}/s · {stats.get('batches', 0)} batches · {stats.get('subscribers', 0)} live clients"
+        self.event_rate_text.update()
+
     def set_urls(self, local_url: str, public_url: str):
         self.local_url_field.value = local_url if local_url else "Server is offline"
         self.public_url_field.value = public_url if public_url else "Ngrok link not available"
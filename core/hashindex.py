@@ -0,0 +1,289 @@
+# core/hashindex.py
+# Persistent map of file path -> size, mtime and SHA-256 for files in the
+# shared folder. An entry's digest is only trusted while the file's size and
+# mtime still match what was recorded, so stale digests are never reported.
+#
+# Sizes of every file are indexed by a background walk and kept current from
+# watchdog events. Digests are filled in lazily: by completed uploads, and on
+# demand when an incoming upload has the same size as an existing file
+# (the only case where deduplication can apply). This avoids reading the
+# whole share just to build the index.
+#
+# Every size change is also passed on to an optional FolderSizes, which
+# keeps recursive folder totals from these deltas.
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Minimum delay between two writes of the index file (seconds)
+SAVE_INTERVAL = 30
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class HashIndex:
+    def __init__(self, index_path, ignore=None, sizes=None):
+        self.index_path = index_path
+        self.root = None
+        # ignore(path) -> True for files that must never be indexed
+        self.ignore = ignore or (lambda path: False)
+        # FolderSizes told about every size change, if any
+        self.sizes = sizes
+
+        self._entries = {}
+        self._by_size = {}
+        self._lock = threading.Lock()
+        self._hash_locks = {}
+
+        self._dirty = False
+        self._last_save = 0.0
+        # True once the background walk has reconciled the index with the disk
+        self.ready = False
+        # False in processes that only read the file another one maintains
+        self.persist = True
+
+    # --- persistence ---
+
+    def load(self, root):
+        """ Loads the index for root; an index of another folder is discarded. """
+        root = os.path.normcase(os.path.normpath(root))
+        entries = {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("root") == root:
+                entries = data.get("entries", {})
+        except (OSError, ValueError):
+            pass
+
+        with self._lock:
+            self.root = root
+            self._entries = entries
+            self._by_size = {}
+            for key, entry in entries.items():
+                self._by_size.setdefault(entry["size"], set()).add(key)
+            if self.sizes is not None:
+                self.sizes.reset(root, ((key, entry["size"]) for key, entry in entries.items()))
+
+    def save(self, force=True):
+        if not self.persist:
+            return
+        with self._lock:
+            if not force and (not self._dirty or time.time() - self._last_save < SAVE_INTERVAL):
+                return
+            data = {"root": self.root, "entries": dict(self._entries)}
+            self._dirty = False
+            self._last_save = time.time()
+
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+    def start(self):
+        """ Reconciles the loaded index with the disk in a background thread. """
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            self.scan()
+        except Exception:
+            pass
+        self.ready = True
+        while True:
+            time.sleep(SAVE_INTERVAL)
+            self.save(force=False)
+
+    def scan(self):
+        """ Walks the share once: records new/changed files and forgets deleted ones. """
+        seen = set()
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if self.ignore(path):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(self._key(path))
+                self._record(path, st)
+
+        with self._lock:
+            gone = [key for key in self._entries if key not in seen]
+        for key in gone:
+            self._forget(key)
+        self.save()
+
+    # --- bookkeeping ---
+
+    def _key(self, path):
+        return os.path.normcase(os.path.normpath(path))
+
+    def _record(self, path, st, sha256=None):
+        """ Stores size/mtime of path; the digest is kept only if the file is unchanged. """
+        key = self._key(path)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                unchanged = old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns
+                if unchanged and sha256 is None:
+                    return
+                self._by_size.get(old["size"], set()).discard(key)
+                if unchanged:
+                    sha256 = sha256 or old["sha256"]
+
+            if self.sizes is not None:
+                if old is None:
+                    self.sizes.add(path, st.st_size, 1)
+                elif old["size"] != st.st_size:
+                    self.sizes.add(path, st.st_size - old["size"], 0)
+
+            self._entries[key] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": sha256,
+            }
+            self._by_size.setdefault(st.st_size, set()).add(key)
+            self._dirty = True
+
+    def _forget(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._by_size.get(entry["size"], set()).discard(key)
+                self._dirty = True
+                if self.sizes is not None:
+                    self.sizes.add(key, -entry["size"], -1)
+
+    def put(self, path, sha256, st=None):
+        self._record(path, st or os.stat(path), sha256)
+        self.save(force=False)
+
+    def get(self, path, st=None):
+        """ Returns the recorded digest of path if the file is unchanged, else None. """
+        with self._lock:
+            entry = self._entries.get(self._key(path))
+        if entry is None or entry["sha256"] is None:
+            return None
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return None
+        if entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            return None
+        return entry["sha256"]
+
+    # --- watchdog ---
+
+    def touch(self, path):
+        """ A file was created or modified (or a folder created, e.g. moved in with its content). """
+        if self.ignore(path):
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return self.remove(path)
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for name in filenames:
+                    self.touch(os.path.join(dirpath, name))
+            return
+        self._record(path, st)
+
+    def remove(self, path):
+        """ A file or a whole directory was deleted. """
+        key = self._key(path)
+        prefix = key.rstrip(os.sep) + os.sep
+        with self._lock:
+            if key in self._entries:
+                doomed = [key]
+            else:
+                doomed = [k for k in self._entries if k.startswith(prefix)]
+        for k in doomed:
+            self._forget(k)
+
+    def move(self, src, dest):
+        key = self._key(src)
+        with self._lock:
+            entry = self._entries.get(key)
+        self.remove(src)
+        if os.path.isdir(dest):
+            for dirpath, _, filenames in os.walk(dest):
+                for name in filenames:
+                    self.touch(os.path.join(dirpath, name))
+            return
+        self.touch(dest)
+        if entry is not None and entry["sha256"]:
+            # Same bytes under a new name: keep the digest if size/mtime agree
+            try:
+                st = os.stat(dest)
+            except OSError:
+                return
+            if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+                self._record(dest, st, entry["sha256"])
+
+    # --- deduplication ---
+
+    def has_size(self, size):
+        with self._lock:
+            return bool(self._by_size.get(size))
+
+    def _ensure_hashed(self, key):
+        """ Returns the digest of key, hashing the file now if needed (one thread per file). """
+        with self._lock:
+            lock = self._hash_locks.setdefault(key, threading.Lock())
+
+        with lock:
+            digest = self.get(key)
+            if digest is not None:
+                return digest
+            try:
+                st = os.stat(key)
+                digest = hash_file(key)
+            except OSError:
+                self._forget(key)
+                return None
+            self._record(key, st, digest)
+            return digest
+
+    def prepare(self, size):
+        """ Starts hashing same-size candidates early, while the client hashes its file. """
+        with self._lock:
+            keys = list(self._by_size.get(size, ()))
+        if keys:
+            threading.Thread(
+                target=lambda: [self._ensure_hashed(k) for k in keys],
+                daemon=True,
+            ).start()
+        return bool(keys)
+
+    def find(self, size, sha256):
+        """ Returns the path of an existing file with exactly this content, or None. """
+        with self._lock:
+            keys = list(self._by_size.get(size, ()))
+        for key in keys:
+            if self._ensure_hashed(key) == sha256:
+                return key
+        return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
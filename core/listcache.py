@@ -0,0 +1,101 @@
+# core/listcache.py
+# Bounded LRU cache of per-directory listing data: sorted indexes, serialized
+# /api/browse pages and child counts.
+# Entries are evicted precisely when something changes under their directory
+# (watchdog events and our own write endpoints), so a repeated browse of an
+# unchanged folder is a dictionary lookup.
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class ListingCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Counts invalidations
+        self._epoch = 0
+        # Epoch of the last change per directory, and per subtree for
+        # recursive invalidations; together they version every directory,
+        # and a listing built across a change to its own is not stored
+        self._stamps = {}
+        self._tree_stamps = {}
+        self._cleared = 0
+
+    def _norm(self, path):
+        return os.path.normcase(os.path.normpath(path))
+
+    def generation(self, directory):
+        """
+        Epoch of the last invalidation that affected directory (0 if none
+        since startup). Unchanged directories keep their generation.
+        """
+        path = self._norm(directory)
+        with self._lock:
+            return self._generation(path)
+
+    def _generation(self, path):
+        stamp = max(self._cleared, self._stamps.get(path, 0))
+        while True:
+            stamp = max(stamp, self._tree_stamps.get(path, 0))
+            parent = os.path.dirname(path)
+            if parent == path:
+                return stamp
+            path = parent
+
+    def get(self, directory, variant=""):
+        key = (self._norm(directory), variant)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, directory, value, generation, variant=""):
+        """
+        Stores a listing unless directory changed since its generation was
+        read (before the listing was built). Changes elsewhere don't matter.
+        """
+        path = self._norm(directory)
+        key = (path, variant)
+        with self._lock:
+            if generation != self._generation(path):
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path, recursive=False):
+        """
+        Something changed at path: drops everything cached for its parent
+        directory. With recursive, also drops path itself and everything
+        below it (deleted or moved directories).
+        """
+        path = self._norm(path)
+        parent = os.path.dirname(path)
+        prefix = path.rstrip(os.sep) + os.sep
+
+        with self._lock:
+            self._epoch += 1
+            self._stamps[parent] = self._epoch
+            if recursive:
+                self._tree_stamps[path] = self._epoch
+            for key in list(self._entries):
+                directory = key[0]
+                if directory == parent or (
+                    recursive and (directory == path or directory.startswith(prefix))
+                ):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._cleared = self._epoch
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
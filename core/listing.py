@@ -0,0 +1,118 @@
+# core/listing.py
+# Sorted, paginated views of a single directory for /api/browse.
+# A directory is read once with os.scandir into compact tuples; type and
+# stat information come from the DirEntry, and files are only stat()ed
+# when the requested sort order needs their size or mtime. Pages are cut
+# from the sorted index with a cursor (the sort key of the last row sent),
+# so paging stays correct while entries are added or removed in between.
+
+import os
+import json
+import base64
+from bisect import bisect_left, bisect_right
+
+SORT_ORDERS = ("name", "type", "size", "mtime")
+
+
+class DirEntryInfo:
+    """ What the listing keeps per entry; size/mtime may be None until stat()ed. """
+
+    __slots__ = ("name", "is_dir", "size", "mtime_ns")
+
+    def __init__(self, name, is_dir, size=None, mtime_ns=None):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+
+def _sort_key(info, sort, file_type):
+    if sort == "type":
+        return (not info.is_dir, "folder" if info.is_dir else file_type(info.name), info.name)
+    if sort == "size":
+        return (0 if info.is_dir else info.size, info.name)
+    if sort == "mtime":
+        return (info.mtime_ns, info.name)
+    return (info.name,)
+
+
+class DirectoryIndex:
+    """ All entries of one directory, sorted ascending by one sort order. """
+
+    def __init__(self, sort, entries, keys):
+        self.sort = sort
+        self.entries = entries
+        self.keys = keys
+
+    @classmethod
+    def build(cls, path, sort="name", skip=None, file_type=None):
+        """
+        Scans path once. skip(name) -> True hides an entry; file_type(name)
+        classifies files for the "type" order.
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order: {sort}")
+        needs_stat = sort in ("size", "mtime")
+
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if skip and skip(entry.name):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                    info = DirEntryInfo(entry.name, is_dir)
+                    if needs_stat:
+                        st = entry.stat()
+                        info.size = 0 if is_dir else st.st_size
+                        info.mtime_ns = st.st_mtime_ns
+                except OSError:
+                    # Vanished or unreadable between readdir and stat
+                    continue
+                entries.append(info)
+
+        decorated = sorted(
+            ((_sort_key(info, sort, file_type), info) for info in entries),
+            key=lambda pair: pair[0],
+        )
+        return cls(sort, [info for _, info in decorated], [key for key, _ in decorated])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def page(self, limit, cursor=None, descending=False):
+        """ Returns (entries, next_cursor) for the rows after cursor. """
+        if descending:
+            end = len(self.keys) if cursor is None else bisect_left(self.keys, cursor)
+            start = max(0, end - limit)
+            rows = self.entries[start:end][::-1]
+            more = start > 0
+        else:
+            start = 0 if cursor is None else bisect_right(self.keys, cursor)
+            end = start + limit
+            rows = self.entries[start:end]
+            more = end < len(self.keys)
+
+        if not rows or not more:
+            return rows, None
+        last = end - 1 if not descending else start
+        return rows, encode_cursor(self.keys[last])
+
+
+def encode_cursor(key):
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """ Inverse of encode_cursor; raises ValueError on garbage. """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or not key:
+        raise ValueError("Invalid cursor")
+    return tuple(key)
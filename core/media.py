@@ -0,0 +1,186 @@
+# core/media.py
+# Byte-range and validator helpers for streaming files to browsers.
+# Covers what media players need when scrubbing: single ranges (206),
+# multiple ranges (multipart/byteranges), suffix ranges, If-Range, and a
+# strong ETag built from size and mtime so unchanged files revalidate
+# with a 304 instead of being re-sent.
+
+import os
+import secrets
+import mimetypes
+
+from werkzeug.http import http_date, parse_date, parse_etags, parse_if_range_header
+
+# Bytes per read when sending a range
+RANGE_BLOCK_SIZE = 512 * 1024
+
+# Requests asking for more pieces than this get the whole file instead
+MAX_RANGES = 16
+
+
+def file_etag(st):
+    """ Strong validator: changes whenever size or mtime does. """
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def parse_ranges(header, size):
+    """
+    Parses a Range header against a file of size bytes.
+    Returns None when the header is absent or not understood (serve the
+    whole file), [] when no range is satisfiable (416), else a sorted list
+    of merged (start, end) pairs with end exclusive.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if not first:
+                # Suffix range: the last N bytes
+                n = int(last)
+                if n <= 0:
+                    continue
+                start, end = max(0, size - n), size
+            else:
+                start = int(first)
+                end = int(last) + 1 if last else size
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        if start < 0 or end <= start:
+            return None
+        ranges.append((start, min(end, size)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def iter_range(path, start, end, block_size=RANGE_BLOCK_SIZE):
+    """ Yields bytes [start, end) of path. """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        offset = start
+        if not hasattr(os, "pread"):
+            os.lseek(fd, start, os.SEEK_SET)
+        while offset < end:
+            n = min(block_size, end - offset)
+            data = os.pread(fd, n, offset) if hasattr(os, "pread") else os.read(fd, n)
+            if not data:
+                break
+            offset += len(data)
+            yield data
+    finally:
+        os.close(fd)
+
+
+def multipart_parts(ranges, size, content_type, boundary):
+    """ (part header bytes, start, end) for each range of a multipart/byteranges body. """
+    return [
+        (
+            (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+            ).encode("latin-1"),
+            start,
+            end,
+        )
+        for start, end in ranges
+    ]
+
+
+def multipart_length(parts, boundary):
+    closing = len(f"\r\n--{boundary}--\r\n")
+    return sum(len(header) + end - start for header, start, end in parts) + closing
+
+
+def iter_multipart(path, parts, boundary, block_size=RANGE_BLOCK_SIZE):
+    for header, start, end in parts:
+        yield header
+        yield from iter_range(path, start, end, block_size)
+    yield f"\r\n--{boundary}--\r\n".encode("latin-1")
+
+
+def plan_file_response(full_path, request_headers):
+    """
+    How to answer a GET of a file: ETag/Last-Modified revalidation, single
+    (206) and multiple (multipart/byteranges) ranges, If-Range.
+    Returns (status, headers, body), body being None (no body),
+    ("file", size), ("range", start, end) or ("multipart", parts, boundary).
+    """
+    st = os.stat(full_path)
+    etag = file_etag(st)
+    mimetype = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(st.st_mtime),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+
+    if_none_match = parse_etags(request_headers.get("If-None-Match"))
+    if if_none_match:
+        not_modified = if_none_match.contains_weak(etag)
+    else:
+        since = parse_date(request_headers.get("If-Modified-Since"))
+        not_modified = since is not None and int(st.st_mtime) <= since.timestamp()
+    if not_modified:
+        return 304, headers, None
+
+    ranges = parse_ranges(request_headers.get("Range"), st.st_size)
+    if_range = parse_if_range_header(request_headers.get("If-Range"))
+    if ranges is not None and if_range.etag is not None:
+        # Ranges of an older version would be spliced into the new one
+        if if_range.etag != etag:
+            ranges = None
+    elif ranges is not None and if_range.date is not None:
+        if int(st.st_mtime) > if_range.date.timestamp():
+            ranges = None
+
+    if ranges is None:
+        headers["Content-Type"] = mimetype
+        headers["Content-Length"] = str(st.st_size)
+        return 200, headers, ("file", st.st_size)
+
+    if not ranges:
+        headers["Content-Range"] = f"bytes */{st.st_size}"
+        return 416, headers, None
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{st.st_size}"
+        headers["Content-Type"] = mimetype
+        headers["Content-Length"] = str(end - start)
+        return 206, headers, ("range", start, end)
+
+    boundary = secrets.token_hex(16)
+    parts = multipart_parts(ranges, st.st_size, mimetype, boundary)
+    headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+    headers["Content-Length"] = str(multipart_length(parts, boundary))
+    return 206, headers, ("multipart", parts, boundary)
+
+
+def iter_file_body(full_path, body, block_size=RANGE_BLOCK_SIZE):
+    """ The bytes of a plan_file_response() body. """
+    if body[0] == "file":
+        return iter_range(full_path, 0, body[1], block_size)
+    if body[0] == "range":
+        return iter_range(full_path, body[1], body[2], block_size)
+    return iter_multipart(full_path, body[1], body[2], block_size)
@@ -0,0 +1,181 @@
+# core/preview.py
+# Partial reads of large text files: the first or last N bytes, a range
+# of lines, or whatever was appended since an offset (tailing a log).
+# Everything is read with seeks, so a preview of a multi-GB file costs
+# about as much as the bytes it returns. Line ranges use a sparse index
+# of line-start offsets (one checkpoint per LINE_INDEX_STEP lines) built
+# on first use and extended when the file grows.
+
+import os
+import threading
+from collections import OrderedDict
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+# One checkpoint every this many lines
+LINE_INDEX_STEP = 1000
+
+# Line indexes kept in memory
+LINE_INDEX_CACHE = 32
+
+
+def decode(data):
+    return data.decode("utf-8", errors="replace")
+
+
+def read_head(path, nbytes):
+    """ (text, end offset, more follows) of the first nbytes, cut at the last complete line. """
+    with open(path, "rb") as f:
+        data = f.read(nbytes + 1)
+    more = len(data) > nbytes
+    data = data[:nbytes]
+    if more:
+        cut = data.rfind(b"\n")
+        if cut >= 0:
+            data = data[:cut + 1]
+    return decode(data), len(data), more
+
+
+def read_tail(path, nbytes):
+    """ (text, start offset, file size) of the last nbytes, starting at a line boundary. """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(0, size - nbytes)
+        f.seek(start)
+        data = f.read(size - start)
+    if start > 0:
+        cut = data.find(b"\n")
+        if 0 <= cut < len(data) - 1:
+            start += cut + 1
+            data = data[cut + 1:]
+    return decode(data), start, start + len(data)
+
+
+def read_from(path, offset, nbytes):
+    """
+    (text, start, end, file size) of what follows offset, at most nbytes
+    and ending at a complete line while more is available. An offset past
+    the end (the file was truncated or rotated) restarts at 0.
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if offset > size:
+            offset = 0
+        f.seek(offset)
+        data = f.read(min(nbytes, size - offset))
+    if offset + len(data) < size:
+        cut = data.rfind(b"\n")
+        if cut >= 0:
+            data = data[:cut + 1]
+    return decode(data), offset, offset + len(data), size
+
+
+class _LineIndex:
+    __slots__ = ("checkpoints", "scanned", "lines", "mtime_ns", "lock")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # checkpoints[i] = byte offset where line i * LINE_INDEX_STEP starts
+        self.checkpoints = [0]
+        # Bytes scanned so far, and complete lines found in them
+        self.scanned = 0
+        self.lines = 0
+        self.mtime_ns = None
+
+
+class LineReader:
+    """ Line ranges of files via sparse, cached line indexes. """
+
+    def __init__(self, max_files=LINE_INDEX_CACHE):
+        self.max_files = max_files
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index_for(self, path):
+        key = os.path.normcase(os.path.normpath(path))
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = _LineIndex()
+                while len(self._indexes) > self.max_files:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(key)
+        return index
+
+    def _scan(self, f, index, size, until_line):
+        """ Extends index until it covers until_line or the end of the file. """
+        f.seek(index.scanned)
+        while index.scanned < size and index.lines <= until_line:
+            data = f.read(min(READ_BLOCK_SIZE, size - index.scanned))
+            if not data:
+                break
+            pos = 0
+            while True:
+                nl = data.find(b"\n", pos)
+                if nl < 0:
+                    break
+                index.lines += 1
+                pos = nl + 1
+                if index.lines % LINE_INDEX_STEP == 0:
+                    index.checkpoints.append(index.scanned + pos)
+            index.scanned += len(data)
+
+    def read_lines(self, path, start, count, max_bytes):
+        """
+        Lines start .. start + count - 1 (0-based) as (lines, total lines
+        known so far, whole file indexed). Stops early at max_bytes.
+        """
+        index = self._index_for(path)
+        with index.lock, open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            # Anything but growth (rewrite, truncation) invalidates the index
+            if index.mtime_ns != st.st_mtime_ns:
+                if st.st_size < index.scanned or not self._same_prefix(f, index):
+                    index.reset()
+                index.mtime_ns = st.st_mtime_ns
+
+            self._scan(f, index, st.st_size, start + count)
+
+            checkpoint = min(start // LINE_INDEX_STEP, len(index.checkpoints) - 1)
+            f.seek(index.checkpoints[checkpoint])
+            line_no = checkpoint * LINE_INDEX_STEP
+
+            # Read in bounded pieces: a single line may be gigabytes long
+            lines, parts, used = [], [], 0
+            while line_no < start + count and used < max_bytes:
+                raw = f.readline(READ_BLOCK_SIZE)
+                if not raw:
+                    break
+                if line_no >= start:
+                    piece = raw[:max_bytes - used]
+                    used += len(piece)
+                    parts.append(piece)
+                if raw.endswith(b"\n"):
+                    if line_no >= start:
+                        lines.append(decode(b"".join(parts)).rstrip("\r\n"))
+                        parts = []
+                    line_no += 1
+            if parts:
+                lines.append(decode(b"".join(parts)).rstrip("\r\n"))
+
+            complete = index.scanned >= st.st_size
+            total = index.lines + (1 if complete and st.st_size and not self._ends_with_newline(f, st.st_size) else 0)
+        return lines, total, complete
+
+    @staticmethod
+    def _ends_with_newline(f, size):
+        f.seek(size - 1)
+        return f.read(1) == b"\n"
+
+    @staticmethod
+    def _same_prefix(f, index):
+        """ A grown file still has a line break where the last checkpoint says a line starts. """
+        offset = index.checkpoints[-1]
+        if offset == 0:
+            return True
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
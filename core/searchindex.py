@@ -0,0 +1,435 @@
+# core/searchindex.py
+# Filename index of the whole shared folder for /api/search.
+# Every folder's entries are stored together with the folder's mtime, and
+# the index is persisted next to the app. After a restart only folders
+# whose mtime changed are listed again (adding, removing or renaming an
+# entry changes its folder's mtime), so the tree is not re-walked.
+#
+# Queries run against a flat snapshot: all names, lowercased, joined by
+# newlines into one string. Substring and prefix matches are then plain
+# str.find() calls over that string, which takes milliseconds for
+# hundreds of thousands of names. The snapshot is rebuilt on the first
+# search after a change.
+
+import os
+import json
+import time
+import bisect
+import threading
+from itertools import accumulate
+
+# Minimum delay between two writes of the index file (seconds)
+SAVE_INTERVAL = 30
+
+# Matches collected per query before ranking (bounds work on "a"-like queries)
+MAX_CANDIDATES = 20000
+
+# Changes applied on top of a snapshot before it is rebuilt
+OVERLAY_LIMIT = 5000
+
+
+class _Snapshot:
+    __slots__ = ("rows", "blob", "starts", "by_ext")
+
+    def __init__(self, rows):
+        # rows: [(relative path, lowercased name, is_dir)]
+        self.rows = rows
+        names = [name for _, name, _ in rows]
+        # "\n" + every name + "\n", so "\nfoo" finds names starting with foo
+        self.blob = "\n" + "\n".join(names) + "\n"
+        # Offset of each name in blob
+        self.starts = list(accumulate((len(name) + 1 for name in names), initial=1))[:-1]
+
+        self.by_ext = {}
+        for i, (_, name, is_dir) in enumerate(rows):
+            if not is_dir:
+                dot = name.rfind(".")
+                if dot > 0:
+                    self.by_ext.setdefault(name[dot:], []).append(i)
+
+    def row_at(self, pos):
+        """ Index of the row whose name contains blob offset pos. """
+        return bisect.bisect_right(self.starts, pos) - 1
+
+    def find(self, needle, limit, accept=None):
+        """ Row indexes whose names contain needle and pass accept(i) (in row order, at most limit). """
+        # A prefix needle matches at the newline before the name
+        shift = 1 if needle.startswith("\n") else 0
+        found = []
+        pos = self.blob.find(needle)
+        while pos >= 0 and len(found) < limit:
+            i = self.row_at(pos + shift)
+            if accept is None or accept(i):
+                found.append(i)
+            # Continue at the newline that ends this name
+            pos = self.blob.find(needle, self.starts[i] + len(self.rows[i][1]))
+        return found
+
+
+class SearchIndex:
+    def __init__(self, index_path, ignore=None):
+        self.index_path = index_path
+        self.root = None
+        # ignore(path) -> True for paths that must never be indexed
+        self.ignore = ignore or (lambda path: False)
+
+        # relative dir ("" for the root) -> {"mtime_ns", "names": {name: is_dir}}
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+        # Flat view for queries, plus what changed since it was built:
+        # relative path -> is_dir of new entries, and removed paths
+        # (a removed folder stands for everything below it)
+        self._snapshot = None
+        self._added = {}
+        self._removed = set()
+
+        self.ready = False
+        self._dirty = False
+        self._last_save = 0.0
+        # False in processes that only read the file another one maintains
+        self.persist = True
+
+    # --- paths ---
+
+    def _rel(self, path):
+        """ path relative to the root, "/"-separated; None if outside it or ignored. """
+        if self.root is None or self.ignore(path):
+            return None
+        rel = os.path.relpath(os.path.normpath(path), self.root)
+        if rel == os.curdir:
+            return ""
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            return None
+        return rel.replace(os.sep, "/")
+
+    def _abs(self, rel):
+        return os.path.join(self.root, *rel.split("/")) if rel else self.root
+
+    @staticmethod
+    def _split(rel):
+        parent, _, name = rel.rpartition("/")
+        return parent, name
+
+    # --- persistence ---
+
+    def load(self, root):
+        """ Loads the index for root; an index of another folder is discarded. """
+        root = os.path.normpath(root)
+        dirs = {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("root") == os.path.normcase(root):
+                dirs = data.get("dirs", {})
+        except (OSError, ValueError):
+            pass
+
+        with self._lock:
+            self.root = root
+            self._dirs = dirs
+            self._invalidate()
+            self.ready = False
+
+    def save(self, force=True):
+        if not self.persist:
+            return
+        with self._lock:
+            if not force and (not self._dirty or time.time() - self._last_save < SAVE_INTERVAL):
+                return
+            data = {"root": os.path.normcase(self.root), "dirs": self._dirs}
+            payload = json.dumps(data)
+            self._dirty = False
+            self._last_save = time.time()
+
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+    def start(self):
+        """ Brings the loaded index up to date in a background thread. """
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        try:
+            self.reconcile()
+            self._current()
+        except Exception:
+            pass
+        self.ready = True
+        while True:
+            time.sleep(SAVE_INTERVAL)
+            self.save(force=False)
+            with self._lock:
+                if self._added or self._removed:
+                    self._invalidate()
+            self._current()
+
+    # --- scanning ---
+
+    def _list_dir(self, rel):
+        """ Reads one folder from disk. Returns (mtime_ns, {name: is_dir}) or None if it is gone. """
+        path = self._abs(rel)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            names = {}
+            with os.scandir(path) as it:
+                for entry in it:
+                    if self.ignore(entry.path):
+                        continue
+                    try:
+                        names[entry.name] = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return mtime_ns, names
+
+    def _index_tree(self, rel):
+        """ Lists rel and every folder below it. """
+        pending = [rel]
+        while pending:
+            current = pending.pop()
+            listed = self._list_dir(current)
+            if listed is None:
+                continue
+            mtime_ns, names = listed
+            prefix = current + "/" if current else ""
+            with self._lock:
+                if current in self._dirs:
+                    self._invalidate()
+                else:
+                    for name, is_dir in names.items():
+                        self._note_added(prefix + name, is_dir)
+                self._dirs[current] = {"mtime_ns": mtime_ns, "names": names}
+                self._dirty = True
+            pending.extend(prefix + name for name, is_dir in names.items() if is_dir)
+
+    def _drop_tree(self, rel):
+        """ Caller holds self._lock. """
+        prefix = rel + "/" if rel else ""
+        for key in [k for k in self._dirs if k == rel or k.startswith(prefix)]:
+            del self._dirs[key]
+
+    def reconcile(self):
+        """
+        Re-lists only the folders whose mtime changed since the index was
+        written, and walks folders that appeared meanwhile.
+        """
+        with self._lock:
+            known = {rel: entry["mtime_ns"] for rel, entry in self._dirs.items()}
+
+        if "" not in known:
+            self._index_tree("")
+        else:
+            for rel, mtime_ns in known.items():
+                try:
+                    current = os.stat(self._abs(rel)).st_mtime_ns
+                except OSError:
+                    with self._lock:
+                        self._drop_tree(rel)
+                        self._invalidate()
+                        self._dirty = True
+                    continue
+                if current != mtime_ns:
+                    self._refresh_dir(rel)
+        self.save()
+
+    def _refresh_dir(self, rel):
+        """ Re-lists one folder; new subfolders are walked, vanished ones dropped. """
+        listed = self._list_dir(rel)
+        with self._lock:
+            old = self._dirs.get(rel, {}).get("names", {})
+            if listed is None:
+                self._drop_tree(rel)
+            else:
+                self._dirs[rel] = {"mtime_ns": listed[0], "names": listed[1]}
+            self._invalidate()
+            self._dirty = True
+        if listed is None:
+            return
+
+        prefix = rel + "/" if rel else ""
+        for name, is_dir in listed[1].items():
+            if is_dir and (not old.get(name) or prefix + name not in self._dirs):
+                self._index_tree(prefix + name)
+        for name, was_dir in old.items():
+            if was_dir and not listed[1].get(name):
+                with self._lock:
+                    self._drop_tree(prefix + name)
+
+    # --- watchdog / own writes ---
+
+    def touch(self, path):
+        """ path was created or changed: records it (walking it if it is a new folder). """
+        rel = self._rel(path)
+        if not rel:
+            return
+        is_dir = os.path.isdir(path)
+        if not is_dir and not os.path.exists(path):
+            return self.remove(path)
+
+        parent, name = self._split(rel)
+        with self._lock:
+            folder = self._dirs.get(parent)
+            if folder is None:
+                return
+            known = folder["names"].get(name)
+            folder["names"][name] = is_dir
+            self._stamp(parent)
+            if known != is_dir:
+                if known is not None:
+                    self._note_removed(rel)
+                self._note_added(rel, is_dir)
+            self._dirty = True
+
+        if is_dir and rel not in self._dirs:
+            self._index_tree(rel)
+
+    def remove(self, path):
+        """ path (a file or a whole folder) was deleted. """
+        rel = self._rel(path)
+        if not rel:
+            return
+        parent, name = self._split(rel)
+        with self._lock:
+            folder = self._dirs.get(parent)
+            if folder is not None and folder["names"].pop(name, None) is not None:
+                self._stamp(parent)
+            self._drop_tree(rel)
+            self._note_removed(rel)
+            self._dirty = True
+
+    def _stamp(self, rel):
+        """ Caller holds self._lock: records the folder's current mtime, so a restart trusts it. """
+        try:
+            self._dirs[rel]["mtime_ns"] = os.stat(self._abs(rel)).st_mtime_ns
+        except OSError:
+            pass
+
+    # --- snapshot ---
+
+    def _invalidate(self):
+        """ Caller holds self._lock: the next query rebuilds the snapshot. """
+        self._snapshot = None
+        self._added = {}
+        self._removed = set()
+
+    def _note_added(self, rel, is_dir):
+        """ Caller holds self._lock. """
+        if self._snapshot is None:
+            return
+        self._added[rel] = is_dir
+        if len(self._added) + len(self._removed) > OVERLAY_LIMIT:
+            self._invalidate()
+
+    def _note_removed(self, rel):
+        """ Caller holds self._lock. """
+        if self._snapshot is None:
+            return
+        self._removed.add(rel)
+        prefix = rel + "/"
+        for key in [k for k in self._added if k == rel or k.startswith(prefix)]:
+            del self._added[key]
+        if len(self._added) + len(self._removed) > OVERLAY_LIMIT:
+            self._invalidate()
+
+    def _current(self):
+        """ (snapshot, added, removed), building the snapshot if needed. """
+        with self._lock:
+            if self._snapshot is None:
+                rows = []
+                for rel, folder in self._dirs.items():
+                    prefix = rel + "/" if rel else ""
+                    for name, is_dir in folder["names"].items():
+                        rows.append((prefix + name, name.lower(), is_dir))
+                self._snapshot = _Snapshot(rows)
+            return self._snapshot, dict(self._added), set(self._removed)
+
+    @staticmethod
+    def _is_removed(path, removed):
+        """ path or one of its folders is in removed. """
+        if path in removed:
+            return True
+        i = path.find("/")
+        while i >= 0:
+            if path[:i] in removed:
+                return True
+            i = path.find("/", i + 1)
+        return False
+
+    # --- querying ---
+
+    def search(self, query="", mode="substring", ext="", within="", limit=100):
+        """
+        Paths whose names match: mode "substring" or "prefix" for query,
+        and/or extension ext (without the dot). within limits results to
+        one folder's subtree. Returns ([(path, is_dir)], matches, more).
+        Names starting with query rank first, then shorter paths.
+        """
+        query = query.lower().replace("\n", "")
+        ext = ext.lower().lstrip(".")
+        if not query and not ext:
+            return [], 0, False
+
+        within = within.strip("/")
+        suffix = "." + ext
+
+        def name_matches(name, is_dir):
+            if ext and (is_dir or not name.endswith(suffix)):
+                return False
+            if not query:
+                return True
+            return name.startswith(query) if mode == "prefix" else query in name
+
+        if within:
+            # One subtree: scanning its folders directly beats filtering
+            # the matches of the whole share
+            rows = []
+            scope = within + "/"
+            with self._lock:
+                for rel, folder in self._dirs.items():
+                    if rel != within and not rel.startswith(scope):
+                        continue
+                    for name, is_dir in folder["names"].items():
+                        low = name.lower()
+                        if name_matches(low, is_dir):
+                            rows.append((f"{rel}/{name}", low, is_dir))
+            return self._ranked(rows, query, limit, len(rows) >= MAX_CANDIDATES)
+
+        snapshot, added, removed = self._current()
+
+        def accept(i):
+            return not (removed and self._is_removed(snapshot.rows[i][0], removed))
+
+        if ext:
+            candidates = []
+            for i in snapshot.by_ext.get(suffix, ()):
+                if name_matches(snapshot.rows[i][1], False) and accept(i):
+                    candidates.append(i)
+                    if len(candidates) >= MAX_CANDIDATES:
+                        break
+        else:
+            needle = "\n" + query if mode == "prefix" else query
+            candidates = snapshot.find(needle, MAX_CANDIDATES, accept)
+
+        rows = [snapshot.rows[i] for i in candidates]
+        for path, is_dir in added.items():
+            name = path.rpartition("/")[2].lower()
+            if name_matches(name, is_dir):
+                rows.append((path, name, is_dir))
+        return self._ranked(rows, query, limit, len(candidates) >= MAX_CANDIDATES)
+
+    @staticmethod
+    def _ranked(rows, query, limit, capped):
+        rows.sort(key=lambda row: (not row[1].startswith(query), len(row[0]), row[0]))
+        more = capped or len(rows) > limit
+        return [(path, is_dir) for path, _, is_dir in rows[:limit]], len(rows), more
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(folder["names"]) for folder in self._dirs.values())
@@ -2,28 +2,65 @@ import os
 import base64
 import shutil
 import secrets
-import mimetypes
 import math
 import sys
 import logging
 import threading
 import json
+import time
+import hashlib
+import tempfile
 import traceback
+from urllib.parse import quote
 from functools import wraps
 
 # ============================================================
-# GLOBAL CHANGE VERSION (for long-polling clients)
+# CHANGE VERSIONS (for long-polling clients)
 # ============================================================
 
-CURRENT_VERSION = 0
-VERSION_LOCK = threading.Lock()
+from .versions import VersionTree
 
+# One counter for all changes, stamped onto the directories they touch
+VERSIONS = VersionTree()
 
-def bump_version(reason=""):
-    global CURRENT_VERSION
-    with VERSION_LOCK:
-        CURRENT_VERSION += 1
-    return CURRENT_VERSION
+
+def bump_version(reason="", *paths):
+    """ Records a change to paths (files or folders that changed) and returns the new version. """
+    return VERSIONS.bump(*paths)
+
+
+def announce(changes, reason=""):
+    """
+    Records changes, a list of (op, absolute path) with op "added",
+    "updated" or "removed": bumps versions and pushes them to /api/events.
+    """
+    if LINK is not None:
+        # Worker process: the coordinator numbers the change and sends it
+        # to every worker, this one included (see share_changes)
+        return LINK.call("announce", *shareable_changes(changes), reason)
+    version = bump_version(reason, *(path for _, path in changes))
+    apply_changes(version, changes)
+    return version
+
+
+def apply_changes(version, changes):
+    """ Effects of announced changes on this process's caches, search index and event streams. """
+    for op, path in changes:
+        ARCHIVES.invalidate(path)
+        THUMBS.invalidate(path)
+        if op == "removed":
+            SEARCH.remove(path)
+        else:
+            SEARCH.touch(path)
+    publish_changes(version, changes)
+
+
+def expect_change(path, recursive=False):
+    """ The server is about to change path itself: the watchdog echo is not announced again. """
+    if LINK is not None:
+        LINK.send("expect", path, recursive)
+    else:
+        WATCH_EVENTS.expect(path, recursive)
 
 
 # ============================================================
@@ -43,16 +80,43 @@ try:
         Blueprint,
         jsonify,
         send_from_directory,
+        send_file,
     )
     from werkzeug.utils import secure_filename, safe_join
+    from werkzeug.wsgi import wrap_file
     from watchdog.observers import Observer
     from watchdog.events import FileSystemEventHandler
 except Exception:
     traceback.print_exc()
     raise
 
-from .utils import get_exe_folder
-from config import PORT, TEMP_UPLOAD_DIR
+from .utils import get_exe_folder, copy_fd_data
+from .uploads import UploadRegistry, SharedUploadRegistry, UploadFinishedError, parse_chunk_digest
+from .hashindex import HashIndex
+from .foldersizes import FolderSizes
+from .listcache import ListingCache
+from .listing import DirectoryIndex, SORT_ORDERS, decode_cursor
+from .events import EventBroker
+from .serving import StreamSlots, SHARED_SOCKET_BACKENDS, available_backend, make_listener, serve
+from .asyncserve import run_blocking, read_blocks, read_session, json_response, status_response, send_response
+from .asyncserve import BLOCK_SIZE as ASYNC_BLOCK_SIZE
+from .cluster import Hub, HubLink
+from .coalesce import EventCoalescer
+from .zipstream import stream_zip, stream_zip_members, iter_selection
+from .tarstream import plan_tar, tar_size, stream_tar
+from .archivecache import ArchiveCache
+from .thumbnails import ThumbnailCache
+from .preview import LineReader, read_head, read_tail, read_from
+from .searchindex import SearchIndex
+from .media import plan_file_response, iter_file_body, RANGE_BLOCK_SIZE
+from config import PORT, TEMP_UPLOAD_DIR, UPLOAD_STATE_DIR, UPLOAD_SESSION_TTL, HASH_INDEX_PATH, LISTING_CACHE_SIZE, SECRET_KEY_PATH
+from config import BROWSE_PAGE_SIZE, BROWSE_PAGE_MAX, STATS_LOG_PREFIX, STATS_INTERVAL
+from config import ARCHIVE_CACHE_DIR, ARCHIVE_CACHE_MB, BATCH_DOWNLOAD_MAX
+from config import THUMB_CACHE_DIR, THUMB_CACHE_MB, THUMB_SIZES, THUMB_BATCH_MAX, THUMB_WAIT
+from config import SEARCH_INDEX_PATH, SEARCH_LIMIT, SEARCH_LIMIT_MAX, REPORT_LIMIT, REPORT_LIMIT_MAX
+from config import PREVIEW_KB, PREVIEW_MAX_KB, PREVIEW_LINES, PREVIEW_MAX_LINES, PREVIEW_FOLLOW_INTERVAL
+from config import SERVER_BACKEND, SERVER_THREADS, SERVER_BACKLOG, SERVER_SOCKET_BUFFER_KB
+from config import SERVER_CONNECTION_LIMIT, SERVER_IDLE_TIMEOUT, SERVER_EVENT_STREAMS, SERVER_INBUF_MB, SERVER_PROCESSES
 
 
 # ============================================================
@@ -98,10 +162,25 @@ fs = Blueprint("fs", __name__)
 # DECORATORS
 # ============================================================
 
+# The access rules take any session mapping, so the async routes (which
+# decode the session cookie themselves) apply exactly the same ones
+
+def is_logged_in(sess):
+    return bool(sess.get("logged_in"))
+
+
+def is_admin(sess):
+    return sess.get("role") == "admin"
+
+
+def can_upload(sess):
+    return sess.get("role") in ["admin", "uploader"]
+
+
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if not session.get("logged_in"):
+        if not is_logged_in(session):
             return abort(401)
         return f(*args, **kwargs)
     return decorated
@@ -110,7 +189,7 @@ def login_required(f):
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if session.get("role") != "admin":
+        if not is_admin(session):
             return jsonify({"error": "Admin access required"}), 403
         return f(*args, **kwargs)
     return decorated
@@ -119,7 +198,7 @@ def admin_required(f):
 def uploader_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if session.get("role") not in ["admin", "uploader"]:
+        if not can_upload(session):
             return jsonify({"error": "Upload permission required"}), 403
         return f(*args, **kwargs)
     return decorated
@@ -188,13 +267,33 @@ def logout():
 
 @app.route("/api/check_updates")
 def check_updates():
+    """
+    Has anything changed since version? With path, only changes to that
+    folder's entries count (recursive=1: anything below it as well).
+    """
     try:
         client_version = int(request.args.get("version", 0))
     except:
         client_version = 0
+
+    current = VERSIONS.current
+    path = request.args.get("path")
+    recursive = request.args.get("recursive") in ("1", "true")
+
+    if client_version > current:
+        # The server restarted since the client last synced
+        update = True
+    elif path is None:
+        update = current > client_version
+    else:
+        try:
+            update = VERSIONS.changed_since(get_validated_path(path), client_version, recursive)
+        except Exception:
+            update = current > client_version
+
     return jsonify({
-        "update": CURRENT_VERSION > client_version,
-        "version": CURRENT_VERSION
+        "update": update,
+        "version": current
     })
 
 
@@ -202,31 +301,61 @@ def check_updates():
 @fs.route("/browse/<path:subpath>")
 @login_required
 def browse_files(subpath):
+    """
+    One page of a directory listing.
+    Query: sort (name|type|size|mtime), order (asc|desc), limit, cursor.
+    The response carries next_cursor while more rows remain.
+    """
 
     if session.get("role") == "uploader":
         return abort(403)
 
+    sort = request.args.get("sort", "name")
+    order = request.args.get("order", "asc")
+    cursor = request.args.get("cursor") or None
+    try:
+        limit = int(request.args.get("limit", BROWSE_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    limit = max(1, min(limit, BROWSE_PAGE_MAX))
+    if sort not in SORT_ORDERS or order not in ("asc", "desc"):
+        return jsonify({"error": "Invalid sort order"}), 400
+
     try:
         full_path = get_validated_path(subpath)
-        items = []
 
-        for item in sorted(os.listdir(full_path)):
-            item_path = os.path.join(full_path, item)
-            is_dir = os.path.isdir(item_path)
+        # Folder totals on the page change with anything below this folder
+        page_key = ("page", subpath, sort, order, limit, cursor, FOLDER_SIZES.stamp(full_path))
+        etag = listing_etag(full_path, page_key)
+        if request.if_none_match.contains(etag):
+            return listing_response(None, etag)
+
+        cached = LISTINGS.get(full_path, page_key)
+        if cached is not None:
+            return listing_response(cached, etag)
+
+        generation = LISTINGS.generation(full_path)
+        index = LISTINGS.get(full_path, ("index", sort))
+        if index is None:
+            index = DirectoryIndex.build(
+                full_path, sort, skip=is_partial_name, file_type=get_file_type
+            )
+            LISTINGS.put(full_path, index, generation, ("index", sort))
 
-            size_str = (
-                f"{len(os.listdir(item_path))} items"
-                if is_dir else
-                format_size(os.path.getsize(item_path))
+        try:
+            rows, next_cursor = index.page(
+                limit, decode_cursor(cursor), descending=(order == "desc")
             )
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
 
-            items.append({
-                "name": item,
-                "path": os.path.join(subpath, item).replace("\\", "/"),
-                "is_dir": is_dir,
-                "file_type": "folder" if is_dir else get_file_type(item),
-                "size": size_str,
-            })
+        items = []
+        for info in rows:
+            try:
+                items.append(listing_item(full_path, subpath, info.name, info.is_dir))
+            except OSError:
+                # Removed since the directory was scanned
+                continue
 
         breadcrumbs = []
         if subpath:
@@ -234,41 +363,848 @@ def browse_files(subpath):
             for i, part in enumerate(parts):
                 breadcrumbs.append({"name": part, "path": "/".join(parts[:i+1])})
 
-        return jsonify({"path": subpath, "items": items, "breadcrumbs": breadcrumbs})
+        payload = json.dumps({
+            "path": subpath,
+            "items": items,
+            "breadcrumbs": breadcrumbs,
+            "sort": sort,
+            "order": order,
+            "total": len(index),
+            "next_cursor": next_cursor,
+        })
+        LISTINGS.put(full_path, payload, generation, page_key)
+        return listing_response(payload, etag)
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
+def listing_item(full_path, subpath, name, is_dir):
+    """ One /api/browse row for name in full_path. Raises OSError if the file is gone. """
+    if is_dir:
+        # Filled in by /api/child_counts once the page is shown
+        size_str = None
+        digest = None
+    else:
+        item_path = os.path.join(full_path, name)
+        st = os.stat(item_path)
+        size_str = format_size(st.st_size)
+        digest = HASHES.get(item_path, st)
+
+    item = {
+        "name": name,
+        "path": os.path.join(subpath, name).replace("\\", "/"),
+        "is_dir": is_dir,
+        "file_type": "folder" if is_dir else get_file_type(name),
+        "size": size_str,
+        "sha256": digest,
+    }
+    if is_dir:
+        # Recursive size of everything inside
+        total_bytes, _ = FOLDER_SIZES.total(os.path.join(full_path, name))
+        item["total_bytes"] = total_bytes
+        item["total_size"] = format_size(total_bytes)
+    return item
+
+
+def listing_etag(full_path, page_key):
+    """
+    Strong ETag of one listing page: changes whenever the directory does
+    (or the server restarts), and differs per sort/page parameters.
+    """
+    variant = hashlib.sha1(json.dumps(page_key).encode("utf-8")).hexdigest()[:12]
+    return f"{BOOT_ID}-{LISTINGS.generation(full_path)}-{variant}"
+
+
+def listing_response(payload, etag):
+    """ 200 with payload, or 304 Not Modified when payload is None. """
+    if payload is None:
+        resp = app.response_class(status=304)
+    else:
+        resp = app.response_class(payload, mimetype="application/json")
+    resp.set_etag(etag)
+    # Always revalidate: a cached copy is only good while the ETag matches
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@fs.route("/child_counts", methods=["POST"])
+@login_required
+def child_counts():
+    """
+    Item counts of several folders at once: {"paths": [...]} ->
+    {"counts": {path: n}, "totals": {path: recursive size}}.
+    """
+
+    if session.get("role") == "uploader":
+        return abort(403)
+
+    paths = (request.json or {}).get("paths") or []
+    if not isinstance(paths, list) or len(paths) > BROWSE_PAGE_MAX:
+        return jsonify({"error": "Invalid paths"}), 400
+
+    counts = {}
+    totals = {}
+    for subpath in paths:
+        try:
+            full_path = get_validated_path(subpath)
+            counts[subpath] = count_children(full_path)
+            totals[subpath] = format_size(FOLDER_SIZES.total(full_path)[0])
+        except (OSError, ValueError, PermissionError):
+            counts[subpath] = None
+    return jsonify({"counts": counts, "totals": totals})
+
+
+def count_children(full_path):
+    """ Number of visible entries in a directory; cached until it changes. """
+    cached = LISTINGS.get(full_path, ("count",))
+    if cached is not None:
+        return cached
+
+    generation = LISTINGS.generation(full_path)
+    index = LISTINGS.get(full_path, ("index", "name"))
+    if index is not None:
+        count = len(index)
+    else:
+        with os.scandir(full_path) as it:
+            count = sum(1 for entry in it if not is_partial_name(entry.name))
+    LISTINGS.put(full_path, count, generation, ("count",))
+    return count
+
+
+# ============================================================
+# STORAGE REPORT
+# ============================================================
+
+@fs.route("/storage_report")
+@login_required
+def storage_report():
+    """
+    The largest folders below path (default: the whole share), from the
+    incrementally kept folder totals. Query: path, limit, depth (1 = only
+    direct subfolders). "complete" is False while the first walk of the
+    share is still running.
+    """
+    if session.get("role") == "uploader":
+        return abort(403)
+
+    try:
+        full_path = get_validated_path(request.args.get("path", ""))
+    except (PermissionError, TypeError, ValueError):
+        return abort(403)
+    if not os.path.isdir(full_path):
+        return abort(404)
+
+    try:
+        limit = max(1, min(REPORT_LIMIT_MAX, int(request.args.get("limit", REPORT_LIMIT))))
+        depth = request.args.get("depth")
+        depth = max(1, int(depth)) if depth else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit or depth"}), 400
+
+    total_bytes, total_files = FOLDER_SIZES.total(full_path)
+    folders = []
+    for path, size, files in FOLDER_SIZES.largest(full_path, limit, depth):
+        subpath = relative_subpath(path)
+        if subpath is None:
+            continue
+        folders.append({
+            "name": os.path.basename(path),
+            "path": subpath,
+            "bytes": size,
+            "size": format_size(size),
+            "files": files,
+            "share": round(size / total_bytes, 4) if total_bytes else 0,
+        })
+
+    return jsonify({
+        "path": relative_subpath(full_path) or "",
+        "bytes": total_bytes,
+        "size": format_size(total_bytes),
+        "files": total_files,
+        "folders": folders,
+        "complete": HASHES.ready,
+    })
+
+
+# ============================================================
+# SEARCH
+# ============================================================
+
+SEARCH_MODES = ("substring", "prefix")
+
+
+@fs.route("/search")
+@login_required
+def search_files():
+    """
+    Filename search over the whole share (or below path):
+    q, mode ("substring" | "prefix"), ext (e.g. "pdf"; q="*.pdf" works
+    too), path, limit. Returns {"items", "total", "more", "ready", "took_ms"};
+    ready is False while the index is still being brought up to date.
+    """
+    if session.get("role") == "uploader":
+        return abort(403)
+
+    started = time.perf_counter()
+    query = request.args.get("q", "").strip()
+    mode = request.args.get("mode", "substring")
+    ext = request.args.get("ext", "").strip()
+    within = request.args.get("path", "").strip("/")
+
+    if query.startswith("*.") and not ext:
+        query, ext = "", query[2:]
+    if mode not in SEARCH_MODES:
+        return jsonify({"error": "Unknown mode"}), 400
+    try:
+        limit = max(1, min(SEARCH_LIMIT_MAX, int(request.args.get("limit", SEARCH_LIMIT))))
+    except ValueError:
+        limit = SEARCH_LIMIT
+
+    matches, total, more = SEARCH.search(query, mode, ext, within, limit)
+    items = []
+    for path, is_dir in matches:
+        folder, _, name = path.rpartition("/")
+        items.append({
+            "name": name,
+            "path": path,
+            "folder": folder,
+            "is_dir": is_dir,
+            "file_type": "folder" if is_dir else get_file_type(name),
+        })
+
+    return jsonify({
+        "items": items,
+        "total": total,
+        "more": more,
+        "ready": SEARCH.ready,
+        "took_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+
+
+# ============================================================
+# THUMBNAILS
+# ============================================================
+
+def thumb_size_arg(value):
+    """ Requested edge length, snapped to one of THUMB_SIZES. """
+    try:
+        wanted = int(value)
+    except (TypeError, ValueError):
+        return THUMB_SIZES[0]
+    return min(THUMB_SIZES, key=lambda size: abs(size - wanted))
+
+
+def thumb_source(subpath):
+    """ (full path, sha256 or None) of an image that can get a thumbnail; raises ValueError otherwise. """
+    full_path = get_validated_path(subpath)
+    if get_file_type(full_path) != "image" or full_path.lower().endswith(".svg"):
+        raise ValueError("Not a raster image")
+    st = os.stat(full_path)
+    return full_path, HASHES.get(full_path, st)
+
+
+@fs.route("/thumbnails", methods=["POST"])
+@login_required
+def thumbnails():
+    """
+    Thumbnails for the visible rows in one call:
+    {"paths": [...], "size": n, "known": {path: key}} ->
+    {"thumbs": {path: {"key", "data"}}, "pending": [path]}, data being a
+    data: URL. Paths whose key matches "known" come back without data (the
+    client has them). Renders not done within THUMB_WAIT are listed in
+    "pending" for the client to ask again. Images that cannot be rendered
+    are left out.
+    """
+    if session.get("role") == "uploader":
+        return abort(403)
+
+    data = request.get_json(silent=True) or {}
+    paths = data.get("paths") or []
+    known = data.get("known") or {}
+    if not isinstance(paths, list) or len(paths) > THUMB_BATCH_MAX or not isinstance(known, dict):
+        return jsonify({"error": "Invalid paths"}), 400
+    if not THUMBS.enabled:
+        return jsonify({"thumbs": {}, "pending": []})
+
+    size = thumb_size_arg(data.get("size"))
+    sources = {}
+    for subpath in paths:
+        try:
+            sources[subpath] = thumb_source(subpath)
+        except (OSError, ValueError, TypeError, PermissionError):
+            continue
+
+    ready, rendering = THUMBS.get_many(sources.values(), size, THUMB_WAIT)
+    rendering = set(rendering)
+    pending = [subpath for subpath, (full_path, _) in sources.items() if full_path in rendering]
+    thumbs = {}
+    for subpath, (full_path, _) in sources.items():
+        if full_path not in ready:
+            continue
+        key, thumb_path = ready[full_path]
+        if known.get(subpath) == key:
+            thumbs[subpath] = {"key": key}
+            continue
+        try:
+            with open(thumb_path, "rb") as f:
+                encoded = base64.b64encode(f.read()).decode("ascii")
+        except OSError:
+            continue
+        thumbs[subpath] = {"key": key, "data": f"data:image/jpeg;base64,{encoded}"}
+    return jsonify({"thumbs": thumbs, "pending": pending})
+
+
+@fs.route("/thumb/<path:filename>")
+@login_required
+def thumb_file(filename):
+    """ One thumbnail as image/jpeg (?size=n), revalidated through its content key. """
+    if session.get("role") == "uploader":
+        return abort(403)
+    if not THUMBS.enabled:
+        return abort(404)
+
+    try:
+        full_path, digest = thumb_source(filename)
+    except (OSError, ValueError, TypeError, PermissionError):
+        return abort(404)
+
+    size = thumb_size_arg(request.args.get("size"))
+    ready, pending = THUMBS.get_many([(full_path, digest)], size, THUMB_WAIT)
+    if pending:
+        # Still rendering: ask again shortly
+        resp = app.response_class(status=503)
+        resp.headers["Retry-After"] = "1"
+        return resp
+    thumb = ready.get(full_path)
+    if thumb is None:
+        return abort(404)
+
+    key, thumb_path = thumb
+    resp = send_file(thumb_path, mimetype="image/jpeg", etag=key, conditional=True, max_age=0)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+# ============================================================
+# LIVE CHANGE EVENTS (Server-Sent Events)
+# ============================================================
+
+# Seconds between keep-alive comments on an idle event stream
+EVENT_KEEPALIVE = 15
+
+# Beyond this many changes in one folder, clients reload it instead
+EVENT_MAX_DELTAS = 200
+
+# How long a refused event stream waits before reconnecting (ms), for
+# clients that do not act on its "busy" event
+STREAM_BUSY_RETRY_MS = 15000
+
+EVENTS = EventBroker()
+
+# Open event streams each hold a worker thread; run_production_server caps
+# them to the threads the pool has for them (SERVER_EVENT_STREAMS)
+STREAMS = StreamSlots()
+
+
+@fs.route("/events")
+@login_required
+def change_events():
+    """
+    Stream of "change" events: {"version", "path" (folder), "changes":
+    [{"op", "name", "item"?}]}. "resync" means: reload the listing.
+    """
+
+    if session.get("role") == "uploader":
+        return abort(403)
+
+    last_event_id = request.headers.get("Last-Event-ID")
+
+    def stream():
+        sub = EVENTS.subscribe(last_event_id)
+        try:
+            while True:
+                event = sub.get(timeout=EVENT_KEEPALIVE)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                message = f"event: {event.kind}\ndata: {json.dumps(event.data)}\n\n"
+                if event.id:
+                    message = f"id: {event.id}\n" + message
+                yield message
+        finally:
+            EVENTS.unsubscribe(sub)
+
+    return event_stream_response(stream)
+
+
+def event_stream_response(stream):
+    """
+    text/event-stream response running the generator function stream
+    within STREAMS. When no slot is free the response is a single "busy"
+    event: the page closes the stream and polls instead.
+    """
+
+    def guarded():
+        if not STREAMS.acquire():
+            yield f"retry: {STREAM_BUSY_RETRY_MS}\nevent: busy\ndata: {{}}\n\n"
+            return
+        try:
+            yield "retry: 3000\n\n"
+            yield from stream()
+        finally:
+            STREAMS.release()
+
+    resp = app.response_class(guarded(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+def relative_subpath(path):
+    """ path relative to the shared folder, "/"-separated; None if outside it. """
+    base = app.config.get("ASSETS_DIR")
+    if not base:
+        return None
+    rel = os.path.relpath(path, base)
+    if rel == os.curdir:
+        return ""
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return None
+    return rel.replace("\\", "/")
+
+
+def publish_changes(version, changes):
+    """
+    Groups changes by folder and publishes one delta event per folder.
+    A folder with more than EVENT_MAX_DELTAS changes gets "reload" instead.
+    """
+    by_folder = {}
+    for op, path in changes:
+        if not path:
+            continue
+        folder = os.path.dirname(path)
+        subpath = relative_subpath(folder)
+        if subpath is not None:
+            by_folder.setdefault((folder, subpath), []).append((op, path))
+
+    # Ids follow from the version, so every worker process of a
+    # multi-process server gives an event the same id
+    for n, ((folder, subpath), folder_changes) in enumerate(by_folder.items()):
+        key = f"{version}.{n}"
+        if len(folder_changes) > EVENT_MAX_DELTAS:
+            EVENTS.publish("change", {"version": version, "path": subpath, "changes": [], "reload": True}, key)
+            continue
+
+        deltas = []
+        for op, path in folder_changes:
+            name = os.path.basename(path)
+            delta = {"op": op, "name": name}
+            if op != "removed":
+                try:
+                    delta["item"] = listing_item(folder, subpath, name, os.path.isdir(path))
+                except OSError:
+                    delta = {"op": "removed", "name": name}
+            deltas.append(delta)
+        EVENTS.publish("change", {"version": version, "path": subpath, "changes": deltas}, key)
+
+
 # ============================================================
 # UPLOAD & MERGE
 # ============================================================
 
-def background_merge(temp_dir, final_path, total_chunks, current_path):
+# Partial files for direct uploads live next to their final name so that
+# finishing is a single same-volume rename. The ".tmp" suffix keeps them
+# out of the watchdog and the browse listing.
+PARTIAL_PREFIX = ".localhub-"
+PARTIAL_SUFFIX = ".part.tmp"
+
+PARTIAL_LOCK = threading.Lock()
+
+# Block size used when streaming request bodies to disk
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+
+def partial_path_for(final_dir, file_id):
+    return os.path.join(final_dir, f"{PARTIAL_PREFIX}{secure_filename(file_id)}{PARTIAL_SUFFIX}")
+
+
+def is_partial_name(name):
+    return name.startswith(PARTIAL_PREFIX) and name.endswith(PARTIAL_SUFFIX)
+
+
+# Server-owned locations that may sit inside the shared folder
+IGNORED_TREES = [
+    os.path.normcase(os.path.normpath(TEMP_UPLOAD_DIR)),
+    os.path.normcase(os.path.normpath(ARCHIVE_CACHE_DIR)),
+    os.path.normcase(os.path.normpath(THUMB_CACHE_DIR)),
+]
+IGNORED_FILES = {
+    os.path.normcase(os.path.normpath(HASH_INDEX_PATH)),
+    os.path.normcase(os.path.normpath(HASH_INDEX_PATH + ".tmp")),
+    os.path.normcase(os.path.normpath(SEARCH_INDEX_PATH)),
+    os.path.normcase(os.path.normpath(SEARCH_INDEX_PATH + ".tmp")),
+    os.path.normcase(os.path.normpath(SECRET_KEY_PATH)),
+    os.path.normcase(os.path.normpath(SECRET_KEY_PATH + ".tmp")),
+}
+
+
+def is_server_file(path):
+    """ Files of the server's own making (partial uploads, temp area, hash index). """
+    if is_partial_name(os.path.basename(path)):
+        return True
+    key = os.path.normcase(os.path.normpath(path))
+    if key in IGNORED_FILES:
+        return True
+    return any(key == tree or key.startswith(tree + os.sep) for tree in IGNORED_TREES)
+
+
+def is_ignored_path(path):
+    """ Paths the watchdog and the indexes never track (our own temp files, VCS). """
+    if is_server_file(path):
+        return True
+    return ".git" in os.path.normcase(os.path.normpath(path)).split(os.sep)
+
+
+# Received-chunk state of every in-flight upload, keyed by fileId
+UPLOADS = UploadRegistry(UPLOAD_STATE_DIR)
+
+# Recursive byte totals of every folder, kept current by HASHES
+FOLDER_SIZES = FolderSizes()
+
+# SHA-256 of files in the shared folder (filled in as uploads complete)
+HASHES = HashIndex(HASH_INDEX_PATH, ignore=is_ignored_path, sizes=FOLDER_SIZES)
+
+# Names of everything in the shared folder, for /api/search
+SEARCH = SearchIndex(SEARCH_INDEX_PATH, ignore=is_ignored_path)
+
+# Sorted directory indexes and serialized /api/browse pages, evicted when
+# their directory changes
+LISTINGS = ListingCache(LISTING_CACHE_SIZE)
+
+# Finished folder zips, reused while the folder is unchanged
+ARCHIVES = ArchiveCache(ARCHIVE_CACHE_DIR, ARCHIVE_CACHE_MB * 1024 * 1024)
+
+# Image previews, rendered in worker processes and kept on disk
+THUMBS = ThumbnailCache(THUMB_CACHE_DIR, THUMB_CACHE_MB * 1024 * 1024)
+
+# Part of every listing ETag, so tags issued before a restart never match
+BOOT_ID = secrets.token_hex(4)
+
+
+def open_partial(part_path, total_size):
+    """
+    Opens (creating on first use) the preallocated target of a direct upload.
+    The file is extended to total_size up front, which is sparse on most
+    filesystems, so every chunk can be written at its own offset.
+    """
+    with PARTIAL_LOCK:
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+        try:
+            if os.fstat(fd).st_size != total_size:
+                os.ftruncate(fd, total_size)
+        except Exception:
+            os.close(fd)
+            raise
+    return fd
+
+
+def write_at(fd, data, offset):
+    """ Positional write; falls back to seek+write where os.pwrite is missing (Windows). """
+    view = memoryview(data)
+    if hasattr(os, "pwrite"):
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+        return
+
+    # Every request opens its own descriptor, so the file offset is not shared.
+    os.lseek(fd, offset, os.SEEK_SET)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def finish_direct_upload(upload, final_path):
     try:
+        # The background hasher reads the part file by name
+        upload.wait_hashed()
+        expect_change(final_path)
+        os.replace(upload.part_path, final_path)
+        LISTINGS.invalidate(final_path)
+        if upload.sha256:
+            HASHES.put(final_path, upload.sha256)
+        UPLOADS.finish(upload.file_id)
+
+        announce([("added", final_path)], "upload_direct_complete")
+
+    except Exception as e:
+        traceback.print_exc()
+        UPLOADS.finish(upload.file_id, status="failed", error=str(e))
+
+
+def background_merge(upload, temp_dir, final_path):
+    """
+    Concatenates chunk files into the final file. The copy runs kernel-side
+    where possible (see copy_fd_data), and upload.merged_bytes tracks
+    progress for /api/upload_status.
+    """
+    def on_progress(n):
+        upload.add_merged(n)
+
+    try:
+        # The background hasher reads the chunk files the merge deletes
+        upload.wait_hashed()
         temp_final = os.path.join(temp_dir, "merged_temp")
+        out_fd = os.open(temp_final, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0))
 
-        with open(temp_final, "wb", buffering=64 * 1024 * 1024) as final_file:
-            for i in range(total_chunks):
+        try:
+            for i in range(upload.total_chunks):
                 chunk = os.path.join(temp_dir, f"chunk_{i}")
+                in_fd = os.open(chunk, os.O_RDONLY | getattr(os, "O_BINARY", 0))
                 try:
-                    with open(chunk, "rb") as c:
-                        final_file.write(c.read())
-                    os.remove(chunk)
-                except:
-                    pass
-
+                    copy_fd_data(in_fd, out_fd, os.fstat(in_fd).st_size, on_progress)
+                finally:
+                    os.close(in_fd)
+                os.remove(chunk)
+        finally:
+            os.close(out_fd)
+
+        expect_change(final_path)
         if os.path.exists(final_path):
             os.remove(final_path)
 
         shutil.move(temp_final, final_path)
         shutil.rmtree(temp_dir, ignore_errors=True)
+        LISTINGS.invalidate(final_path)
 
-        bump_version("upload_merge_complete")
+        if upload.sha256:
+            HASHES.put(final_path, upload.sha256)
+        UPLOADS.finish(upload.file_id)
+        announce([("added", final_path)], "upload_merge_complete")
 
-    except Exception:
+    except Exception as e:
         traceback.print_exc()
+        UPLOADS.finish(upload.file_id, status="failed", error=str(e))
+
+
+class ChunkOverflow(Exception):
+    """ A direct-mode chunk body ran past the chunk's end. """
+
+
+class ChunkWrite:
+    """
+    One chunk of an upload on its way to disk: where it goes and the digests
+    fed while it streams in. Blocks are passed to write() between open() and
+    close() (store() does all three from a file-like source), then finish()
+    records the chunk. A chunk that is not finished must be abandon()ed.
+    """
+
+    def __init__(self, upload, index, final_path, part_path, chunk_size, total_size, chunk_hasher, chunk_digest):
+        self.upload = upload
+        self.index = index
+        self.final_path = final_path
+        # Direct mode: written in place inside the preallocated target
+        self.part_path = part_path
+        self.chunk_size = chunk_size
+        self.total_size = total_size
+        self.temp_dir = None if part_path else os.path.join(TEMP_UPLOAD_DIR, upload.file_id)
+        self.chunk_hasher = chunk_hasher
+        self.chunk_digest = chunk_digest
+        self.fd = None
+        self.offset = None
+        self.expected = None
+        self.received = 0
+        self.overflow = False
+
+        # If this chunk is next in line, the whole-file digest is fed inline
+        self.file_hasher = upload.claim_inline_hash(index)
+        self.hashers = [h for h in (chunk_hasher, self.file_hasher) if h is not None]
+
+    def open(self):
+        if self.part_path:
+            self.offset = self.index * self.chunk_size
+            self.expected = min(self.chunk_size, self.total_size - self.offset)
+            self.fd = open_partial(self.part_path, self.total_size)
+        else:
+            os.makedirs(self.temp_dir, exist_ok=True)
+            chunk_path = os.path.join(self.temp_dir, f"chunk_{self.index}")
+            self.fd = os.open(chunk_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0))
+
+    def write(self, block):
+        if self.expected is not None and len(block) > self.expected - self.received:
+            # The rest of the block belongs to the next chunk's bytes
+            self.overflow = True
+            raise ChunkOverflow()
+        for hasher in self.hashers:
+            hasher.update(block)
+        if self.offset is None:
+            view = memoryview(block)
+            while view:
+                view = view[os.write(self.fd, view):]
+        else:
+            write_at(self.fd, block, self.offset + self.received)
+        self.received += len(block)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def store(self, source):
+        """
+        Copies source (anything with .read(n)) in fixed-size blocks, so a
+        chunk is never held in memory as a whole. Stops at an oversized
+        body; finish() then refuses the chunk.
+        """
+        try:
+            self.open()
+            try:
+                while True:
+                    block = source.read(STREAM_BLOCK_SIZE)
+                    if not block:
+                        break
+                    self.write(block)
+            finally:
+                self.close()
+        except ChunkOverflow:
+            self.abandon()
+        except BaseException:
+            self.abandon()
+            raise
+
+    def abandon(self):
+        """ The chunk was not stored: hands the inline digest on without it. """
+        self.upload.commit_inline_hash(self.index, None)
+
+    def finish(self):
+        """ Records the stored chunk; returns the endpoint's (JSON body, status). """
+        upload = self.upload
+        ok = False
+        try:
+            if self.overflow:
+                return {"success": False, "error": "Chunk larger than expected"}, 400
+
+            # A short body (dropped connection) must not count as a stored chunk
+            if self.expected is not None and self.received != self.expected:
+                return {"success": False, "error": "Incomplete chunk"}, 400
+
+            # Corrupted in transit: the client re-sends it
+            if self.chunk_hasher is not None and self.chunk_hasher.hexdigest() != self.chunk_digest:
+                return {"success": False, "error": "Checksum mismatch", "retry": True}, 422
+
+            ok = True
+        finally:
+            upload.commit_inline_hash(self.index, self.file_hasher if ok else None)
+
+        finished = upload.mark_received(self.index, self.received)
+        upload.catch_up_hash(lambda i, h: hash_stored_chunk(upload, i, h))
+
+        if not finished:
+            return {"success": True, "chunk": self.index}, 200
+
+        if self.part_path and not upload.hashing:
+            # A rename is instant, so there is nothing to wait for.
+            finish_direct_upload(upload, self.final_path)
+            if upload.status == "failed":
+                return {"success": False, "error": upload.error}, 500
+            return {"success": True, "complete": True, "sha256": upload.sha256}, 200
+
+        # Merging, or the digest is still catching up: finish in the
+        # background and let the client poll /api/upload_status
+        upload.set_status("merging")
+        if self.part_path:
+            target, args = finish_direct_upload, (upload, self.final_path)
+        else:
+            target, args = background_merge, (upload, self.temp_dir, self.final_path)
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+        return {"success": True, "merging": True}, 200
+
+
+def hash_stored_chunk(upload, index, hasher):
+    """ Feeds an already stored chunk to hasher, reading it back from disk. """
+    if upload.part_path:
+        path = upload.part_path
+        offset = index * upload.chunk_size
+        remaining = min(upload.chunk_size, upload.total_size - offset)
+    else:
+        path = os.path.join(TEMP_UPLOAD_DIR, upload.file_id, f"chunk_{index}")
+        offset = 0
+        remaining = os.path.getsize(path)
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while remaining > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                raise IOError(f"Chunk {index} is truncated on disk")
+            hasher.update(block)
+            remaining -= len(block)
+
+
+def begin_chunk(params, role):
+    """
+    Validates the metadata of a chunk (form fields or query string) and
+    opens its upload. Returns (ChunkWrite, None), or (None, (JSON body,
+    status)) when the chunk is refused.
+    """
+    chunk_index = int(params["chunkIndex"])
+    total_chunks = int(params["totalChunks"])
+    file_id = secure_filename(params["fileId"])
+    filename = secure_filename(params["filename"])
+    current_path = params.get("path", "")
+    total_size = int(params.get("totalSize", 0))
+    chunk_size = int(params.get("chunkSize", 0))
+    chunk_hasher, chunk_digest = parse_chunk_digest(params.get("chunkHash", ""))
+
+    if not file_id or not 0 <= chunk_index < total_chunks:
+        return None, ({"success": False, "error": "Invalid chunk index"}, 400)
+
+    # enforce size limit
+    if role == "uploader":
+        limit = app.config.get("MAX_UPLOAD_BYTES", 0)
+        if limit > 0 and total_size > limit:
+            return None, ({"success": False, "error": "File too large"}, 413)
+
+    final_dir = get_validated_path(current_path)
+    final_path = os.path.join(final_dir, filename)
+
+    # Direct mode: write the chunk in place inside the preallocated target.
+    direct = app.config.get("DIRECT_UPLOAD", True) and chunk_size > 0 and total_size > 0
+    part_path = partial_path_for(final_dir, file_id) if direct else None
+
+    try:
+        upload = UPLOADS.get_or_create(
+            file_id,
+            part_path=part_path,
+            filename=filename,
+            path=current_path,
+            total_chunks=total_chunks,
+            total_size=total_size,
+            chunk_size=chunk_size,
+        )
+    except UploadFinishedError:
+        # A late retry: the file is already in place
+        return None, ({"success": False, "error": "Upload already finished", "finished": True}, 409)
+    chunk = ChunkWrite(upload, chunk_index, final_path, part_path, chunk_size, total_size, chunk_hasher, chunk_digest)
+    return chunk, None
+
+
+def receive_chunk(params, source):
+    """
+    Shared body of the chunk endpoints. params holds the chunk metadata
+    (form fields or query string), source is the chunk payload stream.
+    """
+    chunk, error = begin_chunk(params, session.get("role"))
+    if chunk is None:
+        return jsonify(error[0]), error[1]
+
+    chunk.store(source)
+    body, status = chunk.finish()
+    return jsonify(body), status
 
 
 @fs.route("/upload_chunk", methods=["POST"])
@@ -276,56 +1212,130 @@ def background_merge(temp_dir, final_path, total_chunks, current_path):
 @uploader_required
 def upload_chunk():
     try:
-        file = request.files["file"]
-        chunk_index = int(request.form["chunkIndex"])
-        total_chunks = int(request.form["totalChunks"])
-        file_id = request.form["fileId"]
-        filename = secure_filename(request.form["filename"])
-        current_path = request.form.get("path", "")
-        total_size = int(request.form.get("totalSize", 0))
+        return receive_chunk(request.form, request.files["file"].stream)
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@fs.route("/upload_chunk_raw", methods=["POST"])
+@login_required
+@uploader_required
+def upload_chunk_raw():
+    """
+    Same as /upload_chunk, but the chunk is the raw request body
+    (application/octet-stream) and the metadata travels in the query string.
+    Skips multipart parsing, so the body goes from the socket to disk once.
+    """
+    try:
+        return receive_chunk(request.args, request.stream)
 
-        # enforce size limit
-        if session.get("role") == "uploader":
-            limit = app.config.get("MAX_UPLOAD_BYTES", 0)
-            if limit > 0 and total_size > limit:
-                return jsonify({"success": False, "error": "File too large"}), 413
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"success": False, "error": str(e)}), 500
 
-        temp_dir = os.path.join(TEMP_UPLOAD_DIR, file_id)
-        os.makedirs(temp_dir, exist_ok=True)
 
-        chunk_path = os.path.join(temp_dir, f"chunk_{chunk_index}")
-        with open(chunk_path, "wb") as f:
-            f.write(file.read())
+@fs.route("/upload_status")
+@login_required
+@uploader_required
+def upload_status():
+    """
+    Lets a client resume (which chunks of fileId are already stored) and
+    follow the merge once all chunks are in (status / mergedBytes).
+    """
+    file_id = secure_filename(request.args.get("fileId", ""))
+    upload = UPLOADS.get(file_id) if file_id else None
 
-        files = [n for n in os.listdir(temp_dir) if n.startswith("chunk_")]
+    if upload is None:
+        return jsonify({"success": True, "exists": False, "received": []})
 
-        if len(files) == total_chunks:
-            lock_file = os.path.join(temp_dir, ".lock")
+    return jsonify({
+        "success": True,
+        "exists": True,
+        "status": upload.status,
+        "error": upload.error,
+        "received": upload.received_chunks(),
+        "totalChunks": upload.total_chunks,
+        "totalSize": upload.total_size,
+        "bytesReceived": upload.bytes_received,
+        "mergedBytes": upload.merged_bytes,
+        "sha256": upload.sha256,
+    })
 
-            try:
-                with open(lock_file, "x"):
-                    pass
-            except FileExistsError:
-                return jsonify({"success": True, "chunk": chunk_index})
 
-            final_dir = get_validated_path(current_path)
-            final_path = os.path.join(final_dir, filename)
+@fs.route("/upload_dedup", methods=["POST"])
+@login_required
+@uploader_required
+def upload_dedup():
+    """
+    Pre-upload handshake. With only a size it reports whether any shared
+    file has that size, so the client only hashes its file when a match is
+    possible. With a sha256 as well, an identical existing file is placed
+    at path/filename server-side and nothing needs to be uploaded.
+    Only roles that can browse take part: the answers would tell a blind
+    uploader which files exist.
+    """
+    try:
+        data = request.json or {}
+        size = int(data.get("size", 0))
+        sha256 = (data.get("sha256") or "").lower()
+        filename = secure_filename(data.get("filename", ""))
+        current_path = data.get("path", "")
+
+        if (
+            not app.config.get("DEDUP_UPLOADS", True)
+            or session.get("role") == "uploader"
+            or size <= 0
+            or not filename
+        ):
+            return jsonify({"success": True, "candidates": False, "deduplicated": False})
+
+        if not sha256:
+            return jsonify({"success": True, "candidates": HASHES.prepare(size)})
 
-            threading.Thread(
-                target=background_merge,
-                args=(temp_dir, final_path, total_chunks, current_path),
-                daemon=True,
-            ).start()
+        source = HASHES.find(size, sha256)
+        if source is None:
+            return jsonify({"success": True, "deduplicated": False})
 
-            return jsonify({"success": True, "merging": True})
+        final_dir = get_validated_path(current_path)
+        final_path = os.path.join(final_dir, filename)
+        if os.path.normcase(os.path.normpath(final_path)) != os.path.normcase(source):
+            expect_change(final_path)
+            place_duplicate(source, final_dir, final_path)
+            LISTINGS.invalidate(final_path)
 
-        return jsonify({"success": True, "chunk": chunk_index})
+        HASHES.put(final_path, sha256)
+        announce([("added", final_path)], "upload_dedup")
+        return jsonify({"success": True, "deduplicated": True, "sha256": sha256})
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def place_duplicate(source, final_dir, final_path):
+    """ Hard-links source to final_path, copying when that is not possible (other volume, FAT). """
+    tmp = partial_path_for(final_dir, "dedup-" + secrets.token_hex(8))
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+        shutil.copystat(source, tmp)
+    os.replace(tmp, final_path)
+
+
+def prune_stale_uploads():
+    """ Deletes data of uploads abandoned for longer than UPLOAD_SESSION_TTL. """
+    for upload in UPLOADS.prune(UPLOAD_SESSION_TTL):
+        if upload.part_path and os.path.exists(upload.part_path):
+            try:
+                os.remove(upload.part_path)
+            except OSError:
+                pass
+        shutil.rmtree(os.path.join(TEMP_UPLOAD_DIR, upload.file_id), ignore_errors=True)
+
+
 # ============================================================
 # DELETE / CREATE
 # ============================================================
@@ -336,12 +1346,16 @@ def upload_chunk():
 def delete_item():
     try:
         target = get_validated_path(request.json.get("path"))
+        expect_change(target, recursive=True)
         if os.path.isdir(target):
             shutil.rmtree(target)
         else:
             os.remove(target)
 
-        bump_version("delete")
+        # Folder totals drop now rather than when the watchdog catches up
+        HASHES.remove(target)
+        LISTINGS.invalidate(target, recursive=True)
+        announce([("removed", target)], "delete")
         return jsonify({"success": True})
 
     except Exception as e:
@@ -356,9 +1370,11 @@ def create_folder():
     try:
         path = get_validated_path(request.json.get("path", ""))
         name = secure_filename(request.json.get("folder_name"))
+        expect_change(os.path.join(path, name))
         os.makedirs(os.path.join(path, name), exist_ok=True)
+        LISTINGS.invalidate(os.path.join(path, name))
 
-        bump_version("create_folder")
+        announce([("added", os.path.join(path, name))], "create_folder")
         return jsonify({"success": True})
 
     except Exception as e:
@@ -380,14 +1396,7 @@ def download_file(filename):
         full_path = get_validated_path(filename)
 
         if os.path.isdir(full_path):
-            folder_name = os.path.basename(full_path)
-            temp_zip_base = os.path.join(TEMP_UPLOAD_DIR, folder_name)
-            zip_path = shutil.make_archive(temp_zip_base, "zip", full_path)
-            return send_from_directory(
-                os.path.dirname(zip_path),
-                os.path.basename(zip_path),
-                as_attachment=True,
-            )
+            return zip_response(full_path)
 
         return send_from_directory(
             os.path.dirname(full_path),
@@ -400,6 +1409,96 @@ def download_file(filename):
         return abort(404)
 
 
+def zip_response(full_path):
+    """
+    Sends a folder as <name>.zip: from the archive cache when an identical
+    tree was zipped before, else streamed while it is being built.
+    """
+    folder_name = os.path.basename(full_path) or "files"
+
+    # The folder total is known without a walk; too large is not cached
+    size = FOLDER_SIZES.total(full_path)[0]
+    kind, value = ARCHIVES.serve(full_path, stream_zip_members, skip=is_server_file, size=size)
+    if kind == "file":
+        return send_file(
+            value,
+            mimetype="application/zip",
+            as_attachment=True,
+            download_name=f"{folder_name}.zip",
+            conditional=True,
+        )
+
+    resp = app.response_class(
+        value if kind == "stream" else stream_zip(full_path, skip=is_server_file),
+        mimetype="application/zip",
+        direct_passthrough=True,
+    )
+    resp.headers["Content-Disposition"] = attachment_header(f"{folder_name}.zip")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+@fs.route("/download_batch", methods=["POST"])
+@login_required
+def download_batch():
+    """
+    Several files/folders as one archive, streamed without staging.
+    Accepts JSON or a form post: paths (list), format ("zip" | "tar"), name.
+    Tar responses carry an exact Content-Length; zip responses announce
+    the uncompressed payload in X-Content-Bytes.
+    """
+    if session.get("role") == "uploader":
+        return abort(403)
+
+    data = request.get_json(silent=True) or {}
+    paths = data.get("paths") or request.form.getlist("paths")
+    fmt = (data.get("format") or request.form.get("format") or "zip").lower()
+    name = secure_filename(data.get("name") or request.form.get("name") or "") or "download"
+
+    if not isinstance(paths, list) or not paths or len(paths) > BATCH_DOWNLOAD_MAX:
+        return jsonify({"error": "Invalid paths"}), 400
+    if fmt not in ("zip", "tar"):
+        return jsonify({"error": "Unsupported format"}), 400
+
+    targets = []
+    try:
+        for subpath in paths:
+            full_path = get_validated_path(subpath)
+            if not os.path.exists(full_path):
+                return jsonify({"error": f"Not found: {subpath}"}), 404
+            targets.append(full_path)
+    except (PermissionError, TypeError, ValueError):
+        # safe_join() rejects escapes with None, which normpath refuses
+        return abort(403)
+
+    members = list(iter_selection(targets, skip=is_server_file))
+
+    if fmt == "tar":
+        plan = plan_tar(members)
+        resp = app.response_class(stream_tar(plan), mimetype="application/x-tar", direct_passthrough=True)
+        resp.content_length = tar_size(plan)
+    else:
+        payload = 0
+        for path, _, is_dir in members:
+            if not is_dir:
+                try:
+                    payload += os.path.getsize(path)
+                except OSError:
+                    pass
+        resp = app.response_class(stream_zip_members(members), mimetype="application/zip", direct_passthrough=True)
+        resp.headers["X-Content-Bytes"] = str(payload)
+
+    resp.headers["Content-Disposition"] = attachment_header(f"{name}.{fmt}")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+def attachment_header(filename):
+    """ Content-Disposition for any file name (RFC 6266 filename* for non-ASCII). """
+    fallback = secure_filename(filename) or "download"
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
 @fs.route("/view/<path:filename>")
 @login_required
 def view_file(filename):
@@ -412,6 +1511,10 @@ def view_file(filename):
         if os.path.isdir(full_path):
             return abort(400)
 
+        # Explicit streaming mode (?stream=1); media always streams
+        if request.args.get("stream") == "1" or get_file_type(full_path) in ("video", "audio"):
+            return media_response(full_path)
+
         return send_from_directory(
             os.path.dirname(full_path),
             os.path.basename(full_path),
@@ -422,6 +1525,282 @@ def view_file(filename):
         return abort(404)
 
 
+def media_response(full_path):
+    """
+    Sends a file for in-browser playback (see plan_file_response).
+    Whole-file responses go through the server's wsgi.file_wrapper, which
+    lets servers that support it use sendfile.
+    """
+    status, headers, body = plan_file_response(full_path, request.headers)
+    if body is None:
+        return app.response_class(status=status, headers=headers)
+
+    if body[0] == "file":
+        iterable = wrap_file(request.environ, open(full_path, "rb"), RANGE_BLOCK_SIZE)
+    else:
+        iterable = iter_file_body(full_path, body)
+    return app.response_class(iterable, status=status, headers=headers, direct_passthrough=True)
+
+
+# ============================================================
+# ASYNC TRANSFERS (aiohttp backend)
+# ============================================================
+# With SERVER_BACKEND "aiohttp" these serve the same URLs as the Flask
+# routes upload_chunk, upload_chunk_raw, download_file and view_file, as
+# coroutines on the event loop (see core/asyncserve.py): waiting on the
+# network costs a task, and only disk I/O and upload bookkeeping run in the
+# thread pool. They read the Flask session cookie and apply the same access
+# rules as the decorators.
+
+def async_denied(sess, upload=False):
+    """ The response the decorators (and read-only checks) give sess, or None if it may go on. """
+    if not is_logged_in(sess):
+        return status_response(401)
+    if upload and not can_upload(sess):
+        return json_response({"error": "Upload permission required"}, 403)
+    if not upload and sess.get("role") == "uploader":
+        return status_response(403)
+    return None
+
+
+async def async_store_chunk(chunk, blocks):
+    """ ChunkWrite.store() for an async iterator of blocks. """
+    try:
+        await run_blocking(chunk.open)
+        try:
+            async for block in blocks:
+                await run_blocking(chunk.write, block)
+        finally:
+            await run_blocking(chunk.close)
+    except ChunkOverflow:
+        chunk.abandon()
+    except BaseException:
+        chunk.abandon()
+        raise
+
+
+async def async_upload_chunk_raw(request):
+    sess = read_session(app, request)
+    denied = async_denied(sess, upload=True)
+    if denied is not None:
+        return denied
+
+    try:
+        chunk, error = await run_blocking(begin_chunk, request.query, sess.get("role"))
+        if chunk is None:
+            return json_response(*error)
+        await async_store_chunk(chunk, read_blocks(request.content.read, ASYNC_BLOCK_SIZE))
+        return json_response(*await run_blocking(chunk.finish))
+
+    except Exception as e:
+        traceback.print_exc()
+        return json_response({"success": False, "error": str(e)}, 500)
+
+
+async def async_upload_chunk(request):
+    """ Multipart form; the payload streams to disk when the metadata fields come before it. """
+    sess = read_session(app, request)
+    denied = async_denied(sess, upload=True)
+    if denied is not None:
+        return denied
+
+    params = {}
+    chunk = None
+    spool = None
+    try:
+        reader = await request.multipart()
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            if part.name != "file":
+                params[part.name] = await part.text()
+            elif chunk is None and spool is None and CHUNK_FIELDS <= params.keys():
+                chunk, error = await run_blocking(begin_chunk, params, sess.get("role"))
+                if chunk is None:
+                    return json_response(*error)
+                await async_store_chunk(chunk, read_blocks(part.read_chunk, ASYNC_BLOCK_SIZE))
+            else:
+                # Metadata still to come: keep the payload until it has
+                if spool is not None:
+                    spool.close()
+                spool = tempfile.SpooledTemporaryFile(STREAM_BLOCK_SIZE)
+                async for block in read_blocks(part.read_chunk, ASYNC_BLOCK_SIZE):
+                    await run_blocking(spool.write, block)
+
+        if chunk is None:
+            if spool is None:
+                raise KeyError("file")
+            chunk, error = await run_blocking(begin_chunk, params, sess.get("role"))
+            if chunk is None:
+                return json_response(*error)
+            spool.seek(0)
+            await run_blocking(chunk.store, spool)
+        return json_response(*await run_blocking(chunk.finish))
+
+    except Exception as e:
+        traceback.print_exc()
+        return json_response({"success": False, "error": str(e)}, 500)
+
+    finally:
+        # Closing a rolled-over spool also removes its temp file
+        if spool is not None:
+            spool.close()
+
+
+async def async_send_file(request, attachment):
+    """ download_file / view_file for a file; folders go to the Flask routes (None). """
+    sess = read_session(app, request)
+    denied = async_denied(sess)
+    if denied is not None:
+        return denied
+
+    try:
+        full_path = get_validated_path(request.match_info["filename"])
+        if os.path.isdir(full_path):
+            # Folder zips (download) and the 400 (view) stay with Flask
+            return None
+        status, headers, body = await run_blocking(plan_file_response, full_path, request.headers)
+    except Exception:
+        traceback.print_exc()
+        return status_response(404)
+
+    if attachment:
+        headers["Content-Disposition"] = attachment_header(os.path.basename(full_path))
+    iterable = iter_file_body(full_path, body, ASYNC_BLOCK_SIZE) if body is not None else None
+    return await send_response(request, status, list(headers.items()), iterable)
+
+
+async def async_download_file(request):
+    return await async_send_file(request, attachment=True)
+
+
+async def async_view_file(request):
+    return await async_send_file(request, attachment=False)
+
+
+# Fields of a chunk upload that must be known before its payload can be placed
+CHUNK_FIELDS = {"chunkIndex", "totalChunks", "fileId", "filename"}
+
+ASYNC_ROUTES = [
+    ("POST", "/api/upload_chunk_raw", async_upload_chunk_raw),
+    ("POST", "/api/upload_chunk", async_upload_chunk),
+    ("GET", "/api/download/{filename:.+}", async_download_file),
+    ("GET", "/api/view/{filename:.+}", async_view_file),
+]
+
+
+# ============================================================
+# PREVIEW (partial reads of large text files)
+# ============================================================
+
+# Sparse line indexes of recently previewed files
+LINE_READER = LineReader()
+
+
+def preview_int(name, default, low, high):
+    try:
+        value = int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(low, min(high, value))
+
+
+@fs.route("/preview/<path:filename>")
+@login_required
+def preview_file(filename):
+    """
+    A slice of a (text) file without sending all of it:
+      mode=head   first kb KB           -> {text, start, end, size, more}
+      mode=tail   last kb KB            -> {text, start, end, size}
+      mode=lines  start, count lines    -> {lines, start, total, complete}
+      mode=from   kb KB after offset    -> {text, start, end, size}
+      mode=follow text/event-stream of "append" events ({text, start, end,
+                  size}) as the file grows past offset (default: its end)
+    Slices end (and tail slices start) at line boundaries.
+    """
+    if session.get("role") == "uploader":
+        return abort(403)
+
+    try:
+        full_path = get_validated_path(filename)
+        if not os.path.isfile(full_path):
+            return abort(404)
+    except (PermissionError, TypeError, ValueError):
+        return abort(404)
+
+    mode = request.args.get("mode", "head")
+    nbytes = preview_int("kb", PREVIEW_KB, 1, PREVIEW_MAX_KB) * 1024
+    size = os.path.getsize(full_path)
+
+    if mode == "follow":
+        # A reconnecting EventSource resumes after the last append it got
+        resume = request.headers.get("Last-Event-ID", "")
+        offset = int(resume) if resume.isdigit() else preview_int("offset", size, 0, size)
+        return follow_response(full_path, offset, nbytes)
+
+    try:
+        if mode == "head":
+            text, end, more = read_head(full_path, nbytes)
+            result = {"text": text, "start": 0, "end": end, "size": size, "more": more}
+        elif mode == "tail":
+            text, start, end = read_tail(full_path, nbytes)
+            result = {"text": text, "start": start, "end": end, "size": end}
+        elif mode == "from":
+            text, start, end, size = read_from(full_path, preview_int("offset", 0, 0, size), nbytes)
+            result = {"text": text, "start": start, "end": end, "size": size}
+        elif mode == "lines":
+            start = preview_int("start", 0, 0, sys.maxsize)
+            count = preview_int("count", PREVIEW_LINES, 1, PREVIEW_MAX_LINES)
+            lines, total, complete = LINE_READER.read_lines(full_path, start, count, nbytes)
+            result = {"lines": lines, "start": start, "total": total, "complete": complete}
+        else:
+            return jsonify({"error": "Unknown mode"}), 400
+    except OSError:
+        traceback.print_exc()
+        return abort(404)
+
+    result["mode"] = mode
+    resp = jsonify(result)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+def follow_response(full_path, offset, nbytes):
+    """ Streams what gets appended to full_path after offset, like tail -f. """
+
+    def stream():
+        position = offset
+        idle = 0.0
+        while True:
+            try:
+                size = os.path.getsize(full_path)
+            except OSError:
+                yield "event: gone\ndata: {}\n\n"
+                return
+
+            if size < position:
+                # Truncated or replaced (log rotation): start over
+                position = 0
+                yield f"event: reset\ndata: {json.dumps({'size': size})}\n\n"
+
+            if size > position:
+                text, _, end, size = read_from(full_path, position, nbytes)
+                if end > position:
+                    data = {"text": text, "start": position, "end": end, "size": size}
+                    yield f"id: {end}\nevent: append\ndata: {json.dumps(data)}\n\n"
+                    position, idle = end, 0.0
+                    continue
+
+            time.sleep(PREVIEW_FOLLOW_INTERVAL)
+            idle += PREVIEW_FOLLOW_INTERVAL
+            if idle >= EVENT_KEEPALIVE:
+                idle = 0.0
+                yield ": keepalive\n\n"
+
+    return event_stream_response(stream)
+
+
 # ============================================================
 # HELPERS
 # ============================================================
@@ -488,31 +1867,337 @@ def format_size(size_bytes):
 
 class ChangeHandler(FileSystemEventHandler):
     def on_any_event(self, event):
-        if (
-            ".tmp" in event.src_path
-            or "temp_uploads" in event.src_path
-            or ".git" in event.src_path
-        ):
-            return
+        dest_path = getattr(event, "dest_path", "")
+
+        # A rename out of an ignored name (e.g. a finished upload's partial
+        # file) is the creation of its destination.
+        if is_ignored_path(event.src_path):
+            if not dest_path or is_ignored_path(dest_path):
+                return
+            event_type, path, dest_path = "created", dest_path, ""
+        elif dest_path and is_ignored_path(dest_path):
+            event_type, path, dest_path = "deleted", event.src_path, ""
+        else:
+            event_type, path = event.event_type, event.src_path
 
         try:
             base = app.config["ASSETS_DIR"]
-            parent = os.path.dirname(event.src_path)
+            parent = os.path.dirname(path)
             if not base:
                 return
             if not os.path.commonpath([base, parent]).startswith(os.path.normpath(base)):
                 return
 
-            bump_version("watchdog_event")
+            # A folder is "modified" whenever its entries change; those
+            # changes arrive as events of their own. Open/close events
+            # change nothing that is listed.
+            if event.is_directory and event_type == "modified":
+                return
+            if event_type not in ("created", "modified", "deleted", "moved"):
+                return
+
+            update_hash_index(event_type, path, dest_path)
+            WATCH_EVENTS.add(watchdog_changes(event_type, path, dest_path), event.is_directory)
 
         except:
             pass
 
 
+def apply_watch_batch(batch):
+    """
+    Handles one coalesced batch of watchdog changes: evicts the affected
+    listings (once per folder) and announces the batch as a single version.
+    """
+    if HUB is not None:
+        # Coordinator: the listings live in the workers
+        share_changes(batch, "watchdog_batch")
+        return
+    invalidate_listings(batch)
+    announce([(op, path) for op, path, _ in batch], "watchdog_batch")
+
+
+def invalidate_listings(batch):
+    """ Evicts the listings that [(op, path, is_dir)] touch, once per folder. """
+    seen_folders = set()
+    for op, path, is_dir in batch:
+        if is_dir and op != "updated":
+            LISTINGS.invalidate(path, recursive=True)
+            continue
+        folder = os.path.dirname(path)
+        if folder not in seen_folders:
+            seen_folders.add(folder)
+            LISTINGS.invalidate(path)
+
+
+# Watchdog events are queued here and applied in batches
+WATCH_EVENTS = EventCoalescer(apply_watch_batch)
+
+
+def report_event_stats():
+    """ Prints the filesystem event rate for the launcher GUI (see STATS_LOG_PREFIX). """
+    last = None
+    while True:
+        time.sleep(STATS_INTERVAL)
+        stats = WATCH_EVENTS.stats()
+        stats["subscribers"] = sum(WORKER_SUBSCRIBERS.values()) if HUB is not None else len(EVENTS)
+        # Idle: report the drop to zero once, then stay quiet
+        key = (stats["events_per_sec"], stats["subscribers"])
+        if key != last:
+            print(STATS_LOG_PREFIX + json.dumps(stats), flush=True)
+            last = key
+
+
+def watchdog_changes(event_type, path, dest_path=""):
+    """ Translates a watchdog event into announce() changes. """
+    if event_type == "moved":
+        return [("removed", path), ("added", dest_path)] if dest_path else [("removed", path)]
+    if event_type == "deleted":
+        return [("removed", path)]
+    if event_type == "created":
+        return [("added", path)]
+    return [("updated", path)]
+
+
+def update_hash_index(event_type, path, dest_path=""):
+    if event_type == "deleted":
+        HASHES.remove(path)
+    elif event_type == "moved":
+        if dest_path and not is_ignored_path(dest_path):
+            HASHES.move(path, dest_path)
+        else:
+            HASHES.remove(path)
+    elif event_type in ("created", "modified"):
+        HASHES.touch(path)
+
+
+# ============================================================
+# MULTI-PROCESS MODE
+# ============================================================
+# With SERVER_PROCESSES > 1 the launched process becomes a coordinator: it
+# owns the watchdog, the hash and search index files and the change
+# counter, and starts worker processes that serve HTTP on one shared
+# listening socket. Every change, whoever made it, is numbered by the
+# coordinator and broadcast to all workers in the same order, so their
+# versions, listing caches and event ids agree. Upload sessions are shared
+# through their manifests (SharedUploadRegistry).
+
+# Set in the coordinator
+HUB = None
+
+# Set in a worker
+LINK = None
+
+# Open event streams per worker, reported by the workers for the stats line
+WORKER_SUBSCRIBERS = {}
+
+
+def shareable_changes(changes):
+    """
+    announce() changes as share_changes() arguments: [(op, path, is_dir)]
+    and the digests this process already knows of the files.
+    """
+    batch = [(op, path, op == "removed" or os.path.isdir(path)) for op, path in changes]
+    digests = {}
+    for op, path in changes:
+        if op != "removed":
+            sha256 = HASHES.get(path)
+            if sha256:
+                digests[path] = sha256
+    return batch, digests
+
+
+def share_changes(batch, reason="", digests=None, reply_to=None):
+    """ Coordinator: numbers a batch of changes, records it and broadcasts it to every worker. """
+    digests = digests or {}
+    with HUB.ordered():
+        version = bump_version(reason, *(path for _, path, _ in batch))
+        for op, path, _ in batch:
+            if op == "removed":
+                SEARCH.remove(path)
+            else:
+                SEARCH.touch(path)
+        for path, sha256 in digests.items():
+            try:
+                HASHES.put(path, sha256)
+            except OSError:
+                pass
+        HUB.broadcast("changes", version, batch, digests, reply_to=reply_to)
+    return version
+
+
+def save_indexes():
+    """ Coordinator: writes the indexes for workers to load. Caller holds HUB.ordered(). """
+    HASHES.save()
+    SEARCH.save()
+
+
+def handle_worker_message(index, kind, req_id, *args):
+    """ Coordinator end of the worker pipes. """
+    if kind == "announce":
+        batch, digests, reason = args
+        share_changes(batch, reason, digests, reply_to=(index, req_id))
+    elif kind == "expect":
+        WATCH_EVENTS.expect(*args)
+    elif kind == "hello":
+        # A (re)started worker: it continues from the current version, and
+        # loads the indexes again if they were reconciled before it started
+        with HUB.ordered():
+            ready = HASHES.ready and SEARCH.ready
+            if ready:
+                save_indexes()
+            HUB.send(index, "hello", req_id, VERSIONS.current, ready)
+    elif kind == "stats":
+        WORKER_SUBSCRIBERS[index] = args[0]
+
+
+def handle_coordinator_message(kind, *args):
+    """ Worker end of the pipe; runs for every broadcast, in order. """
+    if kind == "changes":
+        version, batch, digests = args
+        VERSIONS.advance(version, *(path for _, path, _ in batch))
+        invalidate_listings(batch)
+        for op, path, _ in batch:
+            if op == "removed":
+                HASHES.remove(path)
+            else:
+                HASHES.touch(path)
+        for path, sha256 in digests.items():
+            try:
+                HASHES.put(path, sha256)
+            except OSError:
+                pass
+        apply_changes(version, [(op, path) for op, path, _ in batch])
+        return version
+
+    if kind == "hello":
+        version, ready = args
+        VERSIONS.advance(version)
+        if ready:
+            reload_indexes()
+        return version
+
+    if kind == "reload":
+        reload_indexes()
+
+
+def reload_indexes():
+    """ Worker: takes over the indexes the coordinator has brought up to date. """
+    root = app.config["ASSETS_DIR"]
+    HASHES.load(root)
+    HASHES.ready = True
+    SEARCH.load(root)
+    SEARCH.ready = True
+    LISTINGS.clear()
+
+
+def broadcast_when_indexed():
+    """ Coordinator: once the startup scans are done, has every worker reload the indexes. """
+    while not (HASHES.ready and SEARCH.ready):
+        time.sleep(1)
+    with HUB.ordered():
+        save_indexes()
+        HUB.broadcast("reload")
+
+
+def report_worker_stats():
+    """ Worker: sends its open event streams to the coordinator. """
+    last = None
+    while True:
+        time.sleep(STATS_INTERVAL)
+        count = len(EVENTS)
+        if count != last:
+            LINK.send("stats", count)
+            last = count
+
+
+def run_worker(index, conn, sock, settings, options):
+    """ Entry point of a worker process: serves on sock until the coordinator goes away. """
+    global LINK, UPLOADS, ARCHIVES, THUMBS
+
+    try:
+        processes = max(1, int(settings.get("server_processes", 1)))
+        LINK = HubLink(conn, handle_coordinator_message)
+        UPLOADS = SharedUploadRegistry(UPLOAD_STATE_DIR)
+
+        # The coordinator maintains the index files; a worker keeps its copy
+        # current from the broadcasts but never writes them
+        HASHES.persist = False
+        SEARCH.persist = False
+
+        # Each worker gets its own cache folder and a share of the budget
+        ARCHIVES = ArchiveCache(os.path.join(ARCHIVE_CACHE_DIR, f"worker-{index}"), 0)
+        THUMBS = ThumbnailCache(os.path.join(THUMB_CACHE_DIR, f"worker-{index}"), 0, workers=max(1, THUMBS.workers // processes))
+        for key, default in (("archive_cache_mb", ARCHIVE_CACHE_MB), ("thumb_cache_mb", THUMB_CACHE_MB)):
+            try:
+                settings[key] = max(0, int(settings.get(key, default))) // processes
+            except (TypeError, ValueError):
+                settings[key] = default // processes
+
+        _configure_app(settings)
+        EVENTS.boot = settings["event_boot"]
+        if options["backend"] != "werkzeug":
+            # Fixed thread pool: event streams get their own threads in it
+            STREAMS.limit = options["streams"]
+
+        LINK.start()
+        LINK.call("hello")
+        threading.Thread(target=report_worker_stats, daemon=True).start()
+
+        serve(app, "0.0.0.0", sock.getsockname()[1], sock=sock, async_routes=ASYNC_ROUTES, **options)
+
+    except Exception:
+        traceback.print_exc()
+        sys.exit(1)
+
+
+def run_coordinator(settings, options, port, processes):
+    """ Starts the worker processes and feeds them changes; blocks for as long as the server runs. """
+    global HUB
+
+    # Shared by the workers: session cookies and event ids stay valid
+    # whichever worker a request lands on
+    settings["secret_key"] = load_secret_key()
+    settings["event_boot"] = EVENTS.boot
+    settings["server_processes"] = processes
+
+    sock = make_listener("0.0.0.0", port, options["backlog"], options["buffer_bytes"])
+
+    HUB = Hub(handle_worker_message)
+    HUB.start_workers(processes, run_worker, (sock, settings, options))
+    threading.Thread(target=broadcast_when_indexed, daemon=True).start()
+
+    print(f"Serving with {processes} worker processes ({options['threads']} threads each)")
+    print(f"Server started on port {port}")
+    HUB.supervise()
+
+
 # ============================================================
 # CONFIG
 # ============================================================
 
+def load_secret_key(path=SECRET_KEY_PATH):
+    """ The session signing key, created on first run and reused after that. """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except OSError:
+        pass
+
+    key = secrets.token_hex(32)
+    tmp = path + ".tmp"
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(key)
+        os.replace(tmp, path)
+    except OSError as e:
+        # Still serves; logins just won't outlive this run
+        print(f"Could not save the session key: {e}")
+    return key
+
+
 def _configure_app(settings):
     folder_path = os.path.normpath(settings["folder_path"])
     if not os.path.exists(folder_path):
@@ -521,6 +2206,9 @@ def _configure_app(settings):
     settings["folder_path"] = folder_path
 
     app.config["ASSETS_DIR"] = folder_path
+    HASHES.load(folder_path)
+    SEARCH.load(folder_path)
+    LISTINGS.clear()
     app.config["ENABLE_ADMIN"] = settings["enable_admin"]
     app.config["ADMIN_PASS"] = settings["admin_pass"]
     app.config["ENABLE_VIEWER"] = settings["enable_viewer"]
@@ -548,7 +2236,23 @@ def _configure_app(settings):
     except:
         app.config["MAX_UPLOAD_BYTES"] = 0
 
-    app.config["SECRET_KEY"] = secrets.token_hex(16)
+    app.config["DIRECT_UPLOAD"] = bool(settings.get("direct_upload", True))
+    app.config["DEDUP_UPLOADS"] = bool(settings.get("dedup_uploads", True))
+
+    try:
+        ARCHIVES.max_bytes = max(0, int(settings.get("archive_cache_mb", ARCHIVE_CACHE_MB))) * 1024 * 1024
+    except (TypeError, ValueError):
+        ARCHIVES.max_bytes = ARCHIVE_CACHE_MB * 1024 * 1024
+    ARCHIVES.load()
+
+    try:
+        THUMBS.max_bytes = max(0, int(settings.get("thumb_cache_mb", THUMB_CACHE_MB))) * 1024 * 1024
+    except (TypeError, ValueError):
+        THUMBS.max_bytes = THUMB_CACHE_MB * 1024 * 1024
+    THUMBS.load()
+
+    # The worker processes of one server accept each other's session cookies
+    app.config["SECRET_KEY"] = settings.get("secret_key") or load_secret_key()
 
     if "fs" not in app.blueprints:
         app.register_blueprint(fs, url_prefix="/api")
@@ -558,6 +2262,39 @@ def _configure_app(settings):
 # PRODUCTION ENTRY (EXE MODE)
 # ============================================================
 
+def server_options(settings):
+    """ Keyword arguments of serve() from the launcher settings, defaulting to config.py. """
+
+    def number(key, default, low):
+        try:
+            return max(low, int(settings.get(key, default)))
+        except (TypeError, ValueError):
+            return default
+
+    return {
+        "backend": available_backend(str(settings.get("server_backend", SERVER_BACKEND)).strip().lower()),
+        "threads": number("server_threads", SERVER_THREADS, 1),
+        "streams": number("server_event_streams", SERVER_EVENT_STREAMS, 0),
+        "inbuf_bytes": number("server_inbuf_mb", SERVER_INBUF_MB, 0) * 1024 * 1024,
+        "backlog": number("server_backlog", SERVER_BACKLOG, 1),
+        "buffer_bytes": number("server_socket_buffer_kb", SERVER_SOCKET_BUFFER_KB, 0) * 1024,
+        "connection_limit": SERVER_CONNECTION_LIMIT,
+        "channel_timeout": SERVER_IDLE_TIMEOUT,
+    }
+
+
+def server_processes(settings, options):
+    """ Server processes to run; several need a backend that can share a listening socket. """
+    try:
+        processes = max(1, int(settings.get("server_processes", SERVER_PROCESSES)))
+    except (TypeError, ValueError):
+        processes = SERVER_PROCESSES
+    if processes > 1 and options["backend"] not in SHARED_SOCKET_BACKENDS:
+        print("Several server processes need waitress or aiohttp, running one")
+        return 1
+    return processes
+
+
 def run_production_server():
 
     try:
@@ -567,24 +2304,34 @@ def run_production_server():
         settings = json.loads(sys.argv[2])
 
         _configure_app(settings)
+        prune_stale_uploads()
 
         folder = settings["folder_path"]
+        options = server_options(settings)
+        processes = server_processes(settings, options)
+        port = int(settings.get("port", PORT))
+
+        HASHES.start()
+        SEARCH.start()
+        WATCH_EVENTS.start()
+        threading.Thread(target=report_event_stats, daemon=True).start()
 
         obs = Observer()
         obs.schedule(ChangeHandler(), folder, recursive=True)
         obs.start()
 
+        if processes > 1:
+            run_coordinator(settings, options, port, processes)
+            return
+
+        if options["backend"] != "werkzeug":
+            # Fixed thread pool: event streams get their own threads in it
+            STREAMS.limit = options["streams"]
+
         # log essential
-        port = int(settings.get("port", PORT))
         print(f"Server started on port {port}")
 
-        app.run(
-            host="0.0.0.0",
-            port=port,
-            debug=False,
-            use_reloader=False,
-            threaded=True
-        )
+        serve(app, "0.0.0.0", port, async_routes=ASYNC_ROUTES, **options)
 
     except Exception as e:
         traceback.print_exc()
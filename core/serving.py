@@ -0,0 +1,150 @@
+# core/serving.py
+# The HTTP servers the Flask app can run under.
+# "waitress" is the production backend: one event-loop thread owns every
+# socket (accepting, reading requests, writing responses) and a fixed pool
+# of worker threads runs the app, so idle keep-alive connections and slow
+# clients cost no thread and a burst of connections cannot spawn hundreds
+# of them. "aiohttp" goes further for transfers: uploads, downloads and
+# media run as asyncio tasks (see core/asyncserve.py). "werkzeug" is the
+# development server used before (one thread per connection); it is the
+# fallback when neither is installed.
+
+import os
+import socket
+import threading
+
+try:
+    from waitress.server import create_server
+except ImportError:
+    create_server = None
+
+from .asyncserve import web, run_aiohttp
+
+BACKENDS = ("waitress", "aiohttp", "werkzeug")
+
+# Backends whose worker processes can accept on one shared socket
+SHARED_SOCKET_BACKENDS = ("waitress", "aiohttp")
+
+
+def available_backend(name):
+    """ name if it can run here, else the fallback ("werkzeug"). """
+    if name not in BACKENDS:
+        name = BACKENDS[0]
+    if name == "aiohttp" and web is None:
+        print("aiohttp is not installed, using waitress")
+        name = "waitress"
+    if name == "waitress" and create_server is None:
+        print("waitress is not installed, using the development server")
+        return "werkzeug"
+    return name
+
+
+def socket_options(buffer_bytes):
+    """ Options set on every accepted connection. """
+    options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+    if buffer_bytes > 0:
+        # Large buffers keep uploads streaming across round trips
+        options += [
+            (socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_bytes),
+            (socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_bytes),
+        ]
+    return options
+
+
+def make_listener(host, port, backlog, buffer_bytes):
+    """
+    A bound, listening TCP socket: for the aiohttp backend, and for the
+    worker processes of a multi-process server to share (see core/cluster.py).
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if os.name != "nt":
+        # On Windows this would let another program take over the port
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    for level, name, value in socket_options(buffer_bytes)[1:]:
+        sock.setsockopt(level, name, value)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def make_waitress_server(app, host, port, threads, backlog, buffer_bytes, connection_limit, channel_timeout, inbuf_bytes=0, sock=None):
+    # A socket from make_listener() replaces host and port
+    where = {"sockets": [sock]} if sock is not None else {"host": host, "port": port}
+    # Bodies above inbuf_overflow are spooled to a temp file before the app
+    # runs; the default (512 KB) would write every upload chunk twice
+    buffers = {"inbuf_overflow": inbuf_bytes} if inbuf_bytes > 0 else {}
+    server = create_server(
+        app,
+        threads=threads,
+        backlog=backlog,
+        connection_limit=connection_limit,
+        # Idle keep-alive connections are closed after this many seconds
+        channel_timeout=channel_timeout,
+        recv_bytes=max(8192, min(buffer_bytes, 256 * 1024)),
+        # poll() has no FD_SETSIZE limit on open connections
+        asyncore_use_poll=True,
+        ident="LocalFileHub",
+        **buffers,
+        **where,
+    )
+    # Not a create_server() keyword: applied to each accepted connection
+    server.adj.socket_options = socket_options(buffer_bytes)
+    if buffer_bytes > 0 and sock is None:
+        # Set on the listener too, so the receive window offered in the
+        # handshake already reflects the large buffer
+        for level, name, value in server.adj.socket_options[1:]:
+            server.socket.setsockopt(level, name, value)
+    return server
+
+
+def serve(app, host, port, backend, threads, backlog, buffer_bytes, connection_limit, channel_timeout, streams=0, inbuf_bytes=0, sock=None, async_routes=()):
+    """
+    Runs app until the process is stopped (on sock, if given, instead of
+    host:port). async_routes are the aiohttp backend's native handlers.
+    The pool has threads for requests plus streams for event streams, so
+    open pages never take workers away from requests.
+    """
+    if backend == "waitress":
+        server = make_waitress_server(app, host, port, threads + streams, backlog, buffer_bytes, connection_limit, channel_timeout, inbuf_bytes, sock)
+        if sock is None:
+            print(f"Serving with waitress: {threads} workers (+{streams} for event streams), backlog {backlog}")
+        server.run()
+    elif backend == "aiohttp":
+        if sock is None:
+            # Accepted connections inherit the listener's buffer sizes;
+            # aiohttp sets TCP_NODELAY itself. There is no connection limit.
+            sock = make_listener(host, port, backlog, buffer_bytes)
+            print(f"Serving with aiohttp: {threads} pool threads (+{streams} for event streams), backlog {backlog}")
+        run_aiohttp(app, async_routes, sock, threads + streams, channel_timeout)
+    else:
+        app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
+
+
+class StreamSlots:
+    """
+    Caps open long-lived responses (event streams). Each holds a worker
+    thread for as long as its client stays connected, so with a fixed pool
+    they must not be allowed to take every worker. limit None = no cap.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ True if a stream may start (call release() when it ends). """
+        with self._lock:
+            if self.limit is not None and self._open >= self.limit:
+                return False
+            self._open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._open -= 1
+
+    @property
+    def open(self):
+        with self._lock:
+            return self._open
@@ -0,0 +1,91 @@
+# core/tarstream.py
+# Uncompressed tar archives streamed straight from the files.
+# All headers are built before the first byte is sent, which makes the
+# exact archive size known up front (Content-Length, so browsers can show
+# real progress). PAX headers carry long and non-ASCII names and sizes
+# beyond 8 GiB.
+
+import os
+import tarfile
+
+TAR_BLOCK_SIZE = 1024 * 1024
+BLOCK = tarfile.BLOCKSIZE
+
+# Two zero blocks end an archive
+END_OF_ARCHIVE = b"\0" * (2 * BLOCK)
+
+
+class TarMember:
+    __slots__ = ("path", "header", "size")
+
+    def __init__(self, path, header, size):
+        self.path = path
+        self.header = header
+        self.size = size
+
+    @property
+    def length(self):
+        """ Bytes this member takes in the archive. """
+        return len(self.header) + self.size + (-self.size % BLOCK)
+
+
+def plan_tar(members):
+    """ Stats (path, arcname, is_dir) members and builds their headers. Vanished files are skipped. """
+    plan = []
+    for path, arcname, is_dir in members:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+
+        info = tarfile.TarInfo(arcname.rstrip("/") if is_dir else arcname)
+        info.mtime = int(st.st_mtime)
+        if is_dir:
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+            info.size = 0
+        else:
+            info.mode = 0o644
+            info.size = st.st_size
+
+        header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        plan.append(TarMember(None if is_dir else path, header, info.size))
+    return plan
+
+
+def tar_size(plan):
+    return sum(member.length for member in plan) + len(END_OF_ARCHIVE)
+
+
+def stream_tar(plan, block_size=TAR_BLOCK_SIZE):
+    """
+    Generator of the archive bytes for plan. Every member contributes
+    exactly the size recorded in its header: files that shrank or vanished
+    meanwhile are zero-padded, growth is cut off.
+    """
+    for member in plan:
+        yield member.header
+        if member.path is None:
+            continue
+
+        remaining = member.size
+        try:
+            with open(member.path, "rb") as f:
+                while remaining > 0:
+                    data = f.read(min(block_size, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+        except OSError:
+            pass
+
+        while remaining > 0:
+            pad = min(block_size, remaining)
+            remaining -= pad
+            yield b"\0" * pad
+
+        if member.size % BLOCK:
+            yield b"\0" * (-member.size % BLOCK)
+
+    yield END_OF_ARCHIVE
@@ -0,0 +1,290 @@
+# core/thumbnails.py
+# Small JPEG previews of images, rendered in worker processes.
+# A thumbnail is keyed by the content it was made from (the file's
+# SHA-256 when the hash index knows it, else path + size + mtime) and the
+# requested edge length, so an unchanged image is never rendered twice and
+# a changed one never gets its old preview. Rendered files live on disk
+# with an LRU byte budget; watchdog changes delete the previews of the
+# files they touch. Pillow is optional: without it there are no thumbnails.
+
+import os
+import json
+import time
+import hashlib
+import threading
+import traceback
+import multiprocessing
+import multiprocessing.connection
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+THUMB_QUALITY = 80
+
+# Largest source image rendered (pixels); bigger ones are refused
+MAX_SOURCE_PIXELS = 20000 * 20000
+
+# Unreadable sources remembered so they are not retried on every listing
+MAX_FAILED = 10000
+
+
+def _exit_with_parent():
+    """ Pool initializer: ends the worker when the server process is gone (e.g. terminated). """
+    parent = multiprocessing.parent_process()
+    if parent is None:
+        return
+
+    def watch():
+        multiprocessing.connection.wait([parent.sentinel])
+        os._exit(0)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def render_thumbnail(src, dst, size):
+    """ Runs in a worker process: writes a JPEG of src fitting size x size to dst. """
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+    with Image.open(src) as im:
+        # JPEG decoders can downscale while decoding, which is much cheaper
+        im.draft("RGB", (size, size))
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((size, size))
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        tmp = dst + ".tmp"
+        im.save(tmp, "JPEG", quality=THUMB_QUALITY, optimize=True)
+    os.replace(tmp, dst)
+    return os.path.getsize(dst)
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir, max_bytes, workers=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+        # key -> {"src", "size", "last_used"} of rendered thumbnails
+        self._entries = {}
+        # key -> Future of a render in progress
+        self._pending = {}
+        # Keys whose source could not be rendered
+        self._failed = set()
+        self._pool = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return Image is not None and self.max_bytes > 0
+
+    def _norm(self, path):
+        return os.path.normcase(os.path.normpath(path))
+
+    def _thumb_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def key_for(self, path, size, digest=None, st=None):
+        """ Content key of the size px thumbnail of path. """
+        if digest is None:
+            st = st or os.stat(path)
+            digest = f"{self._norm(path)}\0{st.st_size}\0{st.st_mtime_ns}"
+        return hashlib.sha256(f"{digest}\0{size}".encode("utf-8")).hexdigest()[:32]
+
+    # --- persistence ---
+
+    def load(self):
+        """ Reads the index and deletes thumbnails it does not vouch for. """
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+
+        with self._lock:
+            self._entries = {
+                key: entry for key, entry in entries.items()
+                if os.path.exists(self._thumb_path(key))
+            }
+            known = {f"{key}.jpg" for key in self._entries}
+
+        for name in os.listdir(self.cache_dir):
+            if name != "index.json" and name not in known:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        self._evict()
+
+    def save(self):
+        """ Writes the index if it changed (called on new thumbnails and periodically). """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._entries)
+            self._dirty = False
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            pass
+
+    # --- rendering ---
+
+    def _executor(self):
+        """ Caller holds self._lock. """
+        if self._pool is None:
+            # Spawned, not forked: a forked worker would inherit the
+            # listening socket and keep the port after the server exits
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_exit_with_parent,
+            )
+        return self._pool
+
+    def _request(self, path, key, size):
+        """
+        Returns the thumbnail path if key is rendered, else the future of
+        its render (starting one unless it is already under way), or None
+        if the source could not be rendered before.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["last_used"] = time.time()
+                return self._thumb_path(key)
+
+            if key in self._failed:
+                return None
+
+            future = self._pending.get(key)
+            started = future is None
+            if started:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                future = self._executor().submit(render_thumbnail, path, self._thumb_path(key), size)
+                self._pending[key] = future
+
+        if started:
+            # Outside the lock: runs at once if the render already finished
+            src = self._norm(path)
+            future.add_done_callback(lambda f: self._finished(key, src, f))
+        return future
+
+    def _finished(self, key, src, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            try:
+                size = future.result()
+            except Exception:
+                # Not an image Pillow can read: do not try this content again
+                if len(self._failed) < MAX_FAILED:
+                    self._failed.add(key)
+                return
+            self._entries[key] = {"src": src, "size": size, "last_used": time.time()}
+            self._dirty = True
+            total = sum(e["size"] for e in self._entries.values())
+        if total > self.max_bytes:
+            self._evict()
+
+    def get_many(self, items, size, timeout=2.0):
+        """
+        Thumbnails of [(path, digest or None)] at size px, rendered in
+        parallel. Returns ({path: (key, thumbnail path)} of those ready
+        within timeout, [paths still rendering]); the renders carry on.
+        """
+        if not self.enabled:
+            return {}, []
+
+        waiting = {}
+        for path, digest in items:
+            try:
+                key = self.key_for(path, size, digest)
+                waiting[path] = (key, self._request(path, key, size))
+            except Exception:
+                traceback.print_exc()
+
+        deadline = time.monotonic() + timeout
+        ready = {}
+        pending = []
+        for path, (key, result) in waiting.items():
+            if result is None:
+                continue
+            if not isinstance(result, str):
+                try:
+                    result.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeout:
+                    pending.append(path)
+                    continue
+                except Exception:
+                    continue
+                result = self._thumb_path(key)
+            ready[path] = (key, result)
+
+        self.save()
+        return ready, pending
+
+    def get(self, path, size, digest=None, timeout=2.0):
+        """ (key, thumbnail path) for path, or None if it cannot be made (yet). """
+        return self.get_many([(path, digest)], size, timeout)[0].get(path)
+
+    # --- invalidation / eviction ---
+
+    def invalidate(self, path):
+        """ path (a file, or a folder and everything in it) changed: drops its thumbnails. """
+        key = self._norm(path)
+        prefix = key.rstrip(os.sep) + os.sep
+        with self._lock:
+            doomed = [k for k, e in self._entries.items() if e["src"] == key or e["src"].startswith(prefix)]
+            for k in doomed:
+                del self._entries[k]
+            if doomed:
+                self._dirty = True
+
+        for k in doomed:
+            self._remove_file(k)
+        if doomed:
+            self.save()
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._thumb_path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """ Drops least recently used thumbnails until the total fits max_bytes. """
+        with self._lock:
+            total = sum(e["size"] for e in self._entries.values())
+            victims = []
+            for key, entry in sorted(self._entries.items(), key=lambda kv: kv[1]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= entry["size"]
+            for key in victims:
+                del self._entries[key]
+            if victims:
+                self._dirty = True
+
+        for key in victims:
+            self._remove_file(key)
+        self.save()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
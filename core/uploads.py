@@ -0,0 +1,626 @@
+# core/uploads.py
+# In-process bookkeeping for chunked uploads.
+# One UploadSession per fileId tracks which chunks have arrived, so the
+# request that delivers the last chunk can be detected without touching disk.
+# Sessions are mirrored to small JSON manifests so an upload can resume
+# after the server restarts.
+# Each session also keeps a whole-file SHA-256 that is fed in chunk order
+# while the data streams in. Chunks that arrive ahead of their turn are
+# read back by a background hasher per upload, never by a request thread.
+# When several server processes share the uploads, SharedUploadRegistry
+# makes the manifest the source of truth instead (see below).
+
+import os
+import json
+import time
+import base64
+import hashlib
+import zlib
+import threading
+import traceback
+from collections import OrderedDict
+
+from .utils import file_lock
+
+# How many finished uploads stay queryable through the status endpoint
+FINISHED_HISTORY = 256
+
+# Shared sessions write merge progress to their manifest at most this often (seconds)
+PROGRESS_SAVE_INTERVAL = 0.5
+
+# Lock file in the state dir serializing manifest updates across processes
+SHARED_LOCK_NAME = ".lock"
+
+
+class Crc32:
+    """ zlib.crc32 behind the hashlib update()/hexdigest() interface. """
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value & 0xFFFFFFFF:08x}"
+
+
+CHUNK_DIGESTS = {
+    "sha256": hashlib.sha256,
+    "crc32": Crc32,
+}
+
+
+class UploadFinishedError(ValueError):
+    """ A chunk arrived for an upload that has already finished (e.g. a late client retry). """
+
+
+def parse_chunk_digest(spec):
+    """
+    Parses a client chunk digest of the form "<algorithm>:<hex>".
+    Returns (hasher, expected_hex), or (None, None) when spec is empty.
+    """
+    if not spec:
+        return None, None
+    algorithm, _, expected = spec.partition(":")
+    factory = CHUNK_DIGESTS.get(algorithm.lower())
+    if factory is None or not expected:
+        raise ValueError(f"Unsupported chunk digest: {spec}")
+    return factory(), expected.lower()
+
+
+class UploadSession:
+    """ Received-chunk bitmap and byte counters for a single upload. """
+
+    def __init__(self, file_id, filename, path, total_chunks, total_size=0, chunk_size=0):
+        self.file_id = file_id
+        self.filename = filename
+        self.path = path
+        self.total_chunks = total_chunks
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+
+        self.bitmap = bytearray((total_chunks + 7) // 8)
+        self.chunks_received = 0
+        self.bytes_received = 0
+        self.finalizing = False
+
+        # "uploading" -> ("merging" ->) "complete" | "failed"
+        self.status = "uploading"
+        self.merged_bytes = 0
+        self.error = None
+
+        # Whole-file digest state. hashed_chunks is the count of leading
+        # chunks already fed to file_hasher; hash_claim is the chunk being
+        # hashed by its request thread or the background hasher, if any.
+        # hash_lock is never held while reading from disk.
+        self.file_hasher = hashlib.sha256()
+        self.hashed_chunks = 0
+        self.hash_claim = None
+        self.hash_running = False
+        self.sha256 = None
+        self.hash_lock = threading.Lock()
+        self.hash_cond = threading.Condition(self.hash_lock)
+
+        # Absolute path of the preallocated target for direct uploads
+        self.part_path = None
+        # Where mark_received() mirrors this session (set by the registry)
+        self.manifest_path = None
+        self.updated_at = time.time()
+
+        self.lock = threading.Lock()
+
+    def has_chunk(self, index):
+        return bool(self.bitmap[index >> 3] & (1 << (index & 7)))
+
+    def mark_received(self, index, nbytes):
+        """
+        Records a chunk. Returns True exactly once: for the call that
+        completes the upload. Duplicate chunks (client retries) are ignored.
+        """
+        if not 0 <= index < self.total_chunks:
+            raise ValueError(f"Chunk index {index} out of range")
+
+        with self.lock:
+            if not self.has_chunk(index):
+                self.bitmap[index >> 3] |= 1 << (index & 7)
+                self.chunks_received += 1
+                self.bytes_received += nbytes
+                self.updated_at = time.time()
+                self._save()
+
+            if self.chunks_received == self.total_chunks and not self.finalizing:
+                self.finalizing = True
+                return True
+
+        return False
+
+    def received_chunks(self):
+        with self.lock:
+            return [i for i in range(self.total_chunks) if self.has_chunk(i)]
+
+    def set_status(self, status):
+        self.status = status
+
+    def add_merged(self, nbytes):
+        """ Merge progress for the status endpoint. """
+        self.merged_bytes += nbytes
+
+    # --- whole-file digest ---
+
+    def claim_inline_hash(self, index):
+        """
+        If chunk index is next in line for the whole-file digest, returns a
+        copy of the hasher to feed while the chunk streams in; else None.
+        Must be followed by commit_inline_hash().
+        """
+        with self.hash_lock:
+            if (
+                index == self.hashed_chunks
+                and self.hash_claim is None
+                and not self.has_chunk(index)
+            ):
+                self.hash_claim = index
+                return self.file_hasher.copy()
+        return None
+
+    def commit_inline_hash(self, index, hasher):
+        """ Adopts the inline hasher, or just releases the claim when hasher is None. """
+        with self.hash_lock:
+            if self.hash_claim != index:
+                return
+            self.hash_claim = None
+            if hasher is not None:
+                self.file_hasher = hasher
+                self.hashed_chunks = index + 1
+                self._seal_hash()
+            self.hash_cond.notify_all()
+
+    def catch_up_hash(self, read_chunk):
+        """
+        Starts the background hasher if stored chunks are waiting for their
+        turn; read_chunk(i, hasher) must hash chunk i from disk. Returns the
+        hex digest if it is already complete, else None.
+        """
+        with self.hash_lock:
+            self._seal_hash()
+            if self.sha256 is None and not self.hash_running and self._hash_behind():
+                self.hash_running = True
+                threading.Thread(target=self._hash_stored, args=(read_chunk,), daemon=True).start()
+            return self.sha256
+
+    @property
+    def hashing(self):
+        """ True while a chunk is being fed to the whole-file digest. """
+        with self.hash_lock:
+            return self.hash_running or self.hash_claim is not None
+
+    def wait_hashed(self, timeout=None):
+        """ Waits for the hashing under way to stop; returns the digest, or None if incomplete. """
+        with self.hash_lock:
+            self.hash_cond.wait_for(
+                lambda: self.sha256 is not None or not (self.hash_running or self.hash_claim is not None),
+                timeout,
+            )
+            return self.sha256
+
+    def _hash_behind(self):
+        """ The next chunk in line is stored but not hashed. Caller holds hash_lock. """
+        index = self.hashed_chunks
+        return index < self.total_chunks and self.hash_claim is None and self.has_chunk(index)
+
+    def _seal_hash(self):
+        """ Caller holds hash_lock. """
+        if self.hashed_chunks == self.total_chunks and self.sha256 is None:
+            self.sha256 = self.file_hasher.hexdigest()
+            self.hash_cond.notify_all()
+
+    def _hash_stored(self, read_chunk):
+        """ Background hasher: claims chunks in turn and reads them back outside the lock. """
+        while True:
+            with self.hash_lock:
+                if not self._hash_behind():
+                    self.hash_running = False
+                    self._seal_hash()
+                    self.hash_cond.notify_all()
+                    return
+                index = self.hashed_chunks
+                self.hash_claim = index
+                hasher = self.file_hasher.copy()
+
+            try:
+                read_chunk(index, hasher)
+            except Exception:
+                # The digest is informational; the next stored chunk retries
+                traceback.print_exc()
+                with self.hash_lock:
+                    self.hash_running = False
+                self.commit_inline_hash(index, None)
+                return
+            self.commit_inline_hash(index, hasher)
+
+    @property
+    def complete(self):
+        return self.chunks_received == self.total_chunks
+
+    # --- persistence ---
+
+    def to_dict(self):
+        # The digest state cannot be serialized (hashlib), so a reloaded
+        # session has the background hasher read the received prefix again
+        return {
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "path": self.path,
+            "total_chunks": self.total_chunks,
+            "total_size": self.total_size,
+            "chunk_size": self.chunk_size,
+            "bitmap": base64.b64encode(bytes(self.bitmap)).decode("ascii"),
+            "chunks_received": self.chunks_received,
+            "bytes_received": self.bytes_received,
+            "part_path": self.part_path,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        upload = cls(
+            data["file_id"],
+            filename=data["filename"],
+            path=data["path"],
+            total_chunks=data["total_chunks"],
+            total_size=data.get("total_size", 0),
+            chunk_size=data.get("chunk_size", 0),
+        )
+        upload.bitmap[:] = base64.b64decode(data["bitmap"])
+        upload.chunks_received = data["chunks_received"]
+        upload.bytes_received = data["bytes_received"]
+        upload.part_path = data.get("part_path")
+        upload.updated_at = data.get("updated_at", time.time())
+        return upload
+
+    def _save(self):
+        """ Atomically rewrites the manifest. Caller holds self.lock. """
+        if not self.manifest_path:
+            return
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, self.manifest_path)
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+
+class UploadRegistry:
+    """
+    Thread-safe map of fileId -> UploadSession shared by all request threads.
+    When state_dir is given, sessions are loaded from and saved to
+    <state_dir>/<fileId>.json.
+    """
+
+    session_class = UploadSession
+
+    def __init__(self, state_dir=None):
+        self._sessions = {}
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self.state_dir = state_dir
+
+    def _manifest_path(self, file_id):
+        if not self.state_dir:
+            return None
+        return os.path.join(self.state_dir, f"{file_id}.json")
+
+    def _load(self, file_id):
+        """ Caller holds self._lock. """
+        path = self._manifest_path(file_id)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                upload = self.session_class.from_dict(json.load(f))
+        except Exception:
+            return None
+        upload.manifest_path = path
+        self._sessions[file_id] = upload
+        return upload
+
+    def get(self, file_id):
+        with self._lock:
+            return (
+                self._sessions.get(file_id)
+                or self._finished.get(file_id)
+                or self._load(file_id)
+            )
+
+    def get_or_create(self, file_id, part_path=None, **meta):
+        """
+        The session of file_id, created on its first chunk. Raises
+        UploadFinishedError while file_id is in the finished history, so a
+        late chunk cannot reopen an upload that is already in place.
+        """
+        with self._lock:
+            upload = self._sessions.get(file_id) or self._load(file_id)
+            if upload is None:
+                if file_id in self._finished:
+                    raise UploadFinishedError(f"Upload {file_id} has already finished")
+                upload = self.session_class(file_id, **meta)
+                upload.part_path = part_path
+                upload.manifest_path = self._manifest_path(file_id)
+                if upload.manifest_path:
+                    os.makedirs(self.state_dir, exist_ok=True)
+                    upload.save()
+                self._sessions[file_id] = upload
+            elif upload.total_chunks != meta.get("total_chunks", upload.total_chunks):
+                raise ValueError("totalChunks does not match the existing upload")
+            return upload
+
+    def _discard(self, file_id):
+        """ Caller holds self._lock. """
+        upload = self._sessions.pop(file_id, None)
+        path = self._manifest_path(file_id)
+        if path and os.path.exists(path):
+            if upload is None:
+                upload = self._load(file_id)
+                self._sessions.pop(file_id, None)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return upload
+
+    def discard(self, file_id):
+        with self._lock:
+            return self._discard(file_id)
+
+    def finish(self, file_id, status="complete", error=None):
+        """
+        Retires a session once its file is in place (or the merge failed).
+        The manifest is deleted, but the session stays readable via get()
+        for a while so clients can pick up the outcome (and late chunks are
+        refused). Both happen under one lock, so no chunk slips in between.
+        """
+        with self._lock:
+            upload = self._discard(file_id)
+            if upload is None:
+                return None
+            upload.status = status
+            upload.error = error
+            self._finished[file_id] = upload
+            while len(self._finished) > FINISHED_HISTORY:
+                self._finished.popitem(last=False)
+        return upload
+
+    def prune(self, max_age):
+        """
+        Drops manifests that have not been touched for max_age seconds and
+        returns the sessions removed, so the caller can delete their data.
+        """
+        if not self.state_dir or not os.path.isdir(self.state_dir):
+            return []
+
+        cutoff = time.time() - max_age
+        stale = []
+        for name in os.listdir(self.state_dir):
+            if not name.endswith(".json"):
+                continue
+            file_id = name[:-len(".json")]
+            upload = self.get(file_id)
+            if upload is not None and upload.updated_at < cutoff:
+                self.discard(file_id)
+                stale.append(upload)
+        return stale
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+# ============================================================
+# SHARED BETWEEN PROCESSES
+# ============================================================
+
+class SharedUploadSession(UploadSession):
+    """
+    UploadSession of a server running several processes, any of which may
+    receive any chunk. Every change is merged into the manifest under a
+    file lock and state is re-read from it, so all processes agree on the
+    received chunks, the status and which one finishes the upload. The
+    whole-file digest is completed by that process: chunks it did not hash
+    inline are read back at the end by its background hasher.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._progress_saved = 0.0
+
+    def _file_lock(self):
+        return file_lock(os.path.join(os.path.dirname(self.manifest_path), SHARED_LOCK_NAME))
+
+    def to_dict(self):
+        data = super().to_dict()
+        data.update(
+            status=self.status,
+            error=self.error,
+            merged_bytes=self.merged_bytes,
+            sha256=self.sha256,
+            finalizing=self.finalizing,
+        )
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        upload = super().from_dict(data)
+        upload._adopt(data)
+        return upload
+
+    def _adopt(self, data):
+        """ Takes over the stored state. Caller holds self.lock (or owns a new session). """
+        self.bitmap[:] = base64.b64decode(data["bitmap"])
+        self.chunks_received = data["chunks_received"]
+        self.bytes_received = data["bytes_received"]
+        self.updated_at = data.get("updated_at", self.updated_at)
+        self.status = data.get("status", self.status)
+        self.error = data.get("error")
+        self.merged_bytes = max(self.merged_bytes, data.get("merged_bytes", 0))
+        self.sha256 = self.sha256 or data.get("sha256")
+        self.finalizing = data.get("finalizing", False)
+
+    def reload(self):
+        """ Re-reads the manifest; False once it is gone. Caller holds the file lock. """
+        if not self.manifest_path:
+            return False
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        with self.lock:
+            self._adopt(data)
+        return True
+
+    def mark_received(self, index, nbytes):
+        if not 0 <= index < self.total_chunks:
+            raise ValueError(f"Chunk index {index} out of range")
+
+        with self._file_lock():
+            self.reload()
+            with self.lock:
+                if not self.has_chunk(index):
+                    self.bitmap[index >> 3] |= 1 << (index & 7)
+                    self.chunks_received += 1
+                    self.bytes_received += nbytes
+                    self.updated_at = time.time()
+
+                finished = self.chunks_received == self.total_chunks and not self.finalizing
+                if finished:
+                    self.finalizing = True
+                self._save()
+        return finished
+
+    def catch_up_hash(self, read_chunk):
+        # Only the process that completes the upload reads chunks back
+        if not self.complete:
+            return None
+        return super().catch_up_hash(read_chunk)
+
+    def set_status(self, status):
+        with self._file_lock():
+            self.reload()
+            with self.lock:
+                self.status = status
+                self._save()
+
+    def add_merged(self, nbytes):
+        self.merged_bytes += nbytes
+        now = time.monotonic()
+        if now - self._progress_saved >= PROGRESS_SAVE_INTERVAL:
+            self._progress_saved = now
+            with self._file_lock():
+                self.reload()
+                with self.lock:
+                    self._save()
+
+
+class SharedUploadRegistry(UploadRegistry):
+    """
+    UploadRegistry for several server processes sharing state_dir. Sessions
+    are cached per process for their inline digests, but re-read from the
+    manifest on every lookup. A finished upload leaves a small record in
+    <state_dir>/finished so that any process can report its outcome.
+    """
+
+    session_class = SharedUploadSession
+
+    def __init__(self, state_dir):
+        super().__init__(state_dir)
+        self.finished_dir = os.path.join(state_dir, "finished")
+
+    def _file_lock(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        return file_lock(os.path.join(self.state_dir, SHARED_LOCK_NAME))
+
+    def _current(self, file_id):
+        """ The live session of file_id, refreshed. Caller holds both locks. """
+        upload = self._sessions.get(file_id)
+        if upload is not None:
+            if upload.reload():
+                return upload
+            # Finished or discarded by another process
+            del self._sessions[file_id]
+        return self._load(file_id)
+
+    def _load_finished(self, file_id):
+        try:
+            with open(os.path.join(self.finished_dir, f"{file_id}.json"), "r", encoding="utf-8") as f:
+                return self.session_class.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def get(self, file_id):
+        with self._lock, self._file_lock():
+            return self._current(file_id) or self._load_finished(file_id)
+
+    def get_or_create(self, file_id, part_path=None, **meta):
+        with self._lock, self._file_lock():
+            upload = self._current(file_id)
+            if upload is None:
+                if os.path.exists(os.path.join(self.finished_dir, f"{file_id}.json")):
+                    raise UploadFinishedError(f"Upload {file_id} has already finished")
+                upload = self.session_class(file_id, **meta)
+                upload.part_path = part_path
+                upload.manifest_path = self._manifest_path(file_id)
+                upload.save()
+                self._sessions[file_id] = upload
+            elif upload.total_chunks != meta.get("total_chunks", upload.total_chunks):
+                raise ValueError("totalChunks does not match the existing upload")
+            return upload
+
+    def _discard(self, file_id):
+        """ Caller holds both locks. """
+        upload = self._sessions.pop(file_id, None) or self._load(file_id)
+        self._sessions.pop(file_id, None)
+        try:
+            os.remove(self._manifest_path(file_id))
+        except OSError:
+            pass
+        return upload
+
+    def discard(self, file_id):
+        with self._lock, self._file_lock():
+            return self._discard(file_id)
+
+    def finish(self, file_id, status="complete", error=None):
+        with self._lock, self._file_lock():
+            upload = self._discard(file_id)
+            if upload is None:
+                return None
+            upload.status = status
+            upload.error = error
+
+            os.makedirs(self.finished_dir, exist_ok=True)
+            record = os.path.join(self.finished_dir, f"{file_id}.json")
+            try:
+                with open(record, "w", encoding="utf-8") as f:
+                    json.dump(upload.to_dict(), f)
+                self._trim_finished()
+            except OSError:
+                pass
+        return upload
+
+    def _trim_finished(self):
+        """ Keeps the newest FINISHED_HISTORY records. Caller holds both locks. """
+        names = os.listdir(self.finished_dir)
+        if len(names) <= FINISHED_HISTORY:
+            return
+        paths = sorted(
+            (os.path.join(self.finished_dir, name) for name in names),
+            key=lambda path: os.path.getmtime(path),
+        )
+        for path in paths[:len(paths) - FINISHED_HISTORY]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
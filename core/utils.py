@@ -3,7 +3,9 @@
 
 import sys
 import os
+import errno
 import queue
+from contextlib import contextmanager
 
 # --- Path Helpers ---
 
@@ -54,6 +56,93 @@ def read_env_file():
             
     return config
 
+# --- File Copy ---
+
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+FALLBACK_BUFFER_SIZE = 1024 * 1024
+
+# Errors meaning "this kernel/filesystem can't do it", not a real I/O failure
+_UNSUPPORTED_COPY_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def copy_fd_data(src_fd, dst_fd, size, on_progress=None):
+    """
+    Appends size bytes from src_fd (read from offset 0) to dst_fd at its
+    current position. Uses os.copy_file_range / os.sendfile so the data never
+    enters Python, and falls back to a fixed-size buffered loop elsewhere
+    (Windows, macOS, cross-filesystem copies). Memory use is flat either way.
+    on_progress(n) is called after every block with the bytes just copied.
+    """
+    copied = 0
+
+    def advance(n):
+        nonlocal copied
+        copied += n
+        if on_progress:
+            on_progress(n)
+
+    for kernel_copy in ("copy_file_range", "sendfile"):
+        if not hasattr(os, kernel_copy) or copied >= size:
+            continue
+        try:
+            while copied < size:
+                count = min(COPY_BLOCK_SIZE, size - copied)
+                if kernel_copy == "copy_file_range":
+                    n = os.copy_file_range(src_fd, dst_fd, count, copied)
+                else:
+                    n = os.sendfile(dst_fd, src_fd, copied, count)
+                if n == 0:
+                    break
+                advance(n)
+            if copied >= size:
+                return copied
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_COPY_ERRORS:
+                raise
+
+    os.lseek(src_fd, copied, os.SEEK_SET)
+    while copied < size:
+        data = os.read(src_fd, min(FALLBACK_BUFFER_SIZE, size - copied))
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        advance(len(data))
+
+    return copied
+
+# --- Cross-Process Lock ---
+
+@contextmanager
+def file_lock(path):
+    """ Exclusive lock held across processes while the block runs (path is created if missing). """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    # LK_LOCK gives up after ~10 s of retries; keep waiting
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
 # --- Log Redirector ---
 # This class takes all 'print()' statements and puts them in a queue
 # The Flet GUI can then read this queue to display logs.
@@ -0,0 +1,64 @@
+# core/versions.py
+# Change versions per directory, so a client watching one folder is only
+# told about changes that concern it.
+# A single counter orders all changes. Each change stamps the directory
+# whose listing it altered ("own" version) and every ancestor of it
+# ("tree" version, for clients that care about a whole subtree).
+
+import os
+import threading
+
+
+class VersionTree:
+    def __init__(self):
+        self.current = 0
+        self._own = {}
+        self._tree = {}
+        self._lock = threading.Lock()
+
+    def _norm(self, path):
+        return os.path.normcase(os.path.normpath(path))
+
+    def bump(self, *paths):
+        """
+        Records a change to each of paths (the entries that were created,
+        modified, moved or deleted) and returns the new version.
+        """
+        with self._lock:
+            self.current += 1
+            self._stamp(paths, self.current)
+            return self.current
+
+    def advance(self, version, *paths):
+        """ Records a change numbered elsewhere (the coordinator of a multi-process server). """
+        with self._lock:
+            self.current = max(self.current, version)
+            self._stamp(paths, version)
+
+    def _stamp(self, paths, version):
+        """ Caller holds self._lock. """
+        for path in paths:
+            if not path:
+                continue
+            path = self._norm(path)
+            parent = os.path.dirname(path)
+            self._own[parent] = version
+            # Clients inside a deleted or renamed folder must hear about it too
+            self._own[path] = version
+
+            node = path
+            while True:
+                self._tree[node] = version
+                up = os.path.dirname(node)
+                if up == node:
+                    break
+                node = up
+
+    def version_of(self, directory, recursive=False):
+        """ Version of the last change to directory's entries (or anywhere below it). """
+        table = self._tree if recursive else self._own
+        with self._lock:
+            return table.get(self._norm(directory), 0)
+
+    def changed_since(self, directory, version, recursive=False):
+        return self.version_of(directory, recursive) > version
@@ -0,0 +1,137 @@
+# core/zipstream.py
+# ZIP archives generated on the fly while they are being sent.
+# zipfile writes to a sink that is drained after every block, so the
+# first bytes leave immediately and nothing is staged on disk. Members
+# that are already compressed (video, images, archives) are stored as-is;
+# ZIP64 records are used wherever a member or the archive needs them.
+
+import io
+import os
+import zipfile
+
+# Bytes read from a member file per step
+ZIP_BLOCK_SIZE = 1024 * 1024
+
+# Formats that deflate cannot shrink in any useful way
+STORED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+    ".mp4", ".mkv", ".mov", ".avi", ".webm", ".flv", ".wmv", ".m4v",
+    ".mp3", ".aac", ".m4a", ".ogg", ".opus", ".flac",
+    ".zip", ".rar", ".7z", ".gz", ".bz2", ".xz", ".zst",
+    ".docx", ".xlsx", ".pptx", ".apk", ".jar",
+}
+
+
+class _Sink(io.RawIOBase):
+    """ Write-only, tell()-able, unseekable buffer (zipfile then writes data descriptors). """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(name):
+    ext = os.path.splitext(name)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def iter_tree(root, skip=None):
+    """
+    Yields (path, arcname, is_dir) for everything below root, in a stable
+    order. Empty directories are included so they survive the round trip.
+    skip(path) -> True leaves a file or directory out.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not (skip and skip(os.path.join(dirpath, d))))
+        rel_dir = os.path.relpath(dirpath, root)
+        prefix = "" if rel_dir == os.curdir else rel_dir.replace(os.sep, "/") + "/"
+
+        files = sorted(f for f in filenames if not (skip and skip(os.path.join(dirpath, f))))
+        if prefix and not files and not dirnames:
+            yield dirpath, prefix, True
+        for name in files:
+            yield os.path.join(dirpath, name), prefix + name, False
+
+
+def iter_selection(paths, skip=None):
+    """
+    Members for an archive of several files and folders (e.g. a multi-select
+    download): each goes in under its own name, folders with their content.
+    Clashing names get " (2)", " (3)", ... appended.
+    """
+    used = set()
+    for path in paths:
+        base = os.path.basename(os.path.normpath(path)) or "files"
+        stem, ext = os.path.splitext(base) if not os.path.isdir(path) else (base, "")
+        name, n = base, 1
+        while name.lower() in used:
+            n += 1
+            name = f"{stem} ({n}){ext}"
+        used.add(name.lower())
+
+        if not os.path.isdir(path):
+            yield path, name, False
+            continue
+
+        yield path, name + "/", True
+        for member, arcname, is_dir in iter_tree(path, skip):
+            yield member, f"{name}/{arcname}", is_dir
+
+
+def stream_zip(root, skip=None, block_size=ZIP_BLOCK_SIZE):
+    """ Generator of the bytes of a ZIP archive of the directory root. """
+    return stream_zip_members(iter_tree(root, skip), block_size)
+
+
+def stream_zip_members(members, block_size=ZIP_BLOCK_SIZE):
+    """ Generator of the bytes of a ZIP archive of (path, arcname, is_dir) members. """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True, strict_timestamps=False) as zf:
+        for path, arcname, is_dir in members:
+            if is_dir:
+                zf.writestr(zipfile.ZipInfo(arcname), b"")
+                continue
+
+            try:
+                src = open(path, "rb")
+            except OSError:
+                # Removed or locked since the walk saw it
+                continue
+
+            with src:
+                # from_file() records the size, so zipfile can decide on
+                # ZIP64 headers before the first byte is written
+                zinfo = zipfile.ZipInfo.from_file(path, arcname, strict_timestamps=False)
+                zinfo.compress_type = compress_type_for(arcname)
+                with zf.open(zinfo, "w") as dst:
+                    while True:
+                        block = src.read(block_size)
+                        if not block:
+                            break
+                        dst.write(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Whatever is left plus the central directory
+    yield sink.drain()
@@ -74,6 +74,8 @@ ft = try_import("flet")
 LogRedirector = try_import("core.utils", "LogRedirector")
 get_exe_folder = try_import("core.utils", "get_exe_folder")
 PORT = try_import("config", "PORT")
+UPLOAD_SESSION_TTL = try_import("config", "UPLOAD_SESSION_TTL")
+STATS_LOG_PREFIX = try_import("config", "STATS_LOG_PREFIX")
 AppGUI = try_import("core.gui", "AppGUI")
 get_local_ip = try_import("core.services", "get_local_ip")
 start_ngrok_background = try_import("core.services", "start_ngrok_background")
@@ -200,6 +202,13 @@ def main(page: ft.Page):
             line = proc.stdout.readline()
             if not line:
                 break
+            # Periodic stats from the server update the GUI instead of the log
+            if line.startswith(STATS_LOG_PREFIX):
+                try:
+                    gui.set_event_stats(json.loads(line[len(STATS_LOG_PREFIX):]))
+                except Exception:
+                    pass
+                continue
             log_queue.put(line.rstrip())
         log_queue.put("Server process stopped.")
 
@@ -418,8 +427,20 @@ if __name__ == "__main__":
         sys.exit(0)
 
     # cleanup temp folder
+    # Only leftovers older than UPLOAD_SESSION_TTL go; newer ones may belong
+    # to an upload that will resume. Upload manifests ("sessions") are pruned
+    # by the server itself, since it also knows where their data lives.
     try:
-        shutil.rmtree(os.path.join(get_exe_folder(), "temp_uploads"), ignore_errors=True)
+        temp_root = os.path.join(get_exe_folder(), "temp_uploads")
+        cutoff = time.time() - UPLOAD_SESSION_TTL
+        for name in os.listdir(temp_root):
+            entry = os.path.join(temp_root, name)
+            if name == "sessions" or os.path.getmtime(entry) > cutoff:
+                continue
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                os.remove(entry)
     except Exception:
         pass
 
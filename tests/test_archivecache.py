@@ -0,0 +1,252 @@
+# tests/test_archivecache.py
+
+import io
+import os
+import json
+import time
+import zipfile
+import threading
+
+from core.archivecache import ArchiveCache
+from core.zipstream import stream_zip_members
+
+
+def make_tree(root):
+    os.makedirs(os.path.join(root, "sub", "empty"))
+    with open(os.path.join(root, "a.txt"), "wb") as f:
+        f.write(b"alpha" * 1000)
+    with open(os.path.join(root, "sub", "b.bin"), "wb") as f:
+        f.write(os.urandom(300 * 1024))
+
+
+def read_archive(kind, value):
+    if kind == "file":
+        with open(value, "rb") as f:
+            return f.read()
+    return b"".join(value)
+
+
+def wait_stored(cache, count=1, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(cache) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return len(cache) >= count
+
+
+def wait_saved(cache_dir, count=1, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(os.path.join(cache_dir, "index.json"), encoding="utf-8") as f:
+                if len(json.load(f)) >= count:
+                    return True
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.01)
+    return False
+
+
+def names(data):
+    return sorted(zipfile.ZipFile(io.BytesIO(data)).namelist())
+
+
+def test_first_download_streams_then_is_served_from_disk(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    cache = ArchiveCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+
+    kind, value = cache.serve(root, stream_zip_members)
+    assert kind == "stream"
+    first = read_archive(kind, value)
+    assert names(first) == ["a.txt", "sub/b.bin", "sub/empty/"]
+    assert wait_stored(cache)
+
+    kind, value = cache.serve(root, stream_zip_members)
+    assert kind == "file"
+    assert read_archive(kind, value) == first
+
+
+def test_concurrent_requests_follow_one_build(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    cache = ArchiveCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    builds = []
+    gate = threading.Event()
+
+    def slow_stream(members):
+        builds.append(1)
+        for data in stream_zip_members(members, block_size=4096):
+            gate.wait()
+            yield data
+
+    results = [cache.serve(root, slow_stream) for _ in range(3)]
+    outputs = [None] * 3
+
+    def read(i):
+        outputs[i] = read_archive(*results[i])
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join(10)
+
+    assert len(builds) == 1
+    assert all(kind == "stream" for kind, _ in results)
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert names(outputs[0]) == ["a.txt", "sub/b.bin", "sub/empty/"]
+
+
+def test_change_during_build_is_served_but_not_kept(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    cache = ArchiveCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    gate = threading.Event()
+
+    def gated_stream(members):
+        for data in stream_zip_members(members):
+            gate.wait()
+            yield data
+
+    kind, value = cache.serve(root, gated_stream)
+    cache.invalidate(os.path.join(root, "sub", "b.bin"))
+    gate.set()
+    assert names(read_archive(kind, value)) == ["a.txt", "sub/b.bin", "sub/empty/"]
+    time.sleep(0.2)
+    assert len(cache) == 0
+    assert [n for n in os.listdir(tmp_path / "cache") if n.endswith(".zip")] == []
+
+
+def test_change_after_build_evicts_the_archive(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    cache = ArchiveCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    read_archive(*cache.serve(root, stream_zip_members))
+    assert wait_stored(cache)
+
+    with open(os.path.join(root, "c.txt"), "wb") as f:
+        f.write(b"new")
+    cache.invalidate(os.path.join(root, "c.txt"))
+    assert len(cache) == 0
+
+    kind, value = cache.serve(root, stream_zip_members)
+    assert kind == "stream"
+    assert "c.txt" in names(read_archive(kind, value))
+
+
+def test_folder_over_budget_is_not_cached(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    cache = ArchiveCache(str(tmp_path / "cache"), 100 * 1024)
+
+    # Known too large up front: nothing is built
+    assert cache.serve(root, stream_zip_members, size=400 * 1024) == (None, None)
+
+    # Size unknown: streamed in full, but the file stops at the budget
+    sizes = []
+
+    def watched_stream(members):
+        for data in stream_zip_members(members, block_size=4096):
+            sizes.extend(os.path.getsize(os.path.join(cache.cache_dir, n))
+                         for n in os.listdir(cache.cache_dir) if n.endswith(".zip"))
+            yield data
+
+    kind, value = cache.serve(root, watched_stream)
+    assert kind == "stream"
+    assert names(read_archive(kind, value)) == ["a.txt", "sub/b.bin", "sub/empty/"]
+    assert max(sizes) <= 100 * 1024
+    time.sleep(0.2)
+    assert len(cache) == 0
+    assert [n for n in os.listdir(cache.cache_dir) if n.endswith(".zip")] == []
+
+
+def test_readers_of_an_over_budget_build_all_get_the_whole_archive(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    cache = ArchiveCache(str(tmp_path / "cache"), 100 * 1024)
+    gate = threading.Event()
+    passed = threading.Event()
+
+    def gated_stream(members):
+        for data in stream_zip_members(members, block_size=4096):
+            if cache._builds and next(iter(cache._builds.values())).cut is not None:
+                passed.set()
+            gate.wait()
+            yield data
+
+    results = [cache.serve(root, gated_stream) for _ in range(2)]
+    gate.set()
+    outputs = [None] * 2
+
+    def read(i):
+        outputs[i] = read_archive(*results[i])
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(2)]
+    for t in threads:
+        t.start()
+    assert passed.wait(5)
+    # Too late to join the build: the caller streams its own copy
+    assert cache.serve(root, gated_stream) == (None, None)
+    for t in threads:
+        t.join(10)
+    assert outputs[0] == outputs[1]
+    assert names(outputs[0]) == ["a.txt", "sub/b.bin", "sub/empty/"]
+
+
+def test_build_without_readers_is_cancelled(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    cache = ArchiveCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    produced = []
+    closed = threading.Event()
+
+    def counting_stream(members):
+        try:
+            for data in stream_zip_members(members, block_size=4096):
+                produced.append(len(data))
+                time.sleep(0.01)
+                yield data
+        finally:
+            closed.set()
+
+    kind, value = cache.serve(root, counting_stream)
+    next(iter(value))
+    value.close()
+    assert closed.wait(5)
+    count = len(produced)
+    assert count < 20
+    time.sleep(0.1)
+    assert len(produced) == count
+    assert len(cache) == 0
+    assert [n for n in os.listdir(cache.cache_dir) if n.endswith(".zip")] == []
+
+    # A reader that never started counts as gone once it is closed
+    kind, value = cache.serve(root, stream_zip_members)
+    value.close()
+    time.sleep(0.2)
+    assert len(cache) == 0
+
+
+def test_index_survives_a_restart(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    cache_dir = str(tmp_path / "cache")
+    cache = ArchiveCache(cache_dir, 10 * 1024 * 1024)
+    cache.load()
+    read_archive(*cache.serve(root, stream_zip_members))
+    assert wait_saved(cache_dir)
+
+    again = ArchiveCache(cache_dir, 10 * 1024 * 1024)
+    again.load()
+    assert len(again) == 1
+    # The first download after a restart rebuilds (and re-verifies) the
+    # folder, replacing the archive from before
+    kind, value = again.serve(root, stream_zip_members)
+    assert kind == "stream"
+    read_archive(kind, value)
+    assert wait_stored(again)
+    time.sleep(0.1)
+    assert len(again) == 1
+    assert len([n for n in os.listdir(cache_dir) if n.endswith(".zip")]) == 1
+    assert again.serve(root, stream_zip_members)[0] == "file"
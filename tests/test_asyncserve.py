@@ -0,0 +1,188 @@
+# tests/test_asyncserve.py
+
+import asyncio
+import tempfile
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp import FormData, web
+from aiohttp.test_utils import TestClient, TestServer
+
+from core import asyncserve
+from core.asyncserve import read_blocks, wsgi_bridge
+
+
+def serve(handler, check, method="*", path="/{tail:.*}"):
+    """ Runs check(client) against an aiohttp app routing method/path to handler. """
+
+    async def main():
+        application = web.Application()
+        application.router.add_route(method, path, handler)
+        async with TestClient(TestServer(application)) as client:
+            return await check(client)
+
+    return asyncio.run(main())
+
+
+class Body:
+    """ A WSGI result that records whether the server closed it. """
+
+    def __init__(self, items):
+        self.items = items
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def close(self):
+        self.closed.set()
+
+
+def test_read_blocks_regroups_short_reads():
+    data = bytes(range(256)) * 10
+
+    async def collect():
+        pos = 0
+
+        async def read(n):
+            # Never hands out more than 7 bytes at a time
+            nonlocal pos
+            piece = data[pos:pos + min(n, 7)]
+            pos += len(piece)
+            return piece
+
+        return [bytes(b) async for b in read_blocks(read, 100)]
+
+    blocks = asyncio.run(collect())
+    assert b"".join(blocks) == data
+    assert [len(b) for b in blocks[:-1]] == [100] * (len(blocks) - 1)
+    assert 0 < len(blocks[-1]) <= 100
+
+
+def test_bridge_passes_the_request_to_the_app():
+    seen = {}
+
+    def app(environ, start_response):
+        seen.update(environ)
+        seen["body"] = environ["wsgi.input"].read()
+        start_response("201 Made", [("Content-Type", "text/plain"), ("X-Test", "1"), ("Connection", "close")])
+        return [b"hello ", b"", b"world"]
+
+    async def check(client):
+        resp = await client.post("/a%20b/c?x=1&y=2", data=b"payload", headers={"X-Custom": "v", "Content-Type": "application/octet-stream"})
+        return resp.status, resp.reason, dict(resp.headers), await resp.read()
+
+    status, reason, headers, body = serve(wsgi_bridge(app), check)
+    assert (status, reason, body) == (201, "Made", b"hello world")
+    assert headers["X-Test"] == "1"
+    assert seen["REQUEST_METHOD"] == "POST"
+    assert seen["PATH_INFO"] == "/a b/c"
+    assert seen["QUERY_STRING"] == "x=1&y=2"
+    assert seen["CONTENT_TYPE"] == "application/octet-stream"
+    assert seen["CONTENT_LENGTH"] == "7"
+    assert seen["HTTP_X_CUSTOM"] == "v"
+    assert "HTTP_CONTENT_LENGTH" not in seen
+    assert seen["body"] == b"payload"
+
+
+def test_bridge_waits_for_a_generator_to_start():
+    body = Body([])
+
+    def app(environ, start_response):
+        def generate():
+            # start_response only runs once the first item is asked for
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            yield b"first"
+            yield b"second"
+        body.items = generate()
+        return body
+
+    async def check(client):
+        resp = await client.get("/")
+        return resp.status, await resp.read()
+
+    assert serve(wsgi_bridge(app), check) == (200, b"firstsecond")
+    # Closed once the last item is written, which the client may beat
+    assert body.closed.wait(5)
+
+
+def test_bridge_closes_the_result_for_head():
+    body = Body([b"not sent"])
+
+    def app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return body
+
+    async def check(client):
+        resp = await client.head("/")
+        return resp.status, await resp.read()
+
+    assert serve(wsgi_bridge(app), check) == (200, b"")
+    assert body.closed.wait(5)
+
+
+def test_bridge_refuses_oversized_bodies(monkeypatch):
+    monkeypatch.setattr(asyncserve, "BRIDGE_MAX_BODY", 4)
+    called = []
+
+    def app(environ, start_response):
+        called.append(True)
+        start_response("200 OK", [])
+        return [b""]
+
+    async def check(client):
+        resp = await client.post("/", data=b"too long")
+        return resp.status
+
+    assert serve(wsgi_bridge(app), check) == 413
+    assert called == []
+
+
+# ============================================================
+# UPLOAD SPOOL
+# ============================================================
+
+@pytest.fixture
+def spools(monkeypatch):
+    """ The chunk route as an admin, recording the spools it opens. """
+    from core import server
+    opened = []
+
+    class Spool(tempfile.SpooledTemporaryFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(server.tempfile, "SpooledTemporaryFile", Spool)
+    monkeypatch.setattr(server, "read_session", lambda app, request: {"logged_in": True, "role": "admin"})
+    monkeypatch.setattr(server, "async_denied", lambda sess, upload=False: None)
+    return server, opened
+
+
+def post_chunk(server, fields):
+    """ A multipart chunk whose payload comes before its metadata fields. """
+
+    async def check(client):
+        form = FormData()
+        form.add_field("file", b"x" * 1000, filename="blob")
+        for name, value in fields.items():
+            form.add_field(name, value)
+        resp = await client.post("/upload", data=form)
+        return resp.status
+
+    return serve(server.async_upload_chunk, check, method="POST", path="/upload")
+
+
+@pytest.mark.parametrize("fields, status", [
+    # Refused by begin_chunk
+    ({"chunkIndex": "3", "totalChunks": "1", "fileId": "f", "filename": "a.txt"}, 400),
+    # Metadata missing altogether
+    ({}, 500),
+])
+def test_spooled_payload_is_closed(spools, fields, status):
+    server, opened = spools
+    assert post_chunk(server, fields) == status
+    assert len(opened) == 1
+    assert opened[0].closed
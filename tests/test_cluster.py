@@ -0,0 +1,90 @@
+# tests/test_cluster.py
+# Hub and HubLink over in-process pipes: the workers here are threads, so
+# nothing is spawned. The pipes are never closed, since a HubLink whose
+# coordinator goes away ends its process.
+
+import itertools
+import threading
+import multiprocessing
+
+import pytest
+
+from core.cluster import Hub, HubLink
+
+
+class Coordinator:
+    """ Numbers every "announce" and broadcasts it, like share_changes(). """
+
+    def __init__(self, workers):
+        self.hub = Hub(self.handle)
+        self.versions = itertools.count(1)
+        self.links = []
+        self.seen = []
+        for index in range(workers):
+            mine, theirs = multiprocessing.Pipe(duplex=True)
+            self.hub._attach(index, mine)
+            seen = []
+            link = HubLink(theirs, lambda kind, *args, seen=seen: self.received(seen, kind, *args))
+            link.start()
+            self.links.append(link)
+            self.seen.append(seen)
+
+    def handle(self, index, kind, req_id, *args):
+        if kind == "announce":
+            with self.hub.ordered():
+                self.hub.broadcast("changes", next(self.versions), *args, reply_to=(index, req_id))
+
+    @staticmethod
+    def received(seen, kind, *args):
+        seen.append(args[0])
+        return args[0]
+
+
+def test_call_returns_the_broadcast_that_answers_it():
+    coordinator = Coordinator(3)
+    assert coordinator.links[1].call("announce", "a.txt", timeout=5) == 1
+    assert coordinator.links[0].call("announce", "b.txt", timeout=5) == 2
+    assert len(coordinator.hub) == 3
+    for seen in coordinator.seen:
+        # Every worker gets every broadcast, not just the one that asked
+        wait_for(lambda: len(seen) == 2)
+        assert seen == [1, 2]
+
+
+def test_workers_see_broadcasts_in_one_order():
+    coordinator = Coordinator(3)
+    answers = [[] for _ in coordinator.links]
+
+    def announce(link, out):
+        for i in range(50):
+            out.append(link.call("announce", i, timeout=5))
+
+    threads = [threading.Thread(target=announce, args=pair) for pair in zip(coordinator.links, answers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for seen in coordinator.seen:
+        wait_for(lambda: len(seen) == 150)
+        assert seen == list(range(1, 151))
+    assert sorted(itertools.chain(*answers)) == list(range(1, 151))
+
+
+def test_call_times_out_without_an_answer():
+    coordinator = Coordinator(1)
+    link = coordinator.links[0]
+    with pytest.raises(TimeoutError):
+        link.call("unknown", timeout=0.1)
+    assert link._waiting == {}
+    # Unknown workers are skipped, not an error
+    coordinator.hub.send(7, "changes", None, 0)
+
+
+def wait_for(condition, timeout=5):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        event.wait(0.01)
+    assert condition()
@@ -0,0 +1,94 @@
+# tests/test_coalesce.py
+
+import os
+import time
+import threading
+
+from core.coalesce import EventCoalescer
+
+
+def p(name):
+    return os.path.join(os.sep, "share", name)
+
+
+class Collector:
+    def __init__(self):
+        self.batches = []
+        self.event = threading.Event()
+
+    def __call__(self, batch):
+        self.batches.append(batch)
+        self.event.set()
+
+    def next_batch(self, timeout=5):
+        assert self.event.wait(timeout)
+        self.event.clear()
+        return self.batches[-1]
+
+
+def started(window=0.05, max_delay=1.0):
+    collector = Collector()
+    coalescer = EventCoalescer(collector, window=window, max_delay=max_delay)
+    coalescer.start()
+    return coalescer, collector
+
+
+def test_burst_is_flushed_as_one_batch():
+    coalescer, collector = started()
+    for i in range(50):
+        coalescer.add([("added", p(f"f{i}.txt"))])
+        coalescer.add([("updated", p(f"f{i}.txt"))])
+    batch = collector.next_batch()
+    # Created then modified is still a creation, one entry per path
+    assert batch == [("added", p(f"f{i}.txt"), False) for i in range(50)]
+    time.sleep(0.1)
+    assert len(collector.batches) == 1
+    stats = coalescer.stats()
+    assert stats["received"] == 100 and stats["batches"] == 1
+
+
+def test_create_then_delete_ends_as_removed():
+    coalescer, collector = started()
+    coalescer.add([("added", p("tmp.txt"))])
+    coalescer.add([("updated", p("tmp.txt"))])
+    coalescer.add([("removed", p("tmp.txt"))])
+    assert collector.next_batch() == [("removed", p("tmp.txt"), False)]
+
+
+def test_renames_collapse_to_the_final_name():
+    coalescer, collector = started()
+    # a -> b -> c, as watchdog "moved" events
+    coalescer.add([("removed", p("a")), ("added", p("b"))], is_dir=True)
+    coalescer.add([("removed", p("b")), ("added", p("c"))], is_dir=True)
+    batch = sorted(collector.next_batch())
+    assert batch == [("added", p("c"), True), ("removed", p("a"), True), ("removed", p("b"), True)]
+
+
+def test_constant_events_flush_by_max_delay():
+    coalescer, collector = started(window=0.2, max_delay=0.3)
+    start = time.monotonic()
+    stop = start + 1.0
+    i = 0
+    while time.monotonic() < stop and not collector.batches:
+        coalescer.add([("updated", p(f"log{i}"))])
+        i += 1
+        time.sleep(0.02)
+    collector.next_batch()
+    assert time.monotonic() - start < 0.8
+
+
+def test_own_writes_are_muted():
+    coalescer, collector = started()
+    coalescer.expect(p("upload.bin"))
+    coalescer.expect(p("folder"), recursive=True)
+    coalescer.add([("added", p("upload.bin"))])
+    coalescer.add([("added", os.path.join(p("folder"), "inner.txt"))])
+    coalescer.add([("added", p("other.txt"))])
+    assert collector.next_batch() == [("added", p("other.txt"), False)]
+    assert coalescer.stats()["muted"] == 2
+
+    # Mutes expire
+    coalescer.expect(p("late.bin"), ttl=0)
+    time.sleep(0.01)
+    coalescer.add([("added", p("late.bin"))])
+    assert collector.next_batch() == [("added", p("late.bin"), False)]
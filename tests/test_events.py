@@ -0,0 +1,101 @@
+# tests/test_events.py
+
+import pytest
+
+from core import events
+from core.events import EventBroker
+from core.serving import StreamSlots
+
+
+def drain(sub):
+    out = []
+    while True:
+        event = sub.get(timeout=0)
+        if event is None:
+            return out
+        out.append(event)
+
+
+def test_every_subscriber_gets_every_event():
+    broker = EventBroker()
+    first, second = broker.subscribe(), broker.subscribe()
+    assert len(broker) == 2
+    broker.publish("change", {"n": 1})
+    broker.publish("change", {"n": 2})
+    for sub in (first, second):
+        assert [e.data["n"] for e in drain(sub)] == [1, 2]
+
+    broker.unsubscribe(first)
+    broker.publish("change", {"n": 3})
+    assert drain(first) == []
+    assert [e.data["n"] for e in drain(second)] == [3]
+
+
+def test_keyed_ids_match_across_brokers():
+    a, b = EventBroker(), EventBroker()
+    b.boot = a.boot
+    assert a.publish("change", {}, key="5.0").id == b.publish("change", {}, key="5.0").id
+    assert a.publish("change", {}).id.startswith(a.boot + "-")
+
+
+def test_reconnect_replays_missed_events_or_resyncs():
+    broker = EventBroker()
+    seen = broker.publish("change", {"n": 1})
+    broker.publish("change", {"n": 2})
+    broker.publish("change", {"n": 3})
+    assert [e.data["n"] for e in drain(broker.subscribe(seen.id))] == [2, 3]
+
+    # An id from before a restart (or dropped from the replay buffer)
+    assert [e.kind for e in drain(broker.subscribe("old-1"))] == ["resync"]
+
+
+def test_slow_subscriber_is_told_to_resync(monkeypatch):
+    monkeypatch.setattr(events, "QUEUE_LIMIT", 3)
+    broker = EventBroker()
+    sub = broker.subscribe()
+    for n in range(5):
+        broker.publish("change", {"n": n})
+    received = drain(sub)
+    assert received[0].kind == "resync" and received[0].id is None
+    assert [e.data["n"] for e in received[1:]] == [4]
+
+
+def test_stream_slots_cap_open_streams():
+    slots = StreamSlots(2)
+    assert slots.acquire() and slots.acquire()
+    assert not slots.acquire()
+    assert slots.open == 2
+    slots.release()
+    assert slots.acquire()
+    assert StreamSlots().acquire()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from core import server
+    if "fs" not in server.app.blueprints:
+        server.app.register_blueprint(server.fs, url_prefix="/api")
+    monkeypatch.setattr(server, "STREAMS", StreamSlots(1))
+    c = server.app.test_client()
+    with c.session_transaction() as sess:
+        sess["logged_in"] = True
+        sess["role"] = "admin"
+    return c, server
+
+
+def test_full_stream_slots_answer_with_a_busy_event(client):
+    c, server = client
+    open_stream = c.get("/api/events", buffered=False)
+    iterator = iter(open_stream.response)
+    assert next(iterator).startswith(b"retry: 3000")
+    assert server.STREAMS.open == 1
+
+    refused = c.get("/api/events")
+    assert refused.status_code == 200
+    assert refused.mimetype == "text/event-stream"
+    body = refused.get_data(as_text=True)
+    assert "event: busy\n" in body
+    assert f"retry: {server.STREAM_BUSY_RETRY_MS}\n" in body
+
+    open_stream.close()
+    assert server.STREAMS.open == 0
@@ -0,0 +1,74 @@
+# tests/test_foldersizes.py
+
+import os
+
+from core.foldersizes import FolderSizes
+
+ROOT = os.path.abspath("share")
+
+
+def p(*parts):
+    return os.path.join(ROOT, *parts)
+
+
+def make_sizes():
+    sizes = FolderSizes()
+    sizes.reset(ROOT, [
+        (p("a.txt"), 10),
+        (p("docs", "b.txt"), 20),
+        (p("docs", "old", "c.txt"), 30),
+        (p("media", "d.mp4"), 400),
+    ])
+    return sizes
+
+
+def test_totals_are_recursive():
+    sizes = make_sizes()
+    assert sizes.total(ROOT) == (460, 4)
+    assert sizes.total(p("docs")) == (50, 2)
+    assert sizes.total(p("docs", "old")) == (30, 1)
+    assert sizes.total(p("nowhere")) == (0, 0)
+
+
+def test_add_updates_every_folder_above():
+    sizes = make_sizes()
+    sizes.add(p("docs", "old", "e.txt"), 5, 1)
+    assert sizes.total(p("docs", "old")) == (35, 2)
+    assert sizes.total(p("docs")) == (55, 3)
+    assert sizes.total(ROOT) == (465, 5)
+    assert sizes.total(p("media")) == (400, 1)
+
+    # Resized in place: bytes change, the file count does not
+    sizes.add(p("media", "d.mp4"), -100, 0)
+    assert sizes.total(p("media")) == (300, 1)
+    assert sizes.total(ROOT) == (365, 5)
+
+
+def test_emptied_folders_are_dropped():
+    sizes = make_sizes()
+    sizes.add(p("docs", "old", "c.txt"), -30, -1)
+    assert sizes.total(p("docs", "old")) == (0, 0)
+    assert sizes.total(p("docs")) == (20, 1)
+    assert all(path != p("docs", "old") for path, _, _ in sizes.largest(ROOT))
+
+
+def test_stamps_change_with_totals_below():
+    sizes = make_sizes()
+    docs, media = sizes.stamp(p("docs")), sizes.stamp(p("media"))
+    sizes.add(p("docs", "old", "c.txt"), 1, 0)
+    assert sizes.stamp(p("docs")) != docs
+    assert sizes.stamp(ROOT) != docs
+    assert sizes.stamp(p("media")) == media
+
+
+def test_largest_orders_by_bytes_and_limits_depth():
+    sizes = make_sizes()
+    assert sizes.largest(ROOT, limit=2) == [(p("media"), 400, 1), (p("docs"), 50, 2)]
+    assert [path for path, _, _ in sizes.largest(ROOT, max_depth=1)] == [p("media"), p("docs")]
+    assert sizes.largest(p("docs")) == [(p("docs", "old"), 30, 1)]
+
+
+def test_nothing_is_tracked_before_reset():
+    sizes = FolderSizes()
+    sizes.add(p("a.txt"), 10, 1)
+    assert sizes.total(ROOT) == (0, 0)
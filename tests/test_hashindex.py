@@ -0,0 +1,94 @@
+# tests/test_hashindex.py
+
+import os
+import hashlib
+
+from core.hashindex import HashIndex
+from core.foldersizes import FolderSizes
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def make_index(tmp_path, ignore=None):
+    root = tmp_path / "share"
+    write(str(root / "a.txt"), b"same bytes")
+    write(str(root / "sub" / "b.txt"), b"same bytes")
+    write(str(root / "sub" / "c.bin"), b"other content")
+    write(str(root / "skip.tmp"), b"ignored")
+    sizes = FolderSizes()
+    index = HashIndex(str(tmp_path / "index.json"), ignore=ignore or (lambda p: p.endswith(".tmp")), sizes=sizes)
+    index.load(str(root))
+    index.scan()
+    return index, sizes, str(root)
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_scan_records_sizes_without_hashing(tmp_path):
+    index, sizes, root = make_index(tmp_path)
+    assert len(index) == 3
+    assert index.get(os.path.join(root, "a.txt")) is None
+    assert index.has_size(len(b"same bytes"))
+    assert sizes.total(root) == (10 + 10 + 13, 3)
+
+
+def test_find_hashes_same_size_candidates_only(tmp_path):
+    index, _, root = make_index(tmp_path)
+    found = index.find(10, sha(b"same bytes"))
+    assert found in {os.path.normcase(os.path.join(root, "a.txt")), os.path.normcase(os.path.join(root, "sub", "b.txt"))}
+    assert index.find(10, sha(b"different!")) is None
+    assert index.find(999, sha(b"same bytes")) is None
+    # c.bin has another size and was never read
+    assert index.get(os.path.join(root, "sub", "c.bin")) is None
+
+
+def test_digest_is_dropped_when_the_file_changes(tmp_path):
+    index, _, root = make_index(tmp_path)
+    path = os.path.join(root, "a.txt")
+    index.put(path, sha(b"same bytes"))
+    assert index.get(path) == sha(b"same bytes")
+
+    write(path, b"now longer content")
+    assert index.get(path) is None
+    index.touch(path)
+    assert index.get(path) is None
+    assert index.find(len(b"now longer content"), sha(b"now longer content")) == os.path.normcase(path)
+
+
+def test_move_keeps_the_digest_and_remove_forgets(tmp_path):
+    index, sizes, root = make_index(tmp_path)
+    src = os.path.join(root, "a.txt")
+    dest = os.path.join(root, "moved", "a.txt")
+    index.put(src, sha(b"same bytes"))
+    os.makedirs(os.path.dirname(dest))
+    os.replace(src, dest)
+    index.move(src, dest)
+    assert index.get(dest) == sha(b"same bytes")
+    assert sizes.total(os.path.join(root, "moved")) == (10, 1)
+
+    index.remove(os.path.join(root, "sub"))
+    assert len(index) == 1
+    assert sizes.total(root) == (10, 1)
+
+
+def test_index_is_saved_and_reloaded(tmp_path):
+    index, _, root = make_index(tmp_path)
+    path = os.path.join(root, "sub", "c.bin")
+    index.put(path, sha(b"other content"))
+    index.save()
+
+    again = HashIndex(str(tmp_path / "index.json"))
+    again.load(root)
+    assert len(again) == 3
+    assert again.get(path) == sha(b"other content")
+
+    # An index of another folder is not used
+    other = HashIndex(str(tmp_path / "index.json"))
+    other.load(str(tmp_path))
+    assert len(other) == 0
@@ -0,0 +1,78 @@
+# tests/test_listcache.py
+
+import os
+
+from core.listcache import ListingCache
+
+ROOT = os.path.abspath("share")
+A = os.path.join(ROOT, "a")
+B = os.path.join(ROOT, "b")
+
+
+def test_put_and_get():
+    cache = ListingCache()
+    cache.put(A, "listing", cache.generation(A))
+    assert cache.get(A) == "listing"
+    assert cache.get(A, "other") is None
+
+
+def test_change_in_directory_evicts_it():
+    cache = ListingCache()
+    cache.put(A, "listing", cache.generation(A))
+    cache.invalidate(os.path.join(A, "new.txt"))
+    assert cache.get(A) is None
+
+
+def test_listing_built_across_its_own_change_is_not_stored():
+    cache = ListingCache()
+    generation = cache.generation(A)
+    cache.invalidate(os.path.join(A, "new.txt"))
+    cache.put(A, "stale", generation)
+    assert cache.get(A) is None
+
+
+def test_writes_in_one_folder_do_not_stop_caching_another():
+    cache = ListingCache()
+    generation = cache.generation(B)
+    for i in range(5):
+        cache.invalidate(os.path.join(A, f"file{i}.txt"))
+    cache.put(B, "listing", generation)
+    assert cache.get(B) == "listing"
+    # And a cached B survives further writes in A
+    cache.invalidate(os.path.join(A, "more.txt"))
+    assert cache.get(B) == "listing"
+
+
+def test_recursive_invalidation_covers_subfolders():
+    cache = ListingCache()
+    inner = os.path.join(A, "inner")
+    generation = cache.generation(inner)
+    cache.put(inner, "listing", generation)
+    cache.invalidate(A, recursive=True)
+    assert cache.get(inner) is None
+    # A listing of inner started before the move is not stored either
+    cache.put(inner, "stale", generation)
+    assert cache.get(inner) is None
+    assert cache.generation(B) == 0
+
+
+def test_clear_changes_every_generation():
+    cache = ListingCache()
+    generation = cache.generation(B)
+    cache.clear()
+    cache.put(B, "stale", generation)
+    assert cache.get(B) is None
+    assert cache.generation(B) != generation
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ListingCache(max_entries=2)
+    for name in ("x", "y"):
+        path = os.path.join(ROOT, name)
+        cache.put(path, name, cache.generation(path))
+    cache.get(os.path.join(ROOT, "x"))
+    z = os.path.join(ROOT, "z")
+    cache.put(z, "z", cache.generation(z))
+    assert cache.get(os.path.join(ROOT, "y")) is None
+    assert cache.get(os.path.join(ROOT, "x")) == "x"
+    assert len(cache) == 2
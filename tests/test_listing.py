@@ -0,0 +1,77 @@
+# tests/test_listing.py
+
+import os
+
+import pytest
+
+from core.listing import DirectoryIndex, encode_cursor, decode_cursor
+
+
+def make_dir(tmp_path, names, dirs=()):
+    for i, name in enumerate(names):
+        with open(tmp_path / name, "wb") as f:
+            f.write(b"x" * (i + 1))
+    for name in dirs:
+        os.mkdir(tmp_path / name)
+    return str(tmp_path)
+
+
+def all_pages(index, limit, descending=False):
+    names, cursor = [], None
+    while True:
+        rows, cursor = index.page(limit, decode_cursor(cursor), descending=descending)
+        names += [info.name for info in rows]
+        if cursor is None:
+            return names
+
+
+def test_pages_cover_every_entry_once_in_both_directions(tmp_path):
+    path = make_dir(tmp_path, [f"f{i:02}.txt" for i in range(23)], dirs=["d1", "d2"])
+    index = DirectoryIndex.build(path, "name")
+    expected = sorted(os.listdir(path))
+    assert len(index) == 25
+    assert all_pages(index, 7) == expected
+    assert all_pages(index, 7, descending=True) == expected[::-1]
+    assert all_pages(index, 100) == expected
+
+
+def test_cursor_stays_correct_when_entries_change_between_pages(tmp_path):
+    path = make_dir(tmp_path, ["b.txt", "d.txt", "f.txt", "h.txt"])
+    rows, cursor = DirectoryIndex.build(path).page(2)
+    assert [r.name for r in rows] == ["b.txt", "d.txt"]
+
+    # Added before and after the cursor, and the last row sent removed
+    make_dir(tmp_path, ["a.txt", "e.txt"])
+    os.remove(os.path.join(path, "d.txt"))
+    rows, cursor = DirectoryIndex.build(path).page(2, decode_cursor(cursor))
+    assert [r.name for r in rows] == ["e.txt", "f.txt"]
+    assert cursor is not None
+
+
+def test_other_sort_orders(tmp_path):
+    path = make_dir(tmp_path, ["small.txt", "mid.jpg", "big.txt"], dirs=["folder"])
+    by_size = DirectoryIndex.build(path, "size")
+    assert [e.name for e in by_size.entries] == ["folder", "small.txt", "mid.jpg", "big.txt"]
+
+    file_type = lambda name: "image" if name.endswith(".jpg") else "text"
+    by_type = DirectoryIndex.build(path, "type", file_type=file_type)
+    assert [e.name for e in by_type.entries] == ["folder", "mid.jpg", "big.txt", "small.txt"]
+    assert all_pages(by_type, 1) == ["folder", "mid.jpg", "big.txt", "small.txt"]
+
+    with pytest.raises(ValueError):
+        DirectoryIndex.build(path, "color")
+
+
+def test_skip_hides_entries(tmp_path):
+    path = make_dir(tmp_path, ["keep.txt", ".localhub-x.part.tmp"])
+    index = DirectoryIndex.build(path, skip=lambda name: name.startswith(".localhub-"))
+    assert [e.name for e in index.entries] == ["keep.txt"]
+
+
+def test_cursor_round_trip_and_garbage():
+    key = (False, "video", "clip ü.mp4")
+    assert decode_cursor(encode_cursor(key)) == key
+    assert decode_cursor("") is None
+    for garbage in ("!!!", encode_cursor(()), "bm90IGpzb24"):
+        with pytest.raises(ValueError):
+            decode_cursor(garbage)
@@ -0,0 +1,96 @@
+# tests/test_media.py
+
+import os
+
+import pytest
+from werkzeug.http import http_date
+
+from core.media import (
+    parse_ranges,
+    plan_file_response,
+    iter_file_body,
+    MAX_RANGES,
+)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", [(0, 100)]),
+    ("bytes=100-", [(100, 1000)]),
+    ("bytes=-100", [(900, 1000)]),
+    ("bytes=-5000", [(0, 1000)]),
+    ("bytes=990-2000", [(990, 1000)]),
+    ("bytes=0-9, 5-19, 30-39", [(0, 20), (30, 40)]),
+    ("bytes=20-29,0-9", [(0, 10), (20, 30)]),
+    ("bytes=1000-", []),
+    ("bytes=5000-6000", []),
+    ("bytes=-0", []),
+    ("bytes=9-5", None),
+    ("bytes=a-b", None),
+    ("items=0-9", None),
+    ("bytes=", None),
+    ("bytes=" + ",".join(f"{i * 10}-{i * 10}" for i in range(MAX_RANGES + 1)), None),
+])
+def test_parse_ranges(header, expected):
+    assert parse_ranges(header, 1000) == expected
+
+
+@pytest.fixture
+def movie(tmp_path):
+    path = tmp_path / "movie.mp4"
+    path.write_bytes(bytes(range(256)) * 40)
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    return str(path)
+
+
+def body_of(path, body):
+    return b"".join(iter_file_body(path, body, block_size=1000))
+
+
+def test_whole_file_and_revalidation(movie):
+    status, headers, body = plan_file_response(movie, {})
+    assert status == 200 and body == ("file", 10240)
+    assert headers["Content-Length"] == "10240"
+    assert headers["Content-Type"] == "video/mp4"
+
+    etag = headers["ETag"]
+    assert plan_file_response(movie, {"If-None-Match": etag})[0] == 304
+    assert plan_file_response(movie, {"If-None-Match": '"other"'})[0] == 200
+    since = headers["Last-Modified"]
+    assert plan_file_response(movie, {"If-Modified-Since": since})[0] == 304
+    assert plan_file_response(movie, {"If-Modified-Since": http_date(1_600_000_000)})[0] == 200
+
+
+def test_single_and_multiple_ranges(movie):
+    data = open(movie, "rb").read()
+
+    status, headers, body = plan_file_response(movie, {"Range": "bytes=100-2099"})
+    assert status == 206
+    assert headers["Content-Range"] == "bytes 100-2099/10240"
+    assert body_of(movie, body) == data[100:2100]
+
+    status, headers, body = plan_file_response(movie, {"Range": "bytes=0-9,5000-5009"})
+    assert status == 206
+    boundary = body[2]
+    assert headers["Content-Type"] == f"multipart/byteranges; boundary={boundary}"
+    payload = body_of(movie, body)
+    assert int(headers["Content-Length"]) == len(payload)
+    assert data[5000:5010] in payload
+    assert b"Content-Range: bytes 0-9/10240" in payload
+    assert payload.endswith(f"--{boundary}--\r\n".encode())
+
+    status, headers, body = plan_file_response(movie, {"Range": "bytes=20000-"})
+    assert status == 416 and body is None
+    assert headers["Content-Range"] == "bytes */10240"
+
+
+def test_if_range_only_applies_ranges_to_the_same_version(movie):
+    _, headers, _ = plan_file_response(movie, {})
+    etag, modified = headers["ETag"], headers["Last-Modified"]
+
+    assert plan_file_response(movie, {"Range": "bytes=0-9", "If-Range": etag})[0] == 206
+    assert plan_file_response(movie, {"Range": "bytes=0-9", "If-Range": '"stale"'})[0] == 200
+    assert plan_file_response(movie, {"Range": "bytes=0-9", "If-Range": modified})[0] == 206
+    old = http_date(1_600_000_000)
+    status, _, body = plan_file_response(movie, {"Range": "bytes=0-9", "If-Range": old})
+    assert status == 200 and body == ("file", 10240)
@@ -0,0 +1,101 @@
+# tests/test_preview.py
+
+import os
+
+import pytest
+
+from core import preview
+from core.preview import LineReader, read_head, read_tail, read_from
+
+
+@pytest.fixture(autouse=True)
+def small_steps(monkeypatch):
+    # Checkpoints every 10 lines and small reads, so a few hundred lines
+    # cross many checkpoints and lines span reads
+    monkeypatch.setattr(preview, "LINE_INDEX_STEP", 10)
+    monkeypatch.setattr(preview, "READ_BLOCK_SIZE", 64)
+
+
+def write_lines(path, count, first=0, trailing_newline=True):
+    text = "\n".join(f"line {n}" for n in range(first, first + count))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text + ("\n" if trailing_newline else ""))
+    return str(path)
+
+
+def test_line_ranges_through_checkpoints(tmp_path):
+    path = write_lines(tmp_path / "log.txt", 250)
+    reader = LineReader()
+
+    lines, total, complete = reader.read_lines(path, 0, 5, 1 << 20)
+    assert lines == [f"line {n}" for n in range(5)]
+    # Only scanned as far as needed
+    assert not complete and total < 250
+
+    lines, total, complete = reader.read_lines(path, 123, 4, 1 << 20)
+    assert lines == [f"line {n}" for n in range(123, 127)]
+
+    # Backwards again, served from the checkpoints already built
+    lines, _, _ = reader.read_lines(path, 31, 2, 1 << 20)
+    assert lines == ["line 31", "line 32"]
+
+    lines, total, complete = reader.read_lines(path, 245, 100, 1 << 20)
+    assert lines == [f"line {n}" for n in range(245, 250)]
+    assert (total, complete) == (250, True)
+
+
+def test_trailing_partial_line_counts(tmp_path):
+    path = write_lines(tmp_path / "log.txt", 21, trailing_newline=False)
+    lines, total, complete = LineReader().read_lines(path, 19, 10, 1 << 20)
+    assert lines == ["line 19", "line 20"]
+    assert (total, complete) == (21, True)
+
+
+def test_growth_extends_the_index_and_rewrites_reset_it(tmp_path):
+    path = write_lines(tmp_path / "log.txt", 50)
+    reader = LineReader()
+    assert reader.read_lines(path, 0, 1000, 1 << 20)[1] == 50
+
+    write_lines(path, 30, first=50)
+    os.utime(path, ns=(1, os.stat(path).st_mtime_ns + 1))
+    lines, total, _ = reader.read_lines(path, 70, 5, 1 << 20)
+    assert lines == [f"line {n}" for n in range(70, 75)]
+    assert reader.read_lines(path, 0, 1000, 1 << 20)[1] == 80
+
+    # Rewritten shorter with different line lengths: indexed afresh
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(f"row {n:04d} xx\n" for n in range(15)))
+    os.utime(path, ns=(1, os.stat(path).st_mtime_ns + 2))
+    lines, total, complete = reader.read_lines(path, 12, 5, 1 << 20)
+    assert lines == ["row 0012 xx", "row 0013 xx", "row 0014 xx"]
+    assert (total, complete) == (15, True)
+
+
+def test_max_bytes_cuts_long_lines(tmp_path):
+    path = tmp_path / "long.txt"
+    path.write_text("x" * 5000 + "\nshort\n")
+    lines, _, _ = LineReader().read_lines(str(path), 0, 2, 100)
+    assert lines == ["x" * 100]
+
+
+def test_head_tail_and_follow(tmp_path):
+    path = write_lines(tmp_path / "log.txt", 100)
+    size = os.path.getsize(path)
+
+    text, end, more = read_head(path, 30)
+    assert more and text.endswith("\n") and end == len(text.encode())
+    assert text.splitlines() == ["line 0", "line 1", "line 2", "line 3"]
+
+    text, start, end = read_tail(path, 20)
+    assert end == size and text.splitlines() == ["line 98", "line 99"]
+
+    write_lines(path, 2, first=100)
+    text, start, end, new_size = read_from(path, size, 1 << 20)
+    assert (start, end) == (size, new_size)
+    assert text.splitlines() == ["line 100", "line 101"]
+
+    # Truncated (rotated) below the offset: restart from the top
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("fresh\n")
+    text, start, _, _ = read_from(path, size, 1 << 20)
+    assert (text, start) == ("fresh\n", 0)
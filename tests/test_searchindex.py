@@ -0,0 +1,118 @@
+# tests/test_searchindex.py
+
+import os
+
+from core import searchindex
+from core.searchindex import SearchIndex
+
+
+def write(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def make_index(tmp_path, ignore=None):
+    root = tmp_path / "share"
+    write(str(root / "Report.pdf"))
+    write(str(root / "docs" / "report-2024.txt"))
+    write(str(root / "docs" / "notes.txt"))
+    write(str(root / "photos" / "beach.jpg"))
+    write(str(root / "skip.tmp"))
+    index = SearchIndex(str(tmp_path / "search.json"), ignore=ignore or (lambda p: p.endswith(".tmp")))
+    index.load(str(root))
+    index.reconcile()
+    return index, str(root)
+
+
+def paths(result):
+    return [path for path, _ in result[0]]
+
+
+def test_substring_prefix_and_extension(tmp_path):
+    index, _ = make_index(tmp_path)
+    assert len(index) == 6
+    # Case-insensitive; names starting with the query rank first
+    assert paths(index.search("report")) == ["Report.pdf", "docs/report-2024.txt"]
+    assert paths(index.search("port")) == ["Report.pdf", "docs/report-2024.txt"]
+    assert paths(index.search("port", mode="prefix")) == []
+    assert paths(index.search("", ext="txt")) == ["docs/notes.txt", "docs/report-2024.txt"]
+    assert paths(index.search("each", ext=".jpg")) == ["photos/beach.jpg"]
+    assert paths(index.search("doc")) == ["docs"]
+    assert paths(index.search("tmp")) == []
+    assert paths(index.search("report", within="docs")) == ["docs/report-2024.txt"]
+
+
+def test_limit_reports_more(tmp_path):
+    index, _ = make_index(tmp_path)
+    found, matches, more = index.search("", ext="txt", limit=1)
+    assert len(found) == 1 and matches == 2 and more
+
+
+def test_changes_after_a_snapshot_are_overlaid(tmp_path):
+    index, root = make_index(tmp_path)
+    assert paths(index.search("beach")) == ["photos/beach.jpg"]
+    snapshot = index._snapshot
+
+    write(os.path.join(root, "photos", "beach-2.jpg"))
+    index.touch(os.path.join(root, "photos", "beach-2.jpg"))
+    os.remove(os.path.join(root, "Report.pdf"))
+    index.remove(os.path.join(root, "Report.pdf"))
+
+    assert paths(index.search("beach")) == ["photos/beach.jpg", "photos/beach-2.jpg"]
+    assert paths(index.search("report")) == ["docs/report-2024.txt"]
+    # Served from the same snapshot plus the overlay
+    assert index._snapshot is snapshot
+
+
+def test_renamed_and_deleted_folders_after_a_snapshot(tmp_path):
+    index, root = make_index(tmp_path)
+    assert paths(index.search("txt")) == ["docs/notes.txt", "docs/report-2024.txt"]
+
+    os.rename(os.path.join(root, "docs"), os.path.join(root, "papers"))
+    index.remove(os.path.join(root, "docs"))
+    index.touch(os.path.join(root, "papers"))
+    assert paths(index.search("txt")) == ["papers/notes.txt", "papers/report-2024.txt"]
+
+    # A folder added and removed again leaves nothing behind
+    write(os.path.join(root, "tmpdir", "draft.txt"))
+    index.touch(os.path.join(root, "tmpdir"))
+    assert "tmpdir/draft.txt" in paths(index.search("draft"))
+    index.remove(os.path.join(root, "tmpdir"))
+    assert paths(index.search("draft")) == []
+
+
+def test_overlay_limit_rebuilds_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(searchindex, "OVERLAY_LIMIT", 2)
+    index, root = make_index(tmp_path)
+    index.search("x")
+    for i in range(3):
+        write(os.path.join(root, f"new{i}.txt"))
+        index.touch(os.path.join(root, f"new{i}.txt"))
+    assert index._snapshot is None
+    assert paths(index.search("new")) == ["new0.txt", "new1.txt", "new2.txt"]
+
+
+def test_reload_lists_only_changed_folders(tmp_path):
+    index, root = make_index(tmp_path)
+    index.save()
+
+    write(os.path.join(root, "photos", "sunset.jpg"))
+    os.remove(os.path.join(root, "docs", "notes.txt"))
+
+    again = SearchIndex(str(tmp_path / "search.json"), ignore=lambda p: p.endswith(".tmp"))
+    again.load(root)
+    assert len(again) == 6
+    listed = []
+    original = again._list_dir
+    monkey = lambda rel: listed.append(rel) or original(rel)
+    again._list_dir = monkey
+    again.reconcile()
+    assert sorted(listed) == ["docs", "photos"]
+    assert paths(again.search("sunset")) == ["photos/sunset.jpg"]
+    assert paths(again.search("notes")) == []
+
+    # An index of another folder is not used
+    other = SearchIndex(str(tmp_path / "search.json"))
+    other.load(str(tmp_path))
+    assert len(other) == 0
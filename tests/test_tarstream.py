@@ -0,0 +1,60 @@
+# tests/test_tarstream.py
+
+import io
+import os
+import tarfile
+
+from core.zipstream import iter_selection
+from core.tarstream import plan_tar, tar_size, stream_tar
+
+
+def make_tree(root):
+    os.makedirs(os.path.join(root, "sub", "empty"))
+    with open(os.path.join(root, "a.txt"), "wb") as f:
+        f.write(b"alpha" * 2000)
+    with open(os.path.join(root, "sub", "photo.jpg"), "wb") as f:
+        f.write(os.urandom(5000))
+    long_name = "ü-" + "x" * 150 + ".txt"
+    with open(os.path.join(root, "sub", long_name), "wb") as f:
+        f.write(b"long")
+    return long_name
+
+
+def test_tar_size_is_exact_and_pax_carries_long_names(tmp_path):
+    root = str(tmp_path / "share")
+    long_name = make_tree(root)
+    members = list(iter_selection([root]))
+    plan = plan_tar(members)
+    data = b"".join(stream_tar(plan, block_size=1000))
+    assert len(data) == tar_size(plan)
+
+    tf = tarfile.open(fileobj=io.BytesIO(data))
+    names = tf.getnames()
+    assert f"share/sub/{long_name}" in names
+    assert "share/sub/empty" in names
+    assert tf.extractfile("share/a.txt").read() == b"alpha" * 2000
+
+
+def test_tar_keeps_its_size_when_files_change_after_planning(tmp_path):
+    root = str(tmp_path / "share")
+    make_tree(root)
+    plan = plan_tar(iter_selection([root]))
+    size = tar_size(plan)
+    with open(os.path.join(root, "a.txt"), "ab") as f:
+        f.write(b"grown")
+    os.remove(os.path.join(root, "sub", "photo.jpg"))
+
+    data = b"".join(stream_tar(plan))
+    assert len(data) == size
+    tf = tarfile.open(fileobj=io.BytesIO(data))
+    assert tf.extractfile("share/a.txt").read() == b"alpha" * 2000
+    assert tf.extractfile("share/sub/photo.jpg").read() == b"\0" * 5000
+
+
+def test_tar_sizes_beyond_8_gib(tmp_path):
+    big = tmp_path / "big.bin"
+    with open(big, "wb") as f:
+        f.truncate(9 * 1024 ** 3)
+    plan = plan_tar([(str(big), "big.bin", False)])
+    assert b"size=9663676416" in plan[0].header
+    assert tar_size(plan) == len(plan[0].header) + 9 * 1024 ** 3 + 1024
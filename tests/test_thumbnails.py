@@ -0,0 +1,120 @@
+# tests/test_thumbnails.py
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core import thumbnails
+from core.thumbnails import ThumbnailCache
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def make_image(path, color, size=(400, 300)):
+    Image.new("RGB", size, color).save(path, "PNG")
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), 10 * 1024 * 1024)
+    # Threads instead of processes: fast to start, and monkeypatches apply
+    cache._pool = ThreadPoolExecutor(2)
+    yield cache
+    cache.shutdown()
+
+
+def test_render_then_cache_hit(tmp_path, cache):
+    src = make_image(tmp_path / "a.png", "red")
+    ready, pending = cache.get_many([(src, None)], 96)
+    assert pending == []
+    key, thumb = ready[src]
+    with Image.open(thumb) as im:
+        assert im.format == "JPEG" and max(im.size) == 96
+
+    # Same content: served from the cache, nothing rendered again
+    cache._pool.shutdown()
+    cache._pool = None
+    assert cache.get(src, 96) == (key, thumb)
+    assert cache._pool is None
+    # Another size is another thumbnail
+    assert cache.key_for(src, 256) != key
+
+
+def test_changed_source_gets_a_new_key_and_invalidate_drops_it(tmp_path, cache):
+    src = make_image(tmp_path / "a.png", "red")
+    key, thumb = cache.get(src, 96)
+    make_image(tmp_path / "a.png", "blue", size=(500, 300))
+    assert cache.key_for(src, 96) != key
+
+    cache.invalidate(src)
+    assert len(cache) == 0
+    assert not os.path.exists(thumb)
+
+
+def test_unreadable_sources_are_not_retried(tmp_path, cache):
+    src = tmp_path / "broken.png"
+    src.write_bytes(b"not an image")
+    assert cache.get_many([(str(src), None)], 96) == ({}, [])
+    key = cache.key_for(str(src), 96)
+    assert key in cache._failed
+    assert cache.get(str(src), 96) is None
+
+
+def test_least_recently_used_are_evicted(tmp_path, cache):
+    sources = [make_image(tmp_path / f"{n}.png", color) for n, color in enumerate(("red", "green", "blue"))]
+    first = cache.get(sources[0], 96)
+    size = os.path.getsize(first[1])
+    cache.max_bytes = size * 2 + size // 2
+    time.sleep(0.01)
+    cache.get(sources[1], 96)
+    time.sleep(0.01)
+    # Touch the first again so the second is the oldest
+    cache.get(sources[0], 96)
+    time.sleep(0.01)
+    cache.get(sources[2], 96)
+
+    assert len(cache) == 2
+    assert os.path.exists(first[1])
+    assert cache.get_many([(sources[0], None), (sources[2], None)], 96)[1] == []
+
+
+def test_slow_renders_are_reported_pending(tmp_path, cache, monkeypatch):
+    gate = threading.Event()
+    render = thumbnails.render_thumbnail
+
+    def slow_render(src, dst, size):
+        gate.wait(5)
+        return render(src, dst, size)
+
+    monkeypatch.setattr(thumbnails, "render_thumbnail", slow_render)
+    fast = make_image(tmp_path / "fast.png", "red")
+    gate.set()
+    assert cache.get(fast, 96) is not None
+    gate.clear()
+
+    slow = make_image(tmp_path / "slow.png", "blue")
+    started = time.monotonic()
+    ready, pending = cache.get_many([(fast, None), (slow, None)], 96, timeout=0.2)
+    assert time.monotonic() - started < 1
+    assert list(ready) == [fast]
+    assert pending == [slow]
+
+    # The render carries on; a later request picks it up
+    gate.set()
+    ready, pending = cache.get_many([(slow, None)], 96, timeout=5)
+    assert pending == [] and slow in ready
+
+
+def test_index_survives_a_restart(tmp_path, cache):
+    src = make_image(tmp_path / "a.png", "red")
+    key, thumb = cache.get(src, 96)
+    cache.save()
+
+    again = ThumbnailCache(cache.cache_dir, cache.max_bytes)
+    again.load()
+    assert again.get_many([(src, None)], 96)[0][src] == (key, thumb)
+    assert again._pool is None
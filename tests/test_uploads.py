@@ -0,0 +1,207 @@
+# tests/test_uploads.py
+
+import os
+import time
+import hashlib
+import threading
+
+import pytest
+
+from core.uploads import (
+    UploadRegistry,
+    SharedUploadRegistry,
+    UploadFinishedError,
+    parse_chunk_digest,
+)
+
+META = dict(filename="f.bin", path="", total_chunks=10, total_size=95, chunk_size=10)
+
+
+def test_bitmap_tracks_chunks_and_completes_once():
+    upload = UploadRegistry().get_or_create("a", **META)
+    finished = [upload.mark_received(i, 10) for i in range(9)]
+    assert finished == [False] * 9
+    assert upload.received_chunks() == list(range(9))
+
+    # A retried chunk is not counted twice
+    assert upload.mark_received(3, 10) is False
+    assert upload.bytes_received == 90
+
+    assert upload.mark_received(9, 5) is True
+    assert upload.complete and upload.bytes_received == 95
+    # Only the call that completed the upload finishes it
+    assert upload.mark_received(9, 5) is False
+
+    with pytest.raises(ValueError):
+        upload.mark_received(10, 1)
+
+
+def test_concurrent_chunks_finish_exactly_once():
+    upload = UploadRegistry().get_or_create("a", **dict(META, total_chunks=200))
+    results = []
+
+    def send(indexes):
+        for i in indexes:
+            results.append(upload.mark_received(i, 1))
+
+    threads = [threading.Thread(target=send, args=(range(k, 200, 8),)) for k in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert upload.chunks_received == 200
+
+
+def test_manifest_lets_an_upload_resume_after_restart(tmp_path):
+    registry = UploadRegistry(str(tmp_path))
+    upload = registry.get_or_create("a", part_path="/share/.localhub-a.part.tmp", **META)
+    for i in (0, 2, 7):
+        upload.mark_received(i, 10)
+
+    restarted = UploadRegistry(str(tmp_path))
+    again = restarted.get("a")
+    assert again.received_chunks() == [0, 2, 7]
+    assert again.part_path == "/share/.localhub-a.part.tmp"
+    assert again.bytes_received == 30
+
+    with pytest.raises(ValueError):
+        restarted.get_or_create("a", **dict(META, total_chunks=11))
+
+
+def test_finished_upload_refuses_new_chunks(tmp_path):
+    registry = UploadRegistry(str(tmp_path))
+    upload = registry.get_or_create("a", **META)
+    registry.finish("a")
+    assert not os.path.exists(tmp_path / "a.json")
+    assert registry.get("a") is upload and upload.status == "complete"
+    with pytest.raises(UploadFinishedError):
+        registry.get_or_create("a", **META)
+    # Other ids are unaffected
+    assert registry.get_or_create("a-1", **META) is not None
+
+
+def test_prune_drops_stale_manifests(tmp_path):
+    registry = UploadRegistry(str(tmp_path))
+    old = registry.get_or_create("old", **META)
+    registry.get_or_create("new", **META)
+    old.updated_at = time.time() - 3600
+    old.save()
+
+    pruned = UploadRegistry(str(tmp_path)).prune(600)
+    assert [u.file_id for u in pruned] == ["old"]
+    assert sorted(os.listdir(tmp_path)) == ["new.json"]
+
+
+def test_whole_file_digest_in_and_out_of_order():
+    data = [bytes([i]) * 10 for i in range(4)]
+    upload = UploadRegistry().get_or_create("a", **dict(META, total_chunks=4, total_size=40))
+
+    def store(i, inline=True):
+        hasher = upload.claim_inline_hash(i) if inline else None
+        if hasher is not None:
+            hasher.update(data[i])
+        upload.commit_inline_hash(i, hasher)
+        upload.mark_received(i, 10)
+        return upload.catch_up_hash(lambda n, h: h.update(data[n]))
+
+    # Chunk 2 arrives early and is read back later; 1 is hashed inline
+    assert store(0) is None
+    assert store(2) is None
+    assert upload.hashed_chunks == 1
+    assert store(1) is None
+    upload.wait_hashed(5)
+    assert upload.hashed_chunks == 3
+    store(3, inline=False)
+    assert upload.wait_hashed(5) == hashlib.sha256(b"".join(data)).hexdigest()
+
+
+def test_read_back_runs_in_the_background_without_the_lock():
+    data = [bytes([i]) * 10 for i in range(4)]
+    upload = UploadRegistry().get_or_create("a", **dict(META, total_chunks=4, total_size=40))
+    reading = threading.Event()
+    release = threading.Event()
+
+    def slow_read(n, hasher):
+        reading.set()
+        release.wait(5)
+        hasher.update(data[n])
+
+    for i in (0, 1):
+        upload.mark_received(i, 10)
+    assert upload.catch_up_hash(slow_read) is None
+    assert reading.wait(5)
+    # Chunks keep flowing while the read-back is under way
+    assert upload.claim_inline_hash(3) is None
+    upload.mark_received(2, 10)
+    assert upload.catch_up_hash(slow_read) is None
+    assert upload.hashing
+    release.set()
+    upload.mark_received(3, 10)
+    upload.catch_up_hash(slow_read)
+    assert upload.wait_hashed(5) == hashlib.sha256(b"".join(data)).hexdigest()
+    assert not upload.hashing
+
+
+def test_reloaded_session_hashes_its_received_prefix_again(tmp_path):
+    data = [bytes([i]) * 10 for i in range(3)]
+    meta = dict(META, total_chunks=3, total_size=30)
+    upload = UploadRegistry(str(tmp_path)).get_or_create("a", **meta)
+    for i in (0, 1):
+        upload.commit_inline_hash(i, None)
+        upload.mark_received(i, 10)
+
+    # After a restart the digest is rebuilt from disk, off the request path
+    resumed = UploadRegistry(str(tmp_path)).get_or_create("a", **meta)
+    assert resumed.hashed_chunks == 0
+    resumed.mark_received(2, 10)
+    resumed.catch_up_hash(lambda n, h: h.update(data[n]))
+    assert resumed.wait_hashed(5) == hashlib.sha256(b"".join(data)).hexdigest()
+
+
+def test_failed_read_back_leaves_the_digest_unset():
+    upload = UploadRegistry().get_or_create("a", **dict(META, total_chunks=1, total_size=10))
+    upload.mark_received(0, 10)
+
+    def broken(n, hasher):
+        raise OSError("gone")
+
+    upload.catch_up_hash(broken)
+    assert upload.wait_hashed(5) is None
+    assert not upload.hashing
+
+
+def test_chunk_digests():
+    hasher, expected = parse_chunk_digest("crc32:3610A686")
+    hasher.update(b"hello")
+    assert hasher.hexdigest() == expected
+    hasher, expected = parse_chunk_digest("sha256:" + hashlib.sha256(b"x").hexdigest())
+    hasher.update(b"x")
+    assert hasher.hexdigest() == expected
+    assert parse_chunk_digest("") == (None, None)
+    with pytest.raises(ValueError):
+        parse_chunk_digest("md5:abc")
+
+
+def test_shared_registry_agrees_across_processes(tmp_path):
+    # Two registries on one state dir stand in for two worker processes
+    first = SharedUploadRegistry(str(tmp_path))
+    second = SharedUploadRegistry(str(tmp_path))
+    a = first.get_or_create("a", **dict(META, total_chunks=4))
+    b = second.get_or_create("a", **dict(META, total_chunks=4))
+
+    assert a.mark_received(0, 10) is False
+    assert b.mark_received(1, 10) is False
+    assert a.mark_received(2, 10) is False
+    assert second.get("a").received_chunks() == [0, 1, 2]
+
+    assert b.mark_received(3, 10) is True
+    # The other process sees it finalizing and cannot finish it again
+    assert a.mark_received(3, 10) is False
+
+    b.set_status("merging")
+    assert first.get("a").status == "merging"
+    second.finish("a")
+    assert first.get("a").status == "complete"
+    with pytest.raises(UploadFinishedError):
+        first.get_or_create("a", **dict(META, total_chunks=4))
@@ -0,0 +1,54 @@
+# tests/test_versions.py
+
+import os
+
+from core.versions import VersionTree
+
+
+def p(*parts):
+    return os.path.join(os.sep, "share", *parts)
+
+
+def test_bump_stamps_the_folder_and_its_ancestors():
+    tree = VersionTree()
+    version = tree.bump(p("docs", "2024", "report.txt"))
+    assert version == tree.current == 1
+
+    # The listing that changed, and the entry itself
+    assert tree.version_of(p("docs", "2024")) == 1
+    assert tree.version_of(p("docs", "2024", "report.txt")) == 1
+    # Parents only see it recursively
+    assert tree.version_of(p("docs")) == 0
+    assert tree.version_of(p("docs"), recursive=True) == 1
+    assert tree.version_of(p(), recursive=True) == 1
+    assert tree.version_of(p("photos"), recursive=True) == 0
+
+
+def test_changed_since_per_folder():
+    tree = VersionTree()
+    tree.bump(p("docs", "a.txt"))
+    seen = tree.current
+    tree.bump(p("photos", "b.jpg"), p("photos", "c.jpg"))
+    assert tree.current == 2
+    assert not tree.changed_since(p("docs"), seen)
+    assert tree.changed_since(p("photos"), seen)
+    assert tree.changed_since(p(), seen, recursive=True)
+    assert not tree.changed_since(p(), seen)
+
+
+def test_deleted_folder_is_stamped_for_clients_inside_it():
+    tree = VersionTree()
+    tree.bump(p("docs"))
+    assert tree.version_of(p()) == 1
+    assert tree.version_of(p("docs")) == 1
+
+
+def test_advance_takes_versions_numbered_elsewhere():
+    tree = VersionTree()
+    tree.advance(7, p("docs", "a.txt"))
+    assert tree.current == 7
+    assert tree.version_of(p("docs")) == 7
+    # An older broadcast never moves the counter back
+    tree.advance(3)
+    assert tree.current == 7
+    assert tree.bump(p("docs", "b.txt")) == 8
@@ -0,0 +1,54 @@
+# tests/test_zipstream.py
+
+import io
+import os
+import zipfile
+
+from core.zipstream import stream_zip, iter_selection, stream_zip_members
+
+
+def make_tree(root):
+    os.makedirs(os.path.join(root, "sub", "empty"))
+    with open(os.path.join(root, "a.txt"), "wb") as f:
+        f.write(b"alpha" * 2000)
+    with open(os.path.join(root, "sub", "photo.jpg"), "wb") as f:
+        f.write(os.urandom(5000))
+    long_name = "ü-" + "x" * 150 + ".txt"
+    with open(os.path.join(root, "sub", long_name), "wb") as f:
+        f.write(b"long")
+    return long_name
+
+
+def test_zip_round_trip(tmp_path):
+    root = str(tmp_path / "share")
+    long_name = make_tree(root)
+    data = b"".join(stream_zip(root, block_size=1000))
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    assert sorted(zf.namelist()) == sorted(["a.txt", "sub/empty/", "sub/photo.jpg", f"sub/{long_name}"])
+    assert zf.read("a.txt") == b"alpha" * 2000
+    assert zf.getinfo("sub/photo.jpg").compress_type == zipfile.ZIP_STORED
+    assert zf.getinfo("a.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert zf.testzip() is None
+
+
+def test_zip64_records_are_written_when_needed(tmp_path, monkeypatch):
+    # Lower the limit so small files take the ZIP64 code paths
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1000)
+    root = str(tmp_path / "share")
+    make_tree(root)
+    data = b"".join(stream_zip(root))
+    assert b"PK\x06\x06" in data  # ZIP64 end of central directory
+    monkeypatch.undo()
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    assert zf.read("a.txt") == b"alpha" * 2000
+    assert zf.testzip() is None
+
+
+def test_selection_names_clashes_apart(tmp_path):
+    for folder in ("one", "two"):
+        os.makedirs(tmp_path / folder)
+        (tmp_path / folder / "same.txt").write_bytes(folder.encode())
+    paths = [str(tmp_path / "one" / "same.txt"), str(tmp_path / "two" / "same.txt"), str(tmp_path / "one")]
+    zf = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip_members(iter_selection(paths)))))
+    assert sorted(zf.namelist()) == ["one/", "one/same.txt", "same (2).txt", "same.txt"]
+    assert zf.read("same (2).txt") == b"two"